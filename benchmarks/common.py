@@ -0,0 +1,31 @@
+# Shared setup for the benchmark scripts - these are run from the repo
+# root, e.g. `python -m benchmarks.report_backends`, and use the test
+# settings with a throwaway in-memory sqlite database.
+import os
+import sys
+import time
+from typing import Callable
+
+import django
+
+
+def setup_django() -> None:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def timeit(func: Callable[[], object], number: int) -> float:
+    """Return the number of calls per second."""
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return number / (time.perf_counter() - start)
+
+
+def output(label: str, value: str) -> None:
+    sys.stdout.write(f"{label:<56} {value}\n")
@@ -0,0 +1,47 @@
+# Worker startup cost of the header middleware, measured with
+# `python -X importtime` in a fresh interpreter for each run.
+#
+#   python -m benchmarks.import_time [runs]
+#
+import re
+import statistics
+import subprocess
+import sys
+
+from .common import output
+
+SCRIPT = """
+import django
+django.setup()
+import csp.middleware
+import sys
+print("pydantic imported:", "pydantic" in sys.modules)
+"""
+
+
+def run() -> tuple[int, int, str]:
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", SCRIPT],
+        capture_output=True,
+        text=True,
+        env={"DJANGO_SETTINGS_MODULE": "tests.settings", "PYTHONPATH": "."},
+        check=True,
+    )
+    # import time: self [us] | cumulative | imported package
+    lines = re.findall(r"import time:\s+(\d+) \|\s+(\d+) \|(.*)", result.stderr)
+    total = sum(int(self_us) for self_us, _, _ in lines)
+    csp = sum(int(self_us) for self_us, _, name in lines if "csp" in name)
+    return total, csp, result.stdout.strip()
+
+
+def main(runs: int) -> None:
+    results = [run() for _ in range(runs)]
+    total = statistics.median(r[0] for r in results) / 1000
+    csp = statistics.median(r[1] for r in results) / 1000
+    output("all imports (median)", f"{total:>8.1f} ms")
+    output("csp.* modules, excl. dependencies (median)", f"{csp:>8.1f} ms")
+    output("after django.setup() + csp.middleware", results[-1][2])
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
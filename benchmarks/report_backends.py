@@ -0,0 +1,42 @@
+# Ingestion throughput of each of the builtin report backends.
+#
+#   python -m benchmarks.report_backends [number-of-reports]
+#
+import itertools
+import logging
+import sys
+
+from .common import output, setup_django, timeit
+
+
+def main(number: int) -> None:
+    setup_django()
+    logging.disable(logging.CRITICAL)
+    from csp.backends import load_backend
+    from csp.models import ReportData
+
+    # 100 distinct violations, repeated - which is representative of
+    # real traffic, where most reports are for known violations.
+    reports = itertools.cycle(
+        [
+            ReportData(
+                effective_directive="img-src",
+                blocked_uri=f"https://cdn-{i}.example.com",
+                document_uri="https://example.com/",
+            )
+            for i in range(100)
+        ]
+    )
+    for path, options in [
+        ("csp.backends.DatabaseReportBackend", {}),
+        ("csp.backends.CacheReportBackend", {}),
+        ("csp.backends.SamplingReportBackend", {"rate": 0.1}),
+        ("csp.backends.NullReportBackend", {}),
+    ]:
+        backend = load_backend(path, options)
+        rate = timeit(lambda: backend.save_report(next(reports)), number)
+        output(str(backend), f"{rate:>10,.0f} reports/sec")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,65 @@
+# Cost of validating a report payload - the full (pydantic) ReportData
+# vs. the compact ReportRecord used by the report_uri view.
+#
+#   python -m benchmarks.report_parsing [number-of-reports]
+#
+import gc
+import json
+import sys
+import tracemalloc
+from typing import Any, Callable
+
+from .common import output, timeit
+
+PAYLOAD = json.dumps(
+    {
+        "document-uri": "https://example.com/foo/?bar=baz",
+        "referrer": "",
+        "violated-directive": "img-src",
+        "effective-directive": "img-src",
+        "original-policy": "default-src 'self'; report-uri /csp/report-uri/",
+        "disposition": "enforce",
+        "blocked-uri": "https://cdn.example.com/img/1.png",
+        "status-code": 200,
+        "script-sample": "",
+    }
+)
+
+
+def allocated(func: Callable[[], Any], number: int) -> tuple[float, float]:
+    """Return (bytes retained, peak bytes allocated) per call."""
+    gc.collect()
+    tracemalloc.start()
+    retained = [func() for _ in range(number)]
+    current, _ = tracemalloc.get_traced_memory()
+    del retained
+    gc.collect()
+    peak_total = 0
+    for _ in range(number):
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        peak_total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return current / number, peak_total / number
+
+
+def main(number: int) -> None:
+    from csp.records import ReportRecord
+    from csp.reports import ReportData
+
+    data = json.loads(PAYLOAD)
+    for label, func in [
+        ("ReportData(**data)", lambda: ReportData(**data)),
+        ("ReportRecord.from_dict(data)", lambda: ReportRecord.from_dict(data)),
+    ]:
+        func()  # warm up
+        rate = timeit(func, number)
+        retained, peak = allocated(func, number)
+        output(label, f"{rate:>10,.0f} reports/sec")
+        output("  bytes / report retained", f"{retained:>10,.0f}")
+        output("  bytes / report allocated (peak)", f"{peak:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -1,24 +1,104 @@
+from __future__ import annotations
+
+import difflib
+import json
+from typing import Any
+
 from django.contrib import admin
-from django.db.utils import IntegrityError
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db.models import QuerySet
 from django.http import HttpRequest
+from django.utils.html import format_html
 
 from .models import (
+    CspConfig,
+    CspPolicySnapshot,
     CspReport,
     CspReportBlacklist,
     CspReportQuerySet,
     CspRule,
     CspRuleQuerySet,
-    convert_report,
+    blacklist_reports,
+    convert_reports,
 )
+from .pagination import EstimatedCountPaginator, KeysetChangeList
+from .settings import CSP_ADMIN_COUNT_LIMIT, CSP_ADMIN_SCALABLE
 from .utils import strip_path
 
 
+class ScalableAdminMixin:
+    """
+    Changelist behaviour for very large tables (see CSP_ADMIN_SCALABLE).
+
+    In scalable mode the result count is estimated, the list is ordered
+    by (and paged using a cursor on) the first of `keyset_fields`, search
+    is a prefix match on `prefix_search_field`, and the list can be
+    drilled down by `scalable_date_hierarchy` - all of which can use an
+    index. Otherwise the standard admin behaviour is used.
+
+    """
+
+    change_list_template = "admin/csp/change_list.html"
+    keyset_fields: tuple[str, ...] = ()
+    prefix_search_field = ""
+    scalable_date_hierarchy: str | None = None
+
+    @property
+    def show_full_result_count(self) -> bool:
+        return not CSP_ADMIN_SCALABLE
+
+    @property
+    def date_hierarchy(self) -> str | None:
+        return self.scalable_date_hierarchy if CSP_ADMIN_SCALABLE else None
+
+    def get_changelist(self, request: HttpRequest, **kwargs: Any) -> type[ChangeList]:
+        if CSP_ADMIN_SCALABLE:
+            return KeysetChangeList
+        return super().get_changelist(request, **kwargs)  # type: ignore[misc]
+
+    def get_paginator(
+        self, request: HttpRequest, queryset: QuerySet, per_page: int, **kwargs: Any
+    ) -> Paginator:
+        if CSP_ADMIN_SCALABLE:
+            return EstimatedCountPaginator(
+                queryset, per_page, count_limit=CSP_ADMIN_COUNT_LIMIT, **kwargs
+            )
+        return super().get_paginator(  # type: ignore[misc]
+            request, queryset, per_page, **kwargs
+        )
+
+    def get_ordering(self, request: HttpRequest) -> Any:
+        if CSP_ADMIN_SCALABLE and self.keyset_fields:
+            return (f"-{self.keyset_fields[0]}",)
+        return super().get_ordering(request)  # type: ignore[misc]
+
+    def get_search_fields(self, request: HttpRequest) -> Any:
+        if CSP_ADMIN_SCALABLE and self.prefix_search_field:
+            return (self.prefix_search_field,)
+        return super().get_search_fields(request)  # type: ignore[misc]
+
+    def get_search_results(
+        self, request: HttpRequest, queryset: QuerySet, search_term: str
+    ) -> tuple[QuerySet, bool]:
+        if not (CSP_ADMIN_SCALABLE and self.prefix_search_field):
+            return super().get_search_results(  # type: ignore[misc]
+                request, queryset, search_term
+            )
+        if not (term := search_term.strip()):
+            return queryset, False
+        lookup = f"{self.prefix_search_field}__startswith"
+        return queryset.filter(**{lookup: term}), False
+
+
 @admin.register(CspRule)
-class CspRuleAdmin(admin.ModelAdmin):
-    list_display = ("directive", "value", "_enabled", "modified_at")
-    list_filter = ("created_at", "modified_at", "directive", "enabled")
+class CspRuleAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ("directive", "value", "host", "_enabled", "modified_at")
+    list_filter = ("created_at", "modified_at", "directive", "enabled", "host")
     search_fields = ("value",)
     ordering = ("-modified_at",)
+    keyset_fields = ("modified_at",)
+    prefix_search_field = "value"
     actions = [
         "enable_selected_rules",
         "disable_selected_rules",
@@ -30,9 +110,9 @@ class CspRuleAdmin(admin.ModelAdmin):
         return obj.enabled
 
     def clear_cache(self) -> None:
-        from .policy import clear_cache as clear_csp_cache
+        from .policy import rules_changed
 
-        clear_csp_cache()
+        rules_changed()
 
     @admin.action(description="Enable selected CSP rules")
     def enable_selected_rules(
@@ -55,26 +135,32 @@ class CspRuleAdmin(admin.ModelAdmin):
         self, request: HttpRequest, queryset: CspReportQuerySet
     ) -> None:
         """Strip paths off selected rules."""
-        stripped = 0
-        ignored = 0
-        deleted = 0
-        for rule in queryset:
-            stripped_value = strip_path(rule.value)
-            if stripped_value == rule.value:
-                ignored += 1
+        rules = list(queryset)
+        changed = [r for r in rules if strip_path(r.value) != r.value]
+        ignored = len(rules) - len(changed)
+        # because we are stripping off the path multiple rules may now
+        # clash (same origin) - with each other, or with existing rules -
+        # and so we delete the duplicates.
+        taken = set(
+            CspRule.objects.filter(
+                value__in={strip_path(r.value) for r in changed}
+            ).values_list("directive", "value", "host")
+        )
+        updated: list[CspRule] = []
+        duplicates: list[int] = []
+        for rule in changed:
+            rule.value = strip_path(rule.value)
+            rule.normalized_value = CspRule.clean_value(rule.value)
+            if (key := (rule.directive, rule.value, rule.host)) in taken:
+                duplicates.append(rule.pk)
             else:
-                rule.value = stripped_value
-                try:
-                    rule.save(update_fields=["value"])
-                except IntegrityError:
-                    # we have a duplicate rule - because we are
-                    # stripping off the path multiple rules may now
-                    # clash (same origin), and so we delete the
-                    # duplicates.
-                    rule.delete()
-                    deleted += 1
-                else:
-                    stripped += 1
+                taken.add(key)
+                updated.append(rule)
+        CspRule.objects.filter(pk__in=duplicates).delete()
+        CspRule.objects.bulk_update(updated, ["value", "normalized_value"])
+        if changed:
+            self.clear_cache()
+        stripped, deleted = len(updated), len(duplicates)
         if stripped:
             self.message_user(
                 request, f"Successfully stripped {stripped} rules.", "success"
@@ -86,11 +172,11 @@ class CspRuleAdmin(admin.ModelAdmin):
 
 
 @admin.register(CspReport)
-class CspReportAdmin(admin.ModelAdmin):
+class CspReportAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = (
         "effective_directive",
         "blocked_uri",
-        "request_count",
+        "_request_count",
         "last_updated_at",
     )
     readonly_fields = (
@@ -100,22 +186,30 @@ class CspReportAdmin(admin.ModelAdmin):
         "blocked_uri",
         "created_at",
         "last_updated_at",
-        "request_count",
+        "_request_count",
     )
     list_filter = ("effective_directive", "last_updated_at")
+    scalable_date_hierarchy = "last_updated_at"
+    keyset_fields = ("last_updated_at", "request_count")
+    prefix_search_field = "blocked_uri"
     actions = ("add_rule", "add_to_blacklist")
 
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        # include counts not yet compacted (see CSP_REPORT_COUNTER_SHARDS)
+        return super().get_queryset(request).with_pending_counts()
+
+    @admin.display(description="Request count", ordering="request_count")
+    def _request_count(self, obj: CspReport) -> int:
+        return obj.total_count
+
     @admin.action(description="Add new CSP rule for selected violations.")
     def add_rule(self, request: HttpRequest, queryset: CspReportQuerySet) -> None:
-        created: list[CspRule] = []
-        duplicates = 0
-        for report in queryset:
-            if rule := convert_report(report, enable=True):
-                created.append(rule)
-            else:
-                duplicates += 1
+        from .policy import rules_changed
+
+        created, duplicates = convert_reports(queryset, enable=True)
         if created:
-            self.message_user(request, f"Created {len(created)} new rules.", "success")
+            rules_changed()
+            self.message_user(request, f"Created {created} new rules.", "success")
         if duplicates:
             self.message_user(request, f"Ignored {duplicates} duplicates.", "warning")
 
@@ -123,18 +217,11 @@ class CspReportAdmin(admin.ModelAdmin):
     def add_to_blacklist(
         self, request: HttpRequest, queryset: CspReportQuerySet
     ) -> None:
-        blacklisted = 0
-        duplicates = 0
-        for report in queryset:
-            obj, created = CspReportBlacklist.objects.get_or_create(
-                directive=report.effective_directive, blocked_uri=report.blocked_uri
-            )
-            report.delete()
-            if created:
-                blacklisted += 1
-            else:
-                duplicates += 1
+        from .blacklist import blacklist_changed
+
+        blacklisted, duplicates = blacklist_reports(queryset)
         if blacklisted:
+            blacklist_changed()
             self.message_user(request, f"Blacklisted {blacklisted} reports.", "success")
         if duplicates:
             self.message_user(request, f"Ignored {duplicates} duplicates.", "warning")
@@ -145,5 +232,74 @@ class CspReportBlacklistAdmin(admin.ModelAdmin):
     list_display = (
         "directive",
         "blocked_uri",
+        "host",
     )
     list_filter = ("directive",)
+
+
+@admin.register(CspConfig)
+class CspConfigAdmin(admin.ModelAdmin):
+    list_display = (
+        "__str__",
+        "enabled",
+        "report_only",
+        "report_sampling",
+        "report_throttling",
+    )
+    readonly_fields = ("updated_at",)
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        # there is (at most) one config
+        if CspConfig.objects.exists():
+            return False
+        return super().has_add_permission(request)
+
+
+@admin.register(CspPolicySnapshot)
+class CspPolicySnapshotAdmin(admin.ModelAdmin):
+    list_display = ("version", "created_at", "fingerprint")
+    readonly_fields = ("version", "created_at", "fingerprint", "_diff")
+    exclude = ("policies",)
+    actions = ("restore_snapshot",)
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        # snapshots are only written when the rules change
+        return False
+
+    def has_change_permission(
+        self, request: HttpRequest, obj: CspPolicySnapshot | None = None
+    ) -> bool:
+        return False
+
+    @admin.display(description="Changes since the previous version")
+    def _diff(self, obj: CspPolicySnapshot) -> str:
+        previous = CspPolicySnapshot.objects.filter(
+            version__lt=obj.version
+        ).latest_snapshot()
+
+        def _lines(snapshot: CspPolicySnapshot | None) -> list[str]:
+            policies = snapshot.policies if snapshot else {}
+            return json.dumps(policies, indent=2, sort_keys=True).splitlines()
+
+        diff = difflib.unified_diff(
+            _lines(previous),
+            _lines(obj),
+            f"v{previous.version}" if previous else "",
+            f"v{obj.version}",
+            lineterm="",
+        )
+        return format_html("<pre>{}</pre>", "\n".join(diff))
+
+    @admin.action(description="Restore selected CSP policy snapshot")
+    def restore_snapshot(
+        self, request: HttpRequest, queryset: QuerySet[CspPolicySnapshot]
+    ) -> None:
+        from .policy import restore_snapshot
+
+        if queryset.count() != 1:
+            self.message_user(request, "Select a single snapshot to restore.", "error")
+            return
+        restored = restore_snapshot(queryset.get())
+        self.message_user(
+            request, f"Restored policy as version {restored.version}.", "success"
+        )
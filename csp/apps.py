@@ -1,4 +1,10 @@
+import logging
+import warnings
+
 from django.apps import AppConfig
+from django.db.utils import DatabaseError
+
+logger = logging.getLogger(__name__)
 
 
 class CSPTrackerConfig(AppConfig):
@@ -13,7 +19,34 @@ class CSPTrackerConfig(AppConfig):
         super().ready()
 
     def reset(self) -> None:
-        """Ensure that cache is cleared on startup."""
-        from .policy import clear_cache
+        """Ensure that cache is cleared (or warmed) on startup."""
+        from .policy import clear_cache, is_cache_valid
+        from .settings import CSP_POLICY_FILE, CSP_WARM_CACHE_ON_STARTUP
+
+        if CSP_POLICY_FILE:
+            # policy is served from file - the cache is not used.
+            return
+        if not CSP_WARM_CACHE_ON_STARTUP:
+            clear_cache()
+            return
+        if is_cache_valid():
+            logger.debug("Found valid cached CSP - skipping cache warmup")
+            return
+        try:
+            self.warm_cache()
+        except DatabaseError:
+            # most likely the app has not been migrated yet
+            logger.exception("Unable to warm the CSP cache")
+            clear_cache()
+
+    def warm_cache(self) -> None:
+        from .policy import warm_cache
 
-        clear_cache()
+        with warnings.catch_warnings():
+            # opted in to via CSP_WARM_CACHE_ON_STARTUP
+            warnings.filterwarnings(
+                "ignore",
+                message="Accessing the database during app initialization",
+                category=RuntimeWarning,
+            )
+            warm_cache()
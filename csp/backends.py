@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Iterable
+
+from django.core.cache import cache
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from .models import CspReport, aggregate_reports
+from .novelty import BloomFilter, build_known_filter, violation_key
+from .settings import (
+    CSP_REPORT_BACKEND,
+    CSP_REPORT_BACKEND_OPTIONS,
+    CSP_REPORT_CACHE_TIMEOUT,
+)
+
+if TYPE_CHECKING:
+    from .records import ReportType
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_REPORT_INDEX = "csp::reports::index"
+CACHE_KEY_REPORT_COUNT = "csp::reports::{}"
+# violations confirmed as stored, by NoveltyReportBackend
+CACHE_KEY_KNOWN = "csp::reports::known::{}"
+
+# (effective_directive, blocked_uri, request_count)
+ReportCountType = tuple[str, str, int]
+
+
+class BaseReportBackend:
+    """
+    Interface for storing violation reports.
+
+    Subclasses must implement `save_report`. The batch method has a
+    default implementation that collapses duplicates, and can be
+    overridden where the storage supports something more efficient.
+
+    """
+
+    def __init__(self, **options: Any) -> None:
+        self.options = options
+
+    def __str__(self) -> str:
+        return type(self).__name__
+
+    def save_report(self, data: ReportType, count: int = 1) -> None:
+        """Record `count` occurrences of a violation."""
+        raise NotImplementedError
+
+    def save_reports(self, reports: Iterable[ReportType]) -> None:
+        """Record a batch of violations."""
+        self.save_counts(aggregate_reports(reports))
+
+    def save_counts(self, counts: list[tuple[ReportType, int]]) -> None:
+        """Record pre-aggregated (report, count) tuples - one per violation."""
+        for data, count in counts:
+            self.save_report(data, count=count)
+
+    def get_counts(self) -> list[ReportCountType] | None:
+        """Return violation counts, most frequent first, if supported."""
+        return None
+
+
+class DatabaseReportBackend(BaseReportBackend):
+    """Store reports as CspReport objects (the default)."""
+
+    def save_report(self, data: ReportType, count: int = 1) -> None:
+        CspReport.objects.save_report(data, count=count)
+
+    def save_reports(self, reports: Iterable[ReportType]) -> None:
+        CspReport.objects.save_reports(reports)
+
+    def save_counts(self, counts: list[tuple[ReportType, int]]) -> None:
+        CspReport.objects.upsert_counts(counts)
+
+
+class CacheReportBackend(BaseReportBackend):
+    """
+    Store aggregate counts in the cache only.
+
+    Each (directive, blocked_uri) pair has its own counter, which is
+    incremented atomically and expires after CSP_REPORT_CACHE_TIMEOUT
+    seconds of inactivity (or the "timeout" option). An index of known
+    pairs is kept alongside so that the counts can be read back - the
+    index is only written when a new pair is seen, and is not atomic,
+    so under heavy contention a new pair may occasionally be missed
+    from the index (though its counter will still be correct).
+
+    """
+
+    def __init__(self, **options: Any) -> None:
+        super().__init__(**options)
+        self.timeout = int(options.get("timeout", CSP_REPORT_CACHE_TIMEOUT))
+
+    @staticmethod
+    def make_key(directive: str, blocked_uri: str) -> str:
+        # blocked_uri can contain chars that are not valid in a cache key
+        digest = hashlib.md5(  # noqa: S324
+            f"{directive} {blocked_uri}".encode(), usedforsecurity=False
+        ).hexdigest()
+        return CACHE_KEY_REPORT_COUNT.format(digest)
+
+    def save_report(self, data: ReportType, count: int = 1) -> None:
+        directive = str(data.effective_directive)
+        key = self.make_key(directive, data.blocked_uri)
+        if cache.add(key, count, self.timeout):
+            self._add_to_index(key, directive, data.blocked_uri)
+            return
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            # key expired between the add and the incr
+            cache.set(key, count, self.timeout)
+        cache.touch(key, self.timeout)
+
+    def _add_to_index(self, key: str, directive: str, blocked_uri: str) -> None:
+        index = cache.get(CACHE_KEY_REPORT_INDEX) or {}
+        index[key] = (directive, blocked_uri)
+        cache.set(CACHE_KEY_REPORT_INDEX, index, self.timeout)
+
+    def get_counts(self) -> list[ReportCountType]:
+        index: dict[str, tuple[str, str]] = cache.get(CACHE_KEY_REPORT_INDEX) or {}
+        counts = cache.get_many(list(index))
+        return sorted(
+            [(*index[key], count) for key, count in counts.items()],
+            key=lambda c: c[2],
+            reverse=True,
+        )
+
+    def clear(self) -> None:
+        index = cache.get(CACHE_KEY_REPORT_INDEX) or {}
+        cache.delete_many([*index, CACHE_KEY_REPORT_INDEX])
+
+
+class NullReportBackend(BaseReportBackend):
+    """Discard all reports."""
+
+    def save_report(self, data: ReportType, count: int = 1) -> None:
+        pass
+
+    def save_reports(self, reports: Iterable[ReportType]) -> None:
+        pass
+
+    def save_counts(self, counts: list[tuple[ReportType, int]]) -> None:
+        pass
+
+
+def scale_count(count: int, rate: float) -> int:
+    """
+    Scale up the count of a sampled report by 1/rate.
+
+    The fractional part is rounded up or down at random (in proportion),
+    so that stored totals are unbiased for any rate - e.g. at 0.6 a
+    report is stored as 2 two thirds of the time, and as 1 otherwise.
+
+    """
+    scaled = count / rate
+    return int(scaled) + (random.random() < scaled % 1)  # noqa: S311
+
+
+class SamplingReportBackend(BaseReportBackend):
+    """
+    Store a random sample of reports in another backend.
+
+    Options are "rate" (0..1, default 0.1) - the proportion of reports
+    to keep - and "backend" - the dotted path of the backend to store
+    them in (default DatabaseReportBackend). Stored counts are scaled
+    up by 1/rate, so totals remain (approximately) correct.
+
+    """
+
+    def __init__(self, **options: Any) -> None:
+        super().__init__(**options)
+        self.rate = float(options.get("rate", 0.1))
+        self.backend = load_backend(
+            options.get("backend", "csp.backends.DatabaseReportBackend"),
+            options.get("backend_options", {}),
+        )
+
+    def __str__(self) -> str:
+        return f"{type(self).__name__} ({self.rate:.0%} of {self.backend})"
+
+    def save_report(self, data: ReportType, count: int = 1) -> None:
+        if random.random() < self.rate:  # noqa: S311
+            self.backend.save_report(data, count=scale_count(count, self.rate))
+
+    def get_counts(self) -> list[ReportCountType] | None:
+        return self.backend.get_counts()
+
+
+class NoveltyReportBackend(BaseReportBackend):
+    """
+    Store every new violation, and a sample of known ones, in another backend.
+
+    Known (directive, blocked_uri) pairs are tracked in a Bloom filter,
+    which is built from the stored reports - in a background thread - and
+    added to as new pairs are seen, and rebuilt every "refresh" seconds
+    (default 600). Until the filter is first built every report is
+    stored. Reports for a pair that is not in the filter are always
+    stored, at full count; a pair in the filter is confirmed as known (in
+    the cache, else the database - as the filter has false positives at
+    "error_rate", default 0.001), and reports for known pairs are stored
+    at "rate" (0..1, default 0.1), with the count scaled up by 1/rate.
+    "backend" / "backend_options" are as for the sampling backend.
+
+    """
+
+    def __init__(self, **options: Any) -> None:
+        super().__init__(**options)
+        self.rate = float(options.get("rate", 0.1))
+        self.refresh = float(options.get("refresh", 600))
+        self.error_rate = float(options.get("error_rate", 0.001))
+        self.backend = load_backend(
+            options.get("backend", "csp.backends.DatabaseReportBackend"),
+            options.get("backend_options", {}),
+        )
+        self.known: BloomFilter | None = None
+        self.built_at: float | None = None
+        self._lock = threading.Lock()
+
+    def __str__(self) -> str:
+        return (
+            f"{type(self).__name__} (new violations, and {self.rate:.0%} "
+            f"of known violations, in {self.backend})"
+        )
+
+    def build(self) -> None:
+        """Build the filter of known violations (a full scan of the reports)."""
+        try:
+            self.known = build_known_filter(self.error_rate)
+        except Exception:
+            logger.exception("Error building filter of known CSP violations")
+        finally:
+            # a failed build is retried after `refresh` seconds
+            self.built_at = time.monotonic()
+
+    def get_known(self) -> BloomFilter | None:
+        """
+        Return the filter of known violations - None until it is built.
+
+        The filter is (re)built in a background thread, so that requests
+        never wait for the scan - they carry on with the old filter.
+
+        """
+        due = self.built_at is None or time.monotonic() - self.built_at > self.refresh
+        if due and self._lock.acquire(blocking=False):
+            threading.Thread(
+                target=self._build, name="csp-novelty-filter", daemon=True
+            ).start()
+        return self.known
+
+    def _build(self) -> None:
+        try:
+            self.build()
+        finally:
+            self._lock.release()
+            # this runs in its own thread - which has its own connections
+            connections.close_all()
+
+    def _confirm_key(self, key: str) -> str:
+        digest = hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+        return CACHE_KEY_KNOWN.format(digest)
+
+    def is_known(self, data: ReportType, key: str) -> bool:
+        """Return True if the violation is stored - exact, unlike the filter."""
+        if cache.get(confirm_key := self._confirm_key(key)):
+            return True
+        known = CspReport.objects.filter(
+            effective_directive=data.effective_directive,
+            blocked_uri=data.blocked_uri,
+        ).exists()
+        if known:
+            cache.set(confirm_key, True, self.refresh)
+        return known
+
+    def save_report(self, data: ReportType, count: int = 1) -> None:
+        known = self.get_known()
+        key = violation_key(str(data.effective_directive), data.blocked_uri)
+        if known is None or key not in known or not self.is_known(data, key):
+            self.backend.save_report(data, count=count)
+            cache.set(self._confirm_key(key), True, self.refresh)
+            if known is not None:
+                known.add(key)
+        elif random.random() < self.rate:  # noqa: S311
+            self.backend.save_report(data, count=scale_count(count, self.rate))
+
+    def get_counts(self) -> list[ReportCountType] | None:
+        return self.backend.get_counts()
+
+
+def load_backend(path: str, options: dict[str, Any]) -> BaseReportBackend:
+    backend_class = import_string(path)
+    return backend_class(**options)
+
+
+@lru_cache
+def get_report_backend() -> BaseReportBackend:
+    """Return the backend configured in CSP_REPORT_BACKEND."""
+    return load_backend(CSP_REPORT_BACKEND, CSP_REPORT_BACKEND_OPTIONS)
@@ -1,15 +1,23 @@
 from __future__ import annotations
 
 import logging
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
 
 from django.core.cache import cache
+from django.db import router, transaction
 
-from .models import CspReportBlacklist, ReportData
-from .settings import CSP_CACHE_TIMEOUT, PolicyType
+from .models import CspReportBlacklist
+from .routers import rules_cache_timeout
+from .settings import CSP_RULES_READ_DATABASE
+
+if TYPE_CHECKING:
+    from .records import ReportType
 
 logger = logging.getLogger(__name__)
 
-CACHE_KEY_BLACKLIST = "csp::blacklist"
+# {host: {directive: [blocked_uri]}} - the "" host applies to all hosts
+CACHE_KEY_BLACKLIST = "csp::blacklist::hosts"
 
 
 def clear_cache() -> None:
@@ -18,26 +26,44 @@ def clear_cache() -> None:
     cache.delete(CACHE_KEY_BLACKLIST)
 
 
-def refresh_cache() -> None:
-    """Refresh the cached blacklist."""
+def refresh_cache(using: str | None = None) -> None:
+    """Refresh the cached blacklist - from `using`, or CSP_RULES_READ_DATABASE."""
     logger.debug("Refreshing CSP blacklist cache")
-    blacklist = CspReportBlacklist.objects.all().as_dict()
-    cache.set(CACHE_KEY_BLACKLIST, blacklist, CSP_CACHE_TIMEOUT)
+    entries = CspReportBlacklist.objects.using(using or CSP_RULES_READ_DATABASE)
+    cache.set(CACHE_KEY_BLACKLIST, entries.as_host_dict(), rules_cache_timeout(using))
+
+
+def blacklist_changed() -> None:
+    """
+    Clear the cached blacklist after a change.
+
+    If CSP_RULES_READ_DATABASE is set then, once the change is committed,
+    the blacklist is rebuilt from the primary - as the replica may lag.
+
+    """
+    clear_cache()
+    if CSP_RULES_READ_DATABASE:
+        using = router.db_for_write(CspReportBlacklist)
+        transaction.on_commit(lambda: refresh_cache(using=using), using=using)
 
 
-def get_blacklist(directive: str) -> PolicyType:
-    """Fetch the CSP blacklist from cache."""
+def get_blacklist(directive: str, host: str = "") -> list[str]:
+    """Fetch the CSP blacklist for a directive (and host) from cache."""
     # must check against None as default blacklist is falsey {}
-    if (blacklist := cache.get(CACHE_KEY_BLACKLIST)) is not None:
-        return blacklist.get(directive, [])
-    refresh_cache()
-    return get_blacklist(directive)
+    if (blacklist := cache.get(CACHE_KEY_BLACKLIST)) is None:
+        refresh_cache()
+        return get_blacklist(directive, host)
+    sources = blacklist.get("", {}).get(directive, [])
+    if host and host in blacklist:
+        return sources + blacklist[host].get(directive, [])
+    return sources
 
 
-def is_blacklisted(report: ReportData) -> bool:
+def is_blacklisted(report: ReportType) -> bool:
     """Return True if the report should be ignored."""
     # blacklist anything that doesn't have an effective_directive
     if not report.effective_directive:
         return True
-    blacklisted_sources = get_blacklist(report.effective_directive)
+    host = urlsplit(report.document_uri or "").hostname or ""
+    blacklisted_sources = get_blacklist(report.effective_directive, host)
     return any([b for b in blacklisted_sources if report.blocked_uri.startswith(b)])
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, TypeVar
+
+from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
+from django.db.utils import IntegrityError
+
+from .settings import (
+    CSP_BREAKER_FAILURES,
+    CSP_BREAKER_RESET_TIMEOUT,
+    CSP_BREAKER_SLOW_CALL,
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+T = TypeVar("T")
+
+
+class CircuitOpen(Exception):
+    """Raised by CircuitBreaker.call when the circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Stop calling a failing (or slow) backend for a while.
+
+    After `failures` consecutive failed calls the circuit opens, and
+    calls fail fast (raising CircuitOpen) for `reset_timeout` seconds.
+    After that a single trial call is allowed (half-open) - if it
+    succeeds the circuit closes, otherwise it opens again.
+
+    A call that takes longer than `slow_call` seconds counts as a failure
+    (its result is still returned). Python can't interrupt a blocking
+    call, so the timeouts themselves must be set on the cache / database
+    connections - the breaker stops every request paying them. Exceptions
+    in `ignore` are raised without counting as a failure. If `failures`
+    is 0 then the circuit never opens.
+
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failures: int,
+        reset_timeout: float,
+        slow_call: float,
+        ignore: tuple[type[Exception], ...] = (),
+    ) -> None:
+        self.name = name
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.slow_call = slow_call
+        self.ignore = ignore
+        self.state = CLOSED
+        self.failure_count = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """Return True if calls would currently fail fast."""
+        if self.state == CLOSED:
+            return False
+        return self.state == HALF_OPEN or not self._retry_due()
+
+    def _retry_due(self) -> bool:
+        return time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def _before_call(self) -> None:
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and self._retry_due():
+                # let this call through as the trial
+                self.state = HALF_OPEN
+                return
+            raise CircuitOpen(self.name)
+
+    def _record(self, failed: bool) -> None:
+        with self._lock:
+            if not failed:
+                self.state = CLOSED
+                self.failure_count = 0
+                return
+            self.failure_count += 1
+            if self.state == HALF_OPEN or (
+                self.failures and self.failure_count >= self.failures
+            ):
+                if self.state != OPEN:
+                    logger.warning("Opening CSP circuit breaker '%s'", self.name)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call func, raising CircuitOpen (without calling it) if open."""
+        self._before_call()
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except self.ignore:
+            self._record(failed=False)
+            raise
+        except Exception:
+            self._record(failed=True)
+            raise
+        elapsed = time.monotonic() - start
+        if failed := elapsed > self.slow_call:
+            logger.warning(
+                "Slow call (%.2fs) through CSP circuit breaker '%s'", elapsed, self.name
+            )
+        self._record(failed=failed)
+        return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.failure_count = 0
+
+    def stats(self) -> dict[str, Any]:
+        retry_in = 0.0
+        if self.state == OPEN:
+            retry_in = max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failures": self.failure_count,
+            "retry_in": retry_in,
+        }
+
+
+def _breaker(name: str, ignore: tuple[type[Exception], ...] = ()) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        failures=CSP_BREAKER_FAILURES,
+        reset_timeout=CSP_BREAKER_RESET_TIMEOUT,
+        slow_call=CSP_BREAKER_SLOW_CALL,
+        ignore=ignore,
+    )
+
+
+# reading the policy from the cache (and rebuilding it from the database)
+policy_breaker = _breaker("policy")
+# filtering and saving reports - an IntegrityError (etc.) is the result
+# of concurrent saves, not of a failing database.
+report_breaker = _breaker(
+    "reports", ignore=(IntegrityError, MultipleObjectsReturned, ObjectDoesNotExist)
+)
+
+
+def breaker_stats() -> list[dict[str, Any]]:
+    return [policy_breaker.stats(), report_breaker.stats()]
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import csv
+import datetime
+import json
+from typing import Any, Iterable, Iterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timezone import is_naive, make_aware
+
+from .models import CspReport, CspRule
+
+# {name: (model, fields, field used for the time range filter)}
+EXPORTS: dict[str, tuple[type[CspReport | CspRule], list[str], str]] = {
+    "reports": (
+        CspReport,
+        [
+            "effective_directive",
+            "blocked_uri",
+            "document_uri",
+            "disposition",
+            "request_count",
+            "created_at",
+            "last_updated_at",
+        ],
+        "last_updated_at",
+    ),
+    "rules": (
+        CspRule,
+        ["directive", "value", "enabled", "created_at", "modified_at"],
+        "modified_at",
+    ),
+}
+
+FORMATS = {"csv": "text/csv", "jsonl": "application/jsonl"}
+
+
+def parse_timestamp(value: str) -> datetime.datetime:
+    """Parse an ISO date / datetime, raising ValueError if invalid."""
+    if not (parsed := parse_datetime(value)):
+        if not (date := parse_date(value)):
+            raise ValueError(f"Invalid date / time: '{value}'")
+        parsed = datetime.datetime.combine(date, datetime.time())
+    return make_aware(parsed) if is_naive(parsed) else parsed
+
+
+def export_queryset(
+    name: str,
+    directive: str | None = None,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+) -> QuerySet:
+    """Return the (filtered) queryset for an export, as values."""
+    model, fields, timestamp = EXPORTS[name]
+    queryset = model.objects.all()
+    if directive:
+        directive_field = "effective_directive" if model is CspReport else "directive"
+        queryset = queryset.filter(**{directive_field: directive})
+    if since:
+        queryset = queryset.filter(**{f"{timestamp}__gte": since})
+    if until:
+        queryset = queryset.filter(**{f"{timestamp}__lt": until})
+    return queryset.values("pk", *fields)
+
+
+def iter_rows(queryset: QuerySet, chunk_size: int = 2000) -> Iterator[dict[str, Any]]:
+    """
+    Yield the rows of a values() queryset, in primary key order.
+
+    The rows are fetched one chunk at a time, each chunk a separate
+    (keyset) query starting after the last pk of the previous chunk - so
+    that memory use is constant, and no query / transaction is held open
+    for the duration of the export.
+
+    """
+    last_pk = None
+    while True:
+        chunk = queryset.order_by("pk")
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        count = 0
+        for row in chunk[:chunk_size].iterator(chunk_size=chunk_size):
+            last_pk = row.pop("pk")
+            count += 1
+            yield row
+        if count < chunk_size:
+            return
+
+
+class _Echo:
+    """File-like object that returns what is written - for csv.writer."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def format_csv(rows: Iterable[dict[str, Any]], fields: list[str]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[f] for f in fields])
+
+
+def format_jsonl(rows: Iterable[dict[str, Any]]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+def export(
+    name: str, fmt: str, chunk_size: int = 2000, **filters: Any
+) -> Iterator[str]:
+    """Return an iterator of formatted lines for an export."""
+    rows = iter_rows(export_queryset(name, **filters), chunk_size=chunk_size)
+    if fmt == "csv":
+        return format_csv(rows, EXPORTS[name][1])
+    if fmt == "jsonl":
+        return format_jsonl(rows)
+    raise ValueError(f"Invalid export format: '{fmt}'")
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from typing import Callable, Iterable
+
+from django.http import HttpRequest, HttpResponse
+
+from .settings import (
+    CSP_EXCLUDE_PATHS,
+    CSP_EXCLUDE_STREAMING_RESPONSES,
+    CSP_EXCLUDE_URL_NAMES,
+    CSP_INCLUDE_CONTENT_TYPES,
+    CSP_INCLUDE_PATHS,
+    CSP_INCLUDE_STATUS_CODES,
+    process_request,
+    process_response,
+)
+
+
+class HeaderFilter:
+    """
+    Decide whether a response should get the CSP header.
+
+    The include / exclude settings are compiled once, on init, into
+    tuples (for `str.startswith`) and frozensets, so that each check is
+    a single lookup. The checks are ordered so that the most common
+    rejection - a non-HTML response - is the first. If `content_types`
+    is empty then the content type is not checked.
+
+    """
+
+    def __init__(
+        self,
+        content_types: Iterable[str] | None = ("text/html",),
+        include_paths: Iterable[str] | None = None,
+        exclude_paths: Iterable[str] = (),
+        exclude_url_names: Iterable[str] = (),
+        status_codes: Iterable[int] | None = None,
+        exclude_streaming: bool = False,
+        request_func: Callable[[HttpRequest], bool] | None = None,
+        response_func: Callable[[HttpResponse], bool] | None = None,
+    ) -> None:
+        self.content_types = frozenset(c.lower() for c in content_types or ())
+        self.include_paths = tuple(include_paths) if include_paths else None
+        self.exclude_paths = tuple(exclude_paths)
+        self.exclude_url_names = frozenset(exclude_url_names)
+        self.status_codes = frozenset(status_codes) if status_codes else None
+        self.exclude_streaming = exclude_streaming
+        self.request_func = request_func
+        self.response_func = response_func
+
+    @classmethod
+    def from_settings(cls) -> HeaderFilter:
+        content_types = CSP_INCLUDE_CONTENT_TYPES
+        if content_types is None:
+            # a response func replaces the default (HTML only) check
+            content_types = [] if process_response else ["text/html"]
+        return cls(
+            content_types=content_types,
+            include_paths=CSP_INCLUDE_PATHS,
+            exclude_paths=CSP_EXCLUDE_PATHS,
+            exclude_url_names=CSP_EXCLUDE_URL_NAMES,
+            status_codes=CSP_INCLUDE_STATUS_CODES,
+            exclude_streaming=CSP_EXCLUDE_STREAMING_RESPONSES,
+            request_func=process_request,
+            response_func=process_response,
+        )
+
+    def __call__(self, request: HttpRequest, response: HttpResponse) -> bool:
+        """Return True if the response should have the CSP header."""
+        return self.match_response(response) and self.match_request(request)
+
+    def match_response(self, response: HttpResponse) -> bool:
+        if self.content_types:
+            content_type = response.get("Content-Type", "").partition(";")[0]
+            if content_type.strip().lower() not in self.content_types:
+                return False
+        if self.status_codes and response.status_code not in self.status_codes:
+            return False
+        if self.exclude_streaming and response.streaming:
+            return False
+        if self.response_func and not self.response_func(response):
+            return False
+        return True
+
+    def match_request(self, request: HttpRequest) -> bool:
+        path = request.path_info
+        if self.include_paths and not path.startswith(self.include_paths):
+            return False
+        if self.exclude_paths and path.startswith(self.exclude_paths):
+            return False
+        if self.exclude_url_names and (match := request.resolver_match):
+            if match.view_name in self.exclude_url_names:
+                return False
+        if self.request_func and not self.request_func(request):
+            return False
+        return True
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import gzip
+import logging
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import IO, Iterable, Iterator
+
+from .backends import get_report_backend
+from .records import ReportRecord, parse_log_lines
+from .views import filter_report
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+ParsedChunkType = tuple[list[ReportRecord], int]
+
+
+@dataclass
+class IngestStats:
+    reports: int = 0  # valid reports read
+    invalid: int = 0  # lines that are not valid report bodies
+    dropped: int = 0  # reports that are blacklisted / allowed by the policy
+    saved: int = 0  # violations written (after aggregation)
+
+
+def open_log(path: str) -> IO[str]:
+    """Open a (possibly gzipped) log file for reading as text."""
+    with open(path, "rb") as f:
+        gzipped = f.read(2) == GZIP_MAGIC
+    if gzipped:
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def read_chunks(paths: Iterable[str], chunk_size: int) -> Iterator[list[str]]:
+    """Yield the lines of the files, in lists of up to chunk_size lines."""
+    chunk: list[str] = []
+    for path in paths:
+        with open_log(path) as f:
+            for line in f:
+                chunk.append(line)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def parse_chunks(
+    chunks: Iterable[list[str]], workers: int
+) -> Iterator[ParsedChunkType]:
+    """
+    Parse chunks of lines, in order, using a pool of worker processes.
+
+    No more than two chunks per worker are in flight at once, so memory
+    use does not depend on the size of the input. If workers < 2 then the
+    chunks are parsed in this process.
+
+    """
+    if workers < 2:
+        yield from map(parse_log_lines, chunks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: deque[Future[ParsedChunkType]] = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(parse_log_lines, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def ingest_reports(
+    paths: Iterable[str],
+    batch_size: int = 500,
+    workers: int = 0,
+    chunk_size: int = 1000,
+) -> IngestStats:
+    """
+    Store the reports in JSONL (or gzipped JSONL) files of report bodies.
+
+    Reports are filtered as they are by the report_uri view, and are then
+    aggregated by violation - when `batch_size` distinct violations have
+    been read they are saved in bulk by the report backend, with the
+    latest report used for the document_uri and disposition.
+
+    """
+    stats = IngestStats()
+    backend = get_report_backend()
+    batch: dict[tuple[str, str], tuple[ReportRecord, int]] = {}
+
+    def flush() -> None:
+        backend.save_counts(list(batch.values()))
+        logger.debug("Saved %s aggregated CSP reports", len(batch))
+        stats.saved += len(batch)
+        batch.clear()
+
+    for records, invalid in parse_chunks(read_chunks(paths, chunk_size), workers):
+        stats.invalid += invalid
+        stats.reports += len(records)
+        for record in records:
+            if not filter_report(record):
+                stats.dropped += 1
+                continue
+            key = (record.effective_directive, record.blocked_uri)
+            _, count = batch.pop(key, (record, 0))
+            batch[key] = (record, count + 1)
+            if len(batch) >= batch_size:
+                flush()
+    if batch:
+        flush()
+    return stats
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import json
+import logging
+import random
+import time
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# all generated blocked_uri values are in this (reserved) domain, so that
+# the reports can be identified, and deleted, after the test.
+LOADTEST_DOMAIN = "loadtest.invalid"
+BLACKLISTED_URI = f"https://blacklisted.{LOADTEST_DOMAIN}"
+
+DIRECTIVES = [
+    "connect-src",
+    "font-src",
+    "frame-src",
+    "img-src",
+    "script-src",
+    "style-src",
+]
+
+LEGACY_CONTENT_TYPE = "application/csp-report"
+REPORTING_API_CONTENT_TYPE = "application/reports+json"
+
+
+@dataclass
+class LoadTestConfig:
+    requests: int = 2000
+    concurrency: int = 4
+    # 0..1 ratios of the requests that are...
+    unique_ratio: float = 0.1  # a new (directive, blocked_uri) pair
+    blacklisted_ratio: float = 0.0  # a blacklisted pair
+    invalid_ratio: float = 0.0  # an invalid payload
+    reporting_api_ratio: float = 0.0  # Reporting API format (vs. legacy)
+    # number of distinct pairs that repeated reports are drawn from
+    pool_size: int = 100
+    seed: int = 0
+    # path to a JSONL file of payloads to replay instead
+    replay: str | None = None
+
+
+@dataclass
+class LoadTestResult:
+    latencies: list[float] = field(default_factory=list)
+    statuses: Counter[int] = field(default_factory=Counter)
+    queries: int = 0
+
+    def merge(self, other: LoadTestResult) -> None:
+        self.latencies.extend(other.latencies)
+        self.statuses.update(other.statuses)
+        self.queries += other.queries
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def legacy_payload(directive: str, blocked_uri: str, document_uri: str) -> bytes:
+    """Return a report-uri (application/csp-report) payload."""
+    report = {
+        "document-uri": document_uri,
+        "referrer": "",
+        "violated-directive": directive,
+        "effective-directive": directive,
+        "original-policy": "default-src 'self'; report-uri /csp/report-uri/",
+        "disposition": "report",
+        "blocked-uri": blocked_uri,
+        "status-code": 200,
+        "script-sample": "",
+    }
+    return json.dumps({"csp-report": report}).encode()
+
+
+def reporting_api_payload(directive: str, blocked_uri: str, document_uri: str) -> bytes:
+    """Return a Reporting API (application/reports+json) payload."""
+    report = {
+        "type": "csp-violation",
+        "age": 10,
+        "url": document_uri,
+        "user_agent": "Mozilla/5.0 (loadtest)",
+        "body": {
+            "documentURL": document_uri,
+            "referrer": "",
+            "effectiveDirective": directive,
+            "originalPolicy": "default-src 'self'; report-to csp",
+            "disposition": "report",
+            "blockedURL": blocked_uri,
+            "statusCode": 200,
+            "sample": "",
+        },
+    }
+    return json.dumps([report]).encode()
+
+
+def generate_payloads(
+    config: LoadTestConfig, worker: int, count: int
+) -> Iterator[tuple[bytes, str]]:
+    """Yield (payload, content_type) tuples for a worker."""
+    rng = random.Random(f"{config.seed}:{worker}")  # noqa: S311
+    for i in range(count):
+        roll = rng.random()
+        if roll < config.invalid_ratio:
+            yield b'{"csp-report": {"document-uri": "', LEGACY_CONTENT_TYPE
+            continue
+        directive = rng.choice(DIRECTIVES)
+        roll -= config.invalid_ratio
+        if roll < config.blacklisted_ratio:
+            directive, blocked_uri = "img-src", BLACKLISTED_URI
+        elif roll - config.blacklisted_ratio < config.unique_ratio:
+            blocked_uri = f"https://w{worker}-{i}.unique.{LOADTEST_DOMAIN}/x.js"
+        else:
+            blocked_uri = (
+                f"https://cdn-{rng.randrange(config.pool_size)}.{LOADTEST_DOMAIN}"
+            )
+        document_uri = f"https://www.{LOADTEST_DOMAIN}/page/{rng.randrange(50)}"
+        if rng.random() < config.reporting_api_ratio:
+            yield reporting_api_payload(
+                directive, blocked_uri, document_uri
+            ), REPORTING_API_CONTENT_TYPE
+        else:
+            yield legacy_payload(
+                directive, blocked_uri, document_uri
+            ), LEGACY_CONTENT_TYPE
+
+
+def replay_payloads(
+    path: str, worker: int, workers: int
+) -> Iterator[tuple[bytes, str]]:
+    """Yield this worker's share of the payloads in a JSONL file."""
+    with open(path, "rb") as f:
+        for i, line in enumerate(f):
+            if i % workers != worker or not line.strip():
+                continue
+            content_type = (
+                REPORTING_API_CONTENT_TYPE
+                if line.lstrip().startswith(b"[")
+                else LEGACY_CONTENT_TYPE
+            )
+            yield line.strip(), content_type
+
+
+def _worker_init() -> None:
+    # required if the pool uses "spawn" rather than "fork"
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def run_worker(config: LoadTestConfig, worker: int, count: int) -> LoadTestResult:
+    """POST payloads to the report_uri view, in-process, and time them."""
+    from django.db import connection
+    from django.test import RequestFactory
+
+    from .views import report_uri
+
+    factory = RequestFactory()
+    result = LoadTestResult()
+
+    def count_queries(execute: Callable, *args: Any) -> Any:
+        result.queries += 1
+        return execute(*args)
+
+    if config.replay:
+        payloads = replay_payloads(config.replay, worker, config.concurrency)
+    else:
+        payloads = generate_payloads(config, worker, count)
+    with connection.execute_wrapper(count_queries):
+        for payload, content_type in payloads:
+            request = factory.post(
+                "/csp/report-uri/", data=payload, content_type=content_type
+            )
+            start = time.perf_counter()
+            try:
+                status_code = report_uri(request).status_code
+            except Exception:
+                # e.g. database lock timeouts - Django would return a 500
+                logger.exception("Error in report_uri view")
+                status_code = 500
+            result.latencies.append(time.perf_counter() - start)
+            result.statuses[status_code] += 1
+    return result
+
+
+def save_pending(timeout: float | None = None) -> None:
+    """Save the reports / summary counts that this process has not yet saved."""
+    from .models import CspReportSummary
+    from .report_queue import join_report_queue
+
+    if not join_report_queue(timeout):
+        logger.warning("Timed out waiting for the report queue to drain")
+    CspReportSummary.objects.flush()
+
+
+def cleanup(timeout: float | None = None) -> dict[str, int]:
+    """
+    Delete the load test reports, and the rows derived from them.
+
+    Queued reports (CSP_REPORT_ASYNC) and buffered summary counts are
+    saved first, so that they are not left behind - then the counter
+    shards, summary rows, reports and blacklist entry are deleted.
+    Returns the number of rows deleted, by model name.
+
+    """
+    from .models import (
+        CspReport,
+        CspReportBlacklist,
+        CspReportCounterShard,
+        CspReportSummary,
+    )
+
+    save_pending(timeout)
+    lookup = f".{LOADTEST_DOMAIN}"
+    return {
+        model.__name__: queryset.delete()[0]
+        for model, queryset in [
+            (
+                CspReportCounterShard,
+                CspReportCounterShard.objects.filter(
+                    report__blocked_uri__contains=lookup
+                ),
+            ),
+            (CspReportSummary, CspReportSummary.objects.filter(uri__contains=lookup)),
+            (CspReport, CspReport.objects.filter(blocked_uri__contains=lookup)),
+            (
+                CspReportBlacklist,
+                CspReportBlacklist.objects.filter(blocked_uri=BLACKLISTED_URI),
+            ),
+        ]
+    }
+
+
+def _run_pooled_worker(
+    config: LoadTestConfig, worker: int, count: int
+) -> LoadTestResult:
+    from django.db import connection
+
+    try:
+        return run_worker(config, worker, count)
+    finally:
+        # a worker process' queue / summary buffer is lost when it exits
+        save_pending()
+        # each thread / process has its own connection
+        connection.close()
+
+
+def run_loadtest(config: LoadTestConfig, use_processes: bool = False) -> LoadTestResult:
+    """Run the load test across `concurrency` threads / processes."""
+    workers = max(config.concurrency, 1)
+    counts = [
+        config.requests // workers + (1 if i < config.requests % workers else 0)
+        for i in range(workers)
+    ]
+    result = LoadTestResult()
+    if workers == 1:
+        result.merge(run_worker(config, 0, counts[0]))
+        return result
+    executor: Executor
+    if use_processes:
+        from django.db import connections
+
+        # don't share the parent's connections with forked workers
+        connections.close_all()
+        executor = ProcessPoolExecutor(workers, initializer=_worker_init)
+    else:
+        executor = ThreadPoolExecutor(workers)
+    with executor:
+        futures = [
+            executor.submit(_run_pooled_worker, config, i, counts[i])
+            for i in range(workers)
+        ]
+        for future in futures:
+            result.merge(future.result())
+    return result
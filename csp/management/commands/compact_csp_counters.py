@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from csp.models import CspReportCounterShard
+
+
+class Command(BaseCommand):
+    help = "Folds sharded CSP report counts back into the reports"  # noqa: A003
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of shard rows to fold in each transaction.",
+        )
+
+    def handle(self, *args: object, **options: object) -> None:
+        folded = CspReportCounterShard.objects.compact(
+            chunk_size=int(str(options["chunk_size"]))
+        )
+        self.stdout.write(f"Folded {folded} CSP report counter shards.")
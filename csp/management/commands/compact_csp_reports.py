@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import router, transaction
+from django.db.models import F
+
+from csp.models import CspReport, CspReportCounterShard
+from csp.normalization import normalize_uri
+
+
+class Command(BaseCommand):
+    help = (  # noqa: A003
+        "Merges stored CSP violation reports using CSP_REPORT_NORMALIZATION"
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of reports to process in each transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be merged, without updating anything.",
+        )
+
+    def handle(self, *args: object, **options: object) -> None:
+        chunk_size = int(str(options["chunk_size"]))
+        dry_run = bool(options["dry_run"])
+        if not dry_run:
+            # the shards of merged reports would otherwise be deleted
+            CspReportCounterShard.objects.compact(chunk_size=chunk_size)
+        last_pk, scanned, merged = 0, 0, 0
+        while True:
+            # keyset pagination - avoids OFFSET, and isn't affected by
+            # the rows deleted in the previous chunk.
+            chunk = list(
+                CspReport.objects.filter(pk__gt=last_pk).order_by("pk")[:chunk_size]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            scanned += len(chunk)
+            merged += self.compact(chunk, dry_run)
+        prefix = "[dry-run] Would merge" if dry_run else "Merged"
+        self.stdout.write(f"{prefix} {merged} of {scanned} CspReport objects.")
+
+    def compact(self, reports: list[CspReport], dry_run: bool) -> int:
+        """Merge reports whose normalized blocked_uri differs, return count."""
+        stale = [
+            (report, normalize_uri(report.effective_directive, report.blocked_uri))
+            for report in reports
+        ]
+        stale = [(r, uri) for r, uri in stale if uri != r.blocked_uri]
+        if dry_run or not stale:
+            return len(stale)
+        with transaction.atomic(using=router.db_for_write(CspReport)):
+            for report, blocked_uri in stale:
+                target, _ = CspReport.objects.get_or_create(
+                    effective_directive=report.effective_directive,
+                    blocked_uri=blocked_uri,
+                    defaults={
+                        "document_uri": report.document_uri,
+                        "disposition": report.disposition,
+                        "created_at": report.created_at,
+                        "last_updated_at": report.last_updated_at,
+                    },
+                )
+                target.request_count = F("request_count") + report.request_count
+                target.created_at = min(target.created_at, report.created_at)
+                target.last_updated_at = max(
+                    target.last_updated_at, report.last_updated_at
+                )
+                target.save()
+                report.delete()
+        return len(stale)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from csp.policy_file import compile_policy, write_policy_file
+from csp.settings import CSP_POLICY_FILE
+
+
+class Command(BaseCommand):
+    help = "Compiles the CSP (settings + enabled rules) to a file"  # noqa: A003
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default=CSP_POLICY_FILE,
+            help="Output file path - defaults to CSP_POLICY_FILE.",
+        )
+
+    def handle(self, *args: object, **options: object) -> None:
+        if not (path := options["path"]):
+            raise CommandError("No path supplied, and CSP_POLICY_FILE is not set.")
+        compiled = compile_policy()
+        write_policy_file(str(path), compiled)
+        self.stdout.write(
+            f"Compiled CSP version {compiled['version']} "
+            f"({len(compiled['policy'])} directives) to {path}."
+        )
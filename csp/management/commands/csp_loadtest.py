@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from csp.loadtest import (
+    BLACKLISTED_URI,
+    LoadTestConfig,
+    LoadTestResult,
+    cleanup,
+    run_loadtest,
+)
+from csp.models import CspReportBlacklist
+
+
+class Command(BaseCommand):
+    help = (  # noqa: A003
+        "Load tests the report-uri view (in-process) with generated or "
+        "replayed reports. NB this saves reports to the database."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        defaults = LoadTestConfig()
+        parser.add_argument("--requests", type=int, default=defaults.requests)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=defaults.concurrency,
+            help="Number of threads / processes sending reports.",
+        )
+        parser.add_argument(
+            "--processes",
+            action="store_true",
+            help="Use a process pool rather than threads.",
+        )
+        for name, help_text in [
+            ("unique", "Ratio of reports for a new (directive, blocked_uri)."),
+            ("blacklisted", "Ratio of reports for a blacklisted violation."),
+            ("invalid", "Ratio of invalid (malformed) reports."),
+            ("reporting-api", "Ratio of Reporting API (vs. report-uri) reports."),
+        ]:
+            parser.add_argument(
+                f"--{name}-ratio",
+                type=float,
+                default=getattr(defaults, f"{name.replace('-', '_')}_ratio"),
+                help=help_text,
+            )
+        parser.add_argument(
+            "--pool-size",
+            type=int,
+            default=defaults.pool_size,
+            help="Number of distinct violations that repeated reports use.",
+        )
+        parser.add_argument("--seed", type=int, default=defaults.seed)
+        parser.add_argument(
+            "--replay",
+            help="JSONL file of report payloads to send, instead of generating them.",
+        )
+        parser.add_argument(
+            "--cleanup",
+            action="store_true",
+            help="Delete the generated reports (and blacklist entry etc.) afterwards.",
+        )
+
+    def handle(self, *args: object, **options: object) -> None:
+        config = LoadTestConfig(
+            requests=int(str(options["requests"])),
+            concurrency=int(str(options["concurrency"])),
+            unique_ratio=float(str(options["unique_ratio"])),
+            blacklisted_ratio=float(str(options["blacklisted_ratio"])),
+            invalid_ratio=float(str(options["invalid_ratio"])),
+            reporting_api_ratio=float(str(options["reporting_api_ratio"])),
+            pool_size=int(str(options["pool_size"])),
+            seed=int(str(options["seed"])),
+            replay=str(options["replay"]) if options["replay"] else None,
+        )
+        if config.blacklisted_ratio:
+            CspReportBlacklist.objects.get_or_create(
+                directive="img-src", blocked_uri=BLACKLISTED_URI
+            )
+        start = time.perf_counter()
+        result = run_loadtest(config, use_processes=bool(options["processes"]))
+        self.write_result(result, time.perf_counter() - start)
+        if options["cleanup"]:
+            deleted = cleanup()
+            self.stdout.write(
+                "Deleted "
+                + ", ".join(f"{count} {name}" for name, count in deleted.items())
+                + " objects."
+            )
+
+    def write_result(self, result: LoadTestResult, elapsed: float) -> None:
+        total = len(result.latencies)
+        statuses = ", ".join(f"{k}: {v}" for k, v in sorted(result.statuses.items()))
+        for label, value in [
+            ("Requests", f"{total:,}"),
+            ("Elapsed", f"{elapsed:.2f}s"),
+            ("Throughput", f"{total / elapsed:,.0f} reports/sec"),
+            ("Latency p50", f"{result.percentile(50) * 1000:.2f}ms"),
+            ("Latency p90", f"{result.percentile(90) * 1000:.2f}ms"),
+            ("Latency p99", f"{result.percentile(99) * 1000:.2f}ms"),
+            ("Latency max", f"{result.percentile(100) * 1000:.2f}ms"),
+            (
+                "Queries",
+                f"{result.queries:,} ({result.queries / max(total, 1):.2f}/request)",
+            ),
+            ("Status codes", statuses),
+        ]:
+            self.stdout.write(f"{label:<16} {value}")
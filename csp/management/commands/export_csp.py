@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from csp.export import EXPORTS, FORMATS, export, parse_timestamp
+
+
+class Command(BaseCommand):
+    help = "Exports CSP violation reports or rules as CSV / JSONL"  # noqa: A003
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("name", choices=list(EXPORTS), help="What to export.")
+        parser.add_argument(
+            "--format", dest="fmt", choices=list(FORMATS), default="csv"
+        )
+        parser.add_argument("--directive", help="Only export this directive.")
+        parser.add_argument(
+            "--since", type=parse_timestamp, help="ISO date / time (inclusive)."
+        )
+        parser.add_argument(
+            "--until", type=parse_timestamp, help="ISO date / time (exclusive)."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Number of rows to read from the database at a time.",
+        )
+        parser.add_argument(
+            "--output", "-o", help="Output file path - defaults to stdout."
+        )
+
+    def handle(self, *args: object, **options: object) -> None:
+        lines = export(
+            str(options["name"]),
+            str(options["fmt"]),
+            chunk_size=int(str(options["chunk_size"])),
+            directive=options["directive"],
+            since=options["since"],
+            until=options["until"],
+        )
+        if not (path := options["output"]):
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+        with open(str(path), "w", newline="") as f:
+            f.writelines(lines)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from csp.rules_file import FORMATS, dumps_rules, export_rules, get_format
+
+
+class Command(BaseCommand):
+    help = "Exports CSP rules to a JSON / YAML file"  # noqa: A003
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "path", nargs="?", help="Output file path - defaults to stdout."
+        )
+        parser.add_argument(
+            "--format",
+            dest="fmt",
+            choices=FORMATS,
+            help="File format - defaults to the file extension, or JSON.",
+        )
+        parser.add_argument(
+            "--enabled-only", action="store_true", help="Only export enabled rules."
+        )
+
+    def handle(self, *args: object, **options: object) -> None:
+        path = str(options["path"]) if options["path"] else None
+        fmt = str(options["fmt"]) if options["fmt"] else None
+        rules = export_rules(enabled_only=bool(options["enabled_only"]))
+        try:
+            output = dumps_rules(rules, get_format(path, fmt))
+        except ValueError as ex:
+            raise CommandError(ex) from ex
+        if not path:
+            self.stdout.write(output, ending="")
+            return
+        with open(path, "w") as f:
+            f.write(output)
+        self.stderr.write(f"Exported {len(rules)} CSP rules to {path}.")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from csp.rules_file import FORMATS, get_format, import_rules, loads_rules, parse_rules
+from csp.settings import CSP_POLICY_FILE
+
+
+class Command(BaseCommand):
+    help = "Imports (creates / updates) CSP rules from a JSON / YAML file"  # noqa: A003
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("path", help="Rules file, as output by export_csp_rules.")
+        parser.add_argument(
+            "--format",
+            dest="fmt",
+            choices=FORMATS,
+            help="File format - defaults to the file extension, or JSON.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show the changes that would be made, without saving them.",
+        )
+
+    def handle(self, *args: object, **options: object) -> None:
+        path = str(options["path"])
+        fmt = str(options["fmt"]) if options["fmt"] else None
+        try:
+            with open(path) as f:
+                rules = loads_rules(f.read(), get_format(path, fmt))
+            diff = import_rules(parse_rules(rules), dry_run=bool(options["dry_run"]))
+        except (OSError, ValueError) as ex:
+            raise CommandError(ex) from ex
+        for line in diff.lines():
+            self.stdout.write(line)
+        prefix = "[dry-run] Would import" if options["dry_run"] else "Imported"
+        self.stdout.write(
+            f"{prefix} {len(diff.created)} new, {len(diff.updated)} updated "
+            f"({diff.unchanged} unchanged) CSP rules."
+        )
+        if CSP_POLICY_FILE and diff.changed and not options["dry_run"]:
+            self.stdout.write("CSP_POLICY_FILE is set - run compile_csp to update it.")
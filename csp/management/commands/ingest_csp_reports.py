@@ -0,0 +1,47 @@
+import os
+from typing import cast
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from csp.ingest import ingest_reports
+
+
+class Command(BaseCommand):
+    help = "Stores CSP reports read from JSONL (or gzipped JSONL) files"  # noqa: A003
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "paths",
+            nargs="+",
+            help="Files with one report-uri request body (JSON) per line.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of distinct violations to aggregate before saving.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of processes used to parse the files (0 to disable).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of lines sent to a worker process at a time.",
+        )
+
+    def handle(self, *args: object, **options: object) -> None:
+        stats = ingest_reports(
+            cast(list[str], options["paths"]),
+            batch_size=int(str(options["batch_size"])),
+            workers=int(str(options["workers"])),
+            chunk_size=int(str(options["chunk_size"])),
+        )
+        self.stdout.write(
+            f"Read {stats.reports} CSP reports ({stats.invalid} invalid lines), "
+            f"dropped {stats.dropped}, saved {stats.saved} violations."
+        )
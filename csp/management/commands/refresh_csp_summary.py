@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from csp.models import CspReportSummary
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the CSP violation summary from the stored reports"  # noqa: A003
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Number of reports to read from the database at a time.",
+        )
+
+    def handle(self, *args: object, **options: object) -> None:
+        count = CspReportSummary.objects.rebuild(
+            chunk_size=int(str(options["chunk_size"]))
+        )
+        self.stdout.write(f"Rebuilt CSP violation summary ({count} rows).")
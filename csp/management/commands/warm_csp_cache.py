@@ -0,0 +1,29 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandParser
+
+from csp.blacklist import CACHE_KEY_BLACKLIST
+from csp.policy import CACHE_KEY_RULES, is_cache_valid, warm_cache
+
+
+class Command(BaseCommand):
+    help = "Builds and caches the CSP and the report blacklist"  # noqa: A003
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--if-stale",
+            action="store_true",
+            help="Only rebuild the cache if it's missing or out-of-date.",
+        )
+
+    def handle(self, *args: object, **options: object) -> None:
+        if options["if_stale"] and is_cache_valid():
+            self.stdout.write("CSP cache is valid - nothing to do.")
+            return
+        warm_cache()
+        csp, report_uri = cache.get(CACHE_KEY_RULES)
+        blacklist = cache.get(CACHE_KEY_BLACKLIST)
+        entries = sum(len(v) for b in blacklist.values() for v in b.values())
+        self.stdout.write(
+            f"Cached CSP ({len(csp) + len(report_uri)} bytes) and "
+            f"blacklist ({entries} entries)."
+        )
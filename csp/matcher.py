@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from functools import lru_cache
+from typing import TYPE_CHECKING
+from urllib.parse import SplitResult, urlsplit
+
+from django.core.cache import cache
+
+from .minimize import FALLBACKS, NETWORK_SCHEMES, SCHEME_SOURCE, HostSource
+from .policy import get_policy_header
+from .settings import CSP_HOST_POLICIES, PolicyType
+
+if TYPE_CHECKING:
+    from .records import ReportType
+
+logger = logging.getLogger(__name__)
+
+# count of the reports dropped because the policy allows them
+CACHE_KEY_COVERED = "csp::reports::covered"
+
+DEFAULT_PORTS = {"http": 80, "https": 443, "ws": 80, "wss": 443}
+
+# a source with the first scheme also matches the second (CSP3 upgrades)
+UPGRADES = {"http": "https", "ws": "wss"}
+
+
+def parse_header(header: str) -> PolicyType:
+    """Parse a CSP header value into {directive: [values]}."""
+    policy: PolicyType = {}
+    for directive in header.split(";"):
+        if tokens := directive.split():
+            policy.setdefault(tokens[0].lower(), tokens[1:])
+    return policy
+
+
+def _scheme_matches(source: str, scheme: str) -> bool:
+    return scheme == source or scheme == UPGRADES.get(source)
+
+
+def _port(url: SplitResult) -> int | None:
+    try:
+        return url.port or DEFAULT_PORTS.get(url.scheme)
+    except ValueError:
+        return None
+
+
+class SourceList:
+    """
+    The compiled source list of a single directive.
+
+    Host-sources are indexed by host (and wildcard hosts by domain
+    suffix), so the cost of a match depends on the number of labels in
+    the blocked host - not the number of sources. Matching is
+    conservative: anything that cannot be matched with certainty (e.g.
+    nonces, hashes, 'strict-dynamic') is treated as not allowed.
+
+    """
+
+    def __init__(self, sources: list[str]) -> None:
+        self.keywords: set[str] = set()
+        self.schemes: set[str] = set()
+        self.hosts: dict[str, list[HostSource]] = defaultdict(list)
+        self.wildcards: dict[str, list[HostSource]] = defaultdict(list)
+        for value in (v.lower() for v in sources):
+            if value.startswith("'") or value == "*":
+                self.keywords.add(value)
+            elif match := SCHEME_SOURCE.match(value):
+                self.schemes.add(match["scheme"])
+            elif source := HostSource.parse(value):
+                if source.host.startswith("*"):
+                    # "*.example.com" is indexed under ".example.com"
+                    self.wildcards[source.host[1:]].append(source)
+                else:
+                    self.hosts[source.host].append(source)
+            else:
+                # e.g. the {nonce} placeholder
+                self.keywords.add(value)
+        # nonces / hashes disable 'unsafe-inline', and 'strict-dynamic'
+        # disables host and scheme sources.
+        self.strict = any(
+            k.startswith(("{", "'nonce-", "'sha")) or k == "'strict-dynamic'"
+            for k in self.keywords
+        )
+
+    def allows(self, blocked_uri: str, document_uri: str = "") -> bool:
+        """Return True if the source list allows the blocked uri."""
+        if "://" not in blocked_uri:
+            # "inline", "eval", or a scheme - "data", "blob", etc.
+            return self._allows_keyword(blocked_uri.split(":", 1)[0].lower())
+        if "'strict-dynamic'" in self.keywords:
+            return False
+        url = urlsplit(blocked_uri)
+        if any(_scheme_matches(s, url.scheme) for s in self.schemes):
+            return True
+        if "*" in self.keywords and url.scheme in NETWORK_SCHEMES:
+            return True
+        document = urlsplit(document_uri)
+        if "'self'" in self.keywords and (url.scheme, url.netloc) == (
+            document.scheme,
+            document.netloc,
+        ):
+            return True
+        return any(
+            self._host_matches(source, url, document.scheme or "https")
+            for source in self._candidates(url.hostname or "")
+        )
+
+    def _allows_keyword(self, blocked: str) -> bool:
+        if blocked == "inline":
+            return "'unsafe-inline'" in self.keywords and not self.strict
+        if blocked == "eval":
+            return "'unsafe-eval'" in self.keywords
+        return blocked in self.schemes
+
+    def _candidates(self, host: str) -> list[HostSource]:
+        candidates = list(self.hosts.get(host, []))
+        if "*" in self.hosts:
+            candidates += self.hosts["*"]
+        labels = host.split(".")
+        for i in range(1, len(labels)):
+            candidates += self.wildcards.get("." + ".".join(labels[i:]), [])
+        return candidates
+
+    def _host_matches(self, source: HostSource, url: SplitResult, default: str) -> bool:
+        if not _scheme_matches(source.scheme or default, url.scheme):
+            return False
+        if source.port != "*":
+            port = _port(url)
+            expected = int(source.port) if source.port else None
+            expected = expected or DEFAULT_PORTS.get(source.scheme or url.scheme)
+            # e.g. "http://example.com" (port 80) allows https on 443
+            if port != expected and not (expected == 80 and port == 443):
+                return False
+        if not source.path:
+            return True
+        if source.path.endswith("/"):
+            return url.path.startswith(source.path)
+        return url.path == source.path
+
+
+class PolicyMatcher:
+    """Matches blocked uris against the sources allowed by a policy."""
+
+    def __init__(self, policy: PolicyType) -> None:
+        self.directives: dict[str, SourceList] = {}
+        for directive in {*policy, *FALLBACKS}:
+            # fetch directives fall back to e.g. default-src if missing
+            for name in (directive, *FALLBACKS.get(directive, ())):
+                if name in policy:
+                    self.directives[directive] = SourceList(policy[name])
+                    break
+
+    def allows(self, directive: str, blocked_uri: str, document_uri: str = "") -> bool:
+        """Return True if the policy allows the blocked uri for the directive."""
+        if source_list := self.directives.get(directive):
+            return source_list.allows(blocked_uri, document_uri)
+        return False
+
+
+@lru_cache(maxsize=32)
+def compile_matcher(header: str) -> PolicyMatcher:
+    """Return the matcher for a CSP header - cached by value."""
+    logger.debug("Compiling CSP source matcher")
+    return PolicyMatcher(parse_header(header))
+
+
+def is_allowed_by_policy(report: ReportType) -> bool:
+    """
+    Return True if the current policy already allows the report's source.
+
+    This is the case for reports sent by browsers with a stale policy -
+    e.g. after a violation has been converted to a rule. The policy is
+    read from the cache (or policy file), and the matcher is compiled
+    once per distinct policy.
+
+    """
+    host = ""
+    if CSP_HOST_POLICIES:
+        host = urlsplit(report.document_uri or "").hostname or ""
+    matcher = compile_matcher(get_policy_header(host))
+    return matcher.allows(
+        str(report.effective_directive), report.blocked_uri, report.document_uri or ""
+    )
+
+
+def record_covered_report() -> None:
+    """Increment the count of reports dropped as allowed by the policy."""
+    if not cache.add(CACHE_KEY_COVERED, 1, None):
+        try:
+            cache.incr(CACHE_KEY_COVERED)
+        except ValueError:
+            cache.set(CACHE_KEY_COVERED, 1, None)
+
+
+def covered_report_count() -> int:
+    return cache.get(CACHE_KEY_COVERED, 0)
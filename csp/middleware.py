@@ -3,29 +3,47 @@ import logging
 import os
 import random
 from functools import partial
-from typing import Callable
+from typing import Any, Callable
 
 from django.core.exceptions import MiddlewareNotUsed
 from django.http import HttpRequest, HttpResponse
 from django.utils.functional import SimpleLazyObject
 
+from .filters import HeaderFilter
 from .policy import get_csp
+from .policy_file import get_policy_file
+from .runtime import get_runtime_setting
+from .sampling import get_sampler
 from .settings import (
     CSP_ENABLED,
+    CSP_POLICY_FILE,
     CSP_REPORT_SAMPLING,
     CSP_RESPONSE_HEADER,
     REPORT_TO_HEADER,
     REPORTING_ENDPOINTS_HEADER,
-    process_request,
-    process_response,
+    RESPONSE_HEADERS,
 )
 
 logger = logging.getLogger(__name__)
 
 
-def add_report_uri() -> bool:
+def add_report_uri(request: HttpRequest) -> bool:
     """Return True if we should add the report-uri directive."""
-    return random.random() <= CSP_REPORT_SAMPLING  # noqa: S311
+    # a runtime override takes precedence over adaptive sampling
+    ratio = get_runtime_setting("CSP_REPORT_SAMPLING")
+    if ratio is None and (sampler := get_sampler()):
+        return sampler.sample(request)
+    if ratio is None:
+        ratio = CSP_REPORT_SAMPLING
+    return random.random() <= ratio  # noqa: S311
+
+
+def get_response_header() -> str:
+    """Return the header name - which may be overridden at runtime."""
+    report_only = get_runtime_setting("CSP_REPORT_ONLY")
+    if report_only is None:
+        return CSP_RESPONSE_HEADER
+    return RESPONSE_HEADERS[report_only]
 
 
 class CspNonceMiddleware:
@@ -55,18 +73,39 @@ class CspHeaderMiddleware:
     def __init__(self, get_response: Callable) -> None:
         if not CSP_ENABLED:
             raise MiddlewareNotUsed("Disabling CSPMiddleware")
+        if CSP_POLICY_FILE:
+            # load on startup, so that a missing file fails fast
+            get_policy_file()
         self.get_response = get_response
+        self.header_filter = HeaderFilter.from_settings()
 
     def __call__(self, request: HttpRequest) -> HttpResponse | None:
         response: HttpResponse = self.get_response(request)
-        if not (process_request(request) and process_response(response)):
+        if getattr(request, "_csp_exempt", False):
+            return response
+        if not self.header_filter(request, response):
+            return response
+        if not get_runtime_setting("CSP_ENABLED", True):
+            # the runtime kill-switch
             return response
         self.add_csp_header(request, response)
         self.add_reporting_headers(response)
         return response
 
+    def process_view(
+        self,
+        request: HttpRequest,
+        view_func: Callable,
+        view_args: Any,
+        view_kwargs: Any,
+    ) -> None:
+        if getattr(view_func, "csp_exempt", False):
+            request._csp_exempt = True
+
     def add_csp_header(self, request: HttpRequest, response: HttpResponse) -> None:
-        response.headers[CSP_RESPONSE_HEADER] = get_csp(request, add_report_uri())
+        response.headers[get_response_header()] = get_csp(
+            request, add_report_uri(request)
+        )
 
     def add_reporting_headers(self, response: HttpResponse) -> None:
         if REPORT_TO_HEADER:
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("csp", "0003_csprule_created_at_csprule_modified_at"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="cspreport",
+            name="blocked_uri",
+            field=models.URLField(db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name="cspreport",
+            index=models.Index(
+                fields=["last_updated_at", "id"], name="csp_report_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cspreport",
+            index=models.Index(
+                fields=["request_count", "id"], name="csp_report_count_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="csprule",
+            index=models.Index(
+                fields=["modified_at", "id"], name="csp_rule_modified_idx"
+            ),
+        ),
+    ]
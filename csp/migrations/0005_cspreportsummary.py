@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("csp", "0004_admin_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CspReportSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("source", "Blocked source"),
+                            ("document", "Document"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("directive", models.CharField(blank=True, max_length=50)),
+                ("uri", models.URLField()),
+                ("request_count", models.IntegerField(default=0)),
+                (
+                    "first_seen_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "last_seen_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "verbose_name": "CSP Violation Summary",
+                "verbose_name_plural": "CSP Violation Summaries",
+                "ordering": ["kind", "-request_count"],
+                "unique_together": {("kind", "directive", "uri")},
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("csp", "0005_cspreportsummary"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="cspreportblacklist",
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name="csprule",
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name="cspreportblacklist",
+            name="host",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Only ignore reports from pages on this host (leave blank for all hosts).",
+                max_length=255,
+            ),
+        ),
+        migrations.AddField(
+            model_name="csprule",
+            name="host",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Only apply the rule to this host (leave blank for all hosts).",
+                max_length=255,
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="cspreportblacklist",
+            unique_together={("directive", "blocked_uri", "host")},
+        ),
+        migrations.AlterUniqueTogether(
+            name="csprule",
+            unique_together={("value", "directive", "host")},
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("csp", "0006_host_policies"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CspReportCounterShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("shard", models.PositiveSmallIntegerField()),
+                ("count", models.IntegerField(default=0)),
+                ("document_uri", models.URLField(blank=True)),
+                ("disposition", models.CharField(blank=True, max_length=12)),
+                (
+                    "last_updated_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "report",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="counter_shards",
+                        to="csp.cspreport",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "CSP Violation Counter Shard",
+                "unique_together": {("report", "shard")},
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:43
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("csp", "0007_cspreportcountershard"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CspConfig",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "enabled",
+                    models.BooleanField(
+                        blank=True,
+                        help_text="Overrides CSP_ENABLED. This can only disable the CSP header - the middleware is not loaded if CSP_ENABLED is False.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "report_only",
+                    models.BooleanField(
+                        blank=True, help_text="Overrides CSP_REPORT_ONLY.", null=True
+                    ),
+                ),
+                (
+                    "report_sampling",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Overrides CSP_REPORT_SAMPLING (0..1) - and the adaptive sampling ratio, if enabled.",
+                        null=True,
+                        validators=[
+                            django.core.validators.MinValueValidator(0.0),
+                            django.core.validators.MaxValueValidator(1.0),
+                        ],
+                    ),
+                ),
+                (
+                    "report_throttling",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Overrides CSP_REPORT_THROTTLING (0..1).",
+                        null=True,
+                        validators=[
+                            django.core.validators.MinValueValidator(0.0),
+                            django.core.validators.MaxValueValidator(1.0),
+                        ],
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "CSP Runtime Config",
+                "verbose_name_plural": "CSP Runtime Config",
+            },
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+# copy of CspRule.clean_value as at this migration
+REQUIRE_SINGLE_QUOTE = [
+    "nonce",
+    "none",
+    "report-sample",
+    "self",
+    "strict-dynamic",
+    "unsafe-eval",
+    "unsafe-hashes",
+    "unsafe-inline",
+    "wasm-unsafe-eval",
+]
+REQUIRE_TRAILING_COLON = [
+    "http",
+    "https",
+    "wss",
+    "blob",
+    "data",
+    "mediastream",
+    "filesystem",
+]
+REQUIRE_UNSAFE_PREFIX = ["inline", "eval"]
+
+
+def clean_value(value):
+    value = value.lower()
+    if value in REQUIRE_SINGLE_QUOTE:
+        return f"'{value}'"
+    if value in REQUIRE_TRAILING_COLON:
+        return f"{value}:"
+    if value in REQUIRE_UNSAFE_PREFIX:
+        return f"'unsafe-{value}'"
+    return value.split("?")[0] or value
+
+
+def normalize_rules(apps, schema_editor):
+    CspRule = apps.get_model("csp", "CspRule")
+    rules = list(CspRule.objects.using(schema_editor.connection.alias))
+    for rule in rules:
+        rule.normalized_value = clean_value(rule.value)
+    CspRule.objects.using(schema_editor.connection.alias).bulk_update(
+        rules, ["normalized_value"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("csp", "0008_runtime_config"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CspPolicySnapshot",
+            fields=[
+                (
+                    "version",
+                    models.PositiveIntegerField(primary_key=True, serialize=False),
+                ),
+                ("policies", models.JSONField()),
+                (
+                    "fingerprint",
+                    models.CharField(
+                        help_text="Hash of the settings the policies were built with.",
+                        max_length=32,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "verbose_name": "CSP Policy Snapshot",
+                "ordering": ["-version"],
+            },
+        ),
+        migrations.AddField(
+            model_name="csprule",
+            name="normalized_value",
+            field=models.CharField(default="", editable=False, max_length=255),
+        ),
+        migrations.RunPython(
+            normalize_rules,
+            migrations.RunPython.noop,
+            # so that it is not run against CSP_REPORT_DATABASE (see CspRouter)
+            hints={"model_name": "csprule"},
+        ),
+    ]
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import logging
+import re
+from typing import NamedTuple
+
+from .settings import PolicyType
+
+logger = logging.getLogger(__name__)
+
+# host-source, e.g. "https://*.example.com:443/path/"
+HOST_SOURCE = re.compile(
+    r"^(?:(?P<scheme>[a-z][a-z0-9+.-]*)://)?"
+    r"(?P<host>\*|(?:\*\.)?[a-z0-9-]+(?:\.[a-z0-9-]+)*)"
+    r"(?::(?P<port>\d+|\*))?"
+    r"(?P<path>/.*)?$",
+    re.IGNORECASE,
+)
+
+# scheme-source, e.g. "https:"
+SCHEME_SOURCE = re.compile(r"^(?P<scheme>[a-z][a-z0-9+.-]*):$", re.IGNORECASE)
+
+# schemes matched by the "*" source
+NETWORK_SCHEMES = frozenset([None, "http", "https", "ws", "wss"])
+
+# fetch directives, most specific first, with the directives they fall
+# back to (in order) if they are not in the policy.
+FALLBACKS: dict[str, tuple[str, ...]] = {
+    "script-src-elem": ("script-src", "default-src"),
+    "script-src-attr": ("script-src", "default-src"),
+    "style-src-elem": ("style-src", "default-src"),
+    "style-src-attr": ("style-src", "default-src"),
+    "worker-src": ("child-src", "script-src", "default-src"),
+    "frame-src": ("child-src", "default-src"),
+    "child-src": ("default-src",),
+    "connect-src": ("default-src",),
+    "font-src": ("default-src",),
+    "img-src": ("default-src",),
+    "manifest-src": ("default-src",),
+    "media-src": ("default-src",),
+    "object-src": ("default-src",),
+    "prefetch-src": ("default-src",),
+    "script-src": ("default-src",),
+    "style-src": ("default-src",),
+}
+
+
+class HostSource(NamedTuple):
+    scheme: str | None
+    host: str
+    port: str | None
+    path: str | None
+
+    @classmethod
+    def parse(cls, value: str) -> HostSource | None:
+        if not (match := HOST_SOURCE.match(value)):
+            return None
+        scheme, host, port, path = match.groups()
+        return cls(scheme and scheme.lower(), host.lower(), port, path)
+
+    def covers(self, other: HostSource) -> bool:
+        """Return True if every URL matched by other is matched by self."""
+        if self.host == "*" and not (self.scheme or self.port or self.path):
+            return other.scheme in NETWORK_SCHEMES
+        if self.path or self.scheme != other.scheme:
+            return False
+        if self.port != "*" and self.port != other.port:
+            return False
+        if self.host == "*":
+            return True
+        if self.host.startswith("*."):
+            return other.host.endswith(self.host[1:])
+        return self.host == other.host
+
+
+def _covered(value: str, sources: list[str]) -> bool:
+    """Return True if value is redundant given the other sources."""
+    if not (source := HostSource.parse(value)):
+        return False
+    for other in sources:
+        if other == value:
+            continue
+        if match := SCHEME_SOURCE.match(other):
+            if source.scheme == match["scheme"].lower():
+                return True
+        elif (host := HostSource.parse(other)) and host.covers(source):
+            return True
+    return False
+
+
+def minimize_sources(values: list[str]) -> list[str]:
+    """Remove host-sources that are matched by another source."""
+    return [v for v in values if not _covered(v, values)]
+
+
+def _effective(policy: PolicyType) -> dict[str, frozenset[str] | None]:
+    """Return the sources that apply to each fetch directive."""
+    effective: dict[str, frozenset[str] | None] = {}
+    for directive, fallbacks in FALLBACKS.items():
+        effective[directive] = None
+        for name in (directive, *fallbacks):
+            if name in policy:
+                effective[directive] = frozenset(policy[name])
+                break
+    return effective
+
+
+def minimize_policy(policy: PolicyType) -> PolicyType:
+    """
+    Remove sources and directives that do not change the policy.
+
+    This removes host-sources that are already matched by another source
+    in the same directive (e.g. "https://cdn.example.com" is redundant
+    alongside "https://*.example.com", or "https:"), and then removes
+    fetch directives that are identical to the directive that they would
+    fall back to (e.g. "script-src-elem" that matches "script-src", or
+    "img-src" that matches "default-src").
+
+    The matching is deliberately conservative - e.g. a scheme-less host
+    is never treated as matching a host with a scheme - so that a
+    minimized policy is never more (or less) permissive.
+
+    """
+    minimized = {k: minimize_sources(v) for k, v in policy.items()}
+    target = _effective(minimized)
+    for directive in FALLBACKS:
+        if directive not in minimized:
+            continue
+        candidate = {k: v for k, v in minimized.items() if k != directive}
+        if _effective(candidate) == target:
+            logger.debug('Removing redundant directive "%s"', directive)
+            minimized = candidate
+    return minimized
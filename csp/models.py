@@ -1,71 +1,62 @@
 from __future__ import annotations
 
+import atexit
 import logging
-from collections import defaultdict
-from typing import Any
-
-from django.db import models
-from django.db.models import F
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Iterable
+
+from django.core.cache import cache
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import connections, models, router, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.db.utils import IntegrityError
 from django.utils.timezone import now as tz_now
-from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
-from .settings import PolicyType
-from .utils import strip_query
+from .settings import (
+    CSP_REPORT_COUNTER_SHARDS,
+    CSP_REPORT_SUMMARY,
+    CSP_REPORT_SUMMARY_FLUSH_INTERVAL,
+    PolicyType,
+)
+from .utils import strip_path, strip_query
+
+if TYPE_CHECKING:
+    from .records import ReportType
 
 logger = logging.getLogger(__name__)
 
 
-class ReportData(BaseModel):
-    # browser support for CSP reports turns out to be patchy at best -
-    # all fields are optional on the way in, but we need at least the
-    # violated_directive and the blocked_uri to be able to make sense of
-    # the report.
-
-    # mandatory fields - without these we cannot process the report the
-    # min_length ensures we don't have an empty string
-    blocked_uri: str = Field(alias="blocked-uri", min_length=1)
-    # we must have one of these - validate_directives enforces this
-    effective_directive: str | None = Field(None, alias="effective-directive")
-    violated_directive: str | None = Field(None, alias="violated-directive")
-    # optional
-    disposition: str | None = Field("", alias="disposition")
-    document_uri: str | None = Field("", alias="document-uri")
-    original_policy: str | None = Field(None, alias="original-policy")
-    referrer: str | None = Field(None, alias="referrer")
-    script_sample: str | None = Field(None, alias="script-sample")
-    status_code: str | None = Field(0, alias="status-code")
-
-    @field_validator("document_uri", "blocked_uri")
-    @classmethod
-    def strip_uri(cls, uri: str) -> str:
-        """
-        Strip querystring and truncate to fit model length.
+def __getattr__(name: str) -> Any:
+    # ReportData used to live here - it's now in csp.reports so that the
+    # (pydantic) schema is only built when the first report is received.
+    if name == "ReportData":
+        from .reports import ReportData
 
-        We don't care about querystring params (CSP doesn't), and we can't
-        store URLs > 200 chars long, so we truncate here.
+        return ReportData
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-        """
-        return strip_query(uri)[:200] if uri else ""
-
-    @model_validator(mode="after")
-    def validate_directives(self) -> ReportData:
-        """Ensure that we have either effective_directive or violated_directive."""
-        if self.effective_directive:
-            return self
-        # if effective_directive is empty, but violated_directive is not,
-        # then update the former with the latter.
-        if self.violated_directive:
-            logger.debug(
-                "'effective_directive' missing - using 'violated_directive' attr."
-            )
-            self.effective_directive = self.violated_directive
-            return self
-        raise ValueError(
-            "Either 'effective_directive' or 'violated_directive' must be present."
-        )
 
-    model_config = ConfigDict(populate_by_name=True, coerce_numbers_to_str=True)
+def aggregate_reports(reports: Iterable[ReportType]) -> list[tuple[ReportType, int]]:
+    """
+    Fold reports for the same violation into (report, count) tuples.
+
+    Reports for the same (directive, blocked_uri) pair are collapsed
+    into one, with the latest report used for the document_uri and
+    disposition.
+
+    """
+    counts: Counter[tuple[str, str]] = Counter()
+    latest: dict[tuple[str, str], ReportType] = {}
+    for data in reports:
+        key = (str(data.effective_directive), data.blocked_uri)
+        counts[key] += 1
+        latest[key] = data
+    return [(data, counts[key]) for key, data in latest.items()]
 
 
 class DispositionChoices(models.TextChoices):
@@ -102,8 +93,17 @@ class CspRuleQuerySet(models.QuerySet):
     def enabled(self) -> CspRuleQuerySet:
         return self.filter(enabled=True)
 
+    def for_host(self, host: str = "") -> CspRuleQuerySet:
+        """Return the global rules, plus those for the host (if any)."""
+        return self.filter(host__in={"", host})
+
+    def hosts(self) -> set[str]:
+        """Return the hosts that have rules of their own."""
+        return set(self.exclude(host="").values_list("host", flat=True).distinct())
+
     def directive_values(self) -> models.ValuesQuerySet:
-        return self.values_list("directive", "value")
+        """Return (directive, value) pairs, with the values as normalized on save."""
+        return self.values_list("directive", "normalized_value")
 
 
 class CspRuleManager(models.Manager):
@@ -136,6 +136,14 @@ class CspRule(models.Model):
 
     directive = models.CharField(max_length=50, choices=DirectiveChoices.choices)
     value = models.CharField(max_length=255)
+    # the value as it appears in the policy - see clean_value
+    normalized_value = models.CharField(max_length=255, editable=False, default="")
+    host = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        help_text="Only apply the rule to this host (leave blank for all hosts).",
+    )
     enabled = models.BooleanField(default=False)
     created_at = models.DateTimeField(default=tz_now)
     modified_at = models.DateTimeField(default=tz_now)
@@ -144,16 +152,26 @@ class CspRule(models.Model):
 
     class Meta:
         verbose_name = "CSP Rule"
-        unique_together = ("value", "directive")
+        unique_together = ("value", "directive", "host")
         ordering = ["directive", "value"]
+        indexes = [
+            # keyset pagination in the admin
+            models.Index(fields=["modified_at", "id"], name="csp_rule_modified_idx"),
+        ]
 
     def __str__(self) -> str:
+        if self.host:
+            return f"{self.directive} {self.value} ({self.host})"
         return f"{self.directive} {self.value}"
 
     def save(self, *args: Any, **kwargs: Any) -> None:
+        self.host = self.host.lower()
+        self.normalized_value = self.clean_value(self.value)
         self.modified_at = tz_now()
         if "update_fields" in kwargs:
             kwargs["update_fields"].append("modified_at")
+            if "value" in kwargs["update_fields"]:
+                kwargs["update_fields"].append("normalized_value")
         super().save(*args, **kwargs)
 
     @classmethod
@@ -172,23 +190,151 @@ class CspRule(models.Model):
 
 
 class CspReportQuerySet(models.QuerySet):
-    pass
+    def with_pending_counts(self) -> CspReportQuerySet:
+        """Annotate each report with the counts held in its shards."""
+        shards = (
+            CspReportCounterShard.objects.filter(report=OuterRef("pk"))
+            .order_by()
+            .values("report")
+            .annotate(total=Sum("count"))
+            .values("total")
+        )
+        return self.annotate(pending_count=Coalesce(Subquery(shards), 0))
 
 
 class CspReportManager(models.Manager):
-    def save_report(self, data: ReportData) -> CspReport | None:
-        report, _ = CspReport.objects.get_or_create(
+    def save_report(self, data: ReportType, count: int = 1) -> CspReport | None:
+        """
+        Record `count` occurrences of a violation.
+
+        A known violation (the common case) is updated with a single
+        UPDATE query, and None is returned - the report is not fetched.
+        Otherwise the report is fetched (or created) and returned - if
+        CSP_REPORT_COUNTER_SHARDS is set then known violations always
+        take this path, so that the increment goes to a shard rather
+        than the report row.
+
+        """
+        report = None
+        if CSP_REPORT_COUNTER_SHARDS or not self._update_report(data, count):
+            report = self._get_or_create_report(data, count)
+        if CSP_REPORT_SUMMARY:
+            CspReportSummary.objects.record(data, count=count)
+        return report
+
+    def _update_report(self, data: ReportType, count: int) -> int:
+        """Update an existing report in place, returning the rows updated."""
+        return self.filter(
+            effective_directive=data.effective_directive,
+            blocked_uri=data.blocked_uri,
+        ).update(
+            document_uri=data.document_uri,
+            disposition=data.disposition,
+            request_count=F("request_count") + count,
+            last_updated_at=tz_now(),
+        )
+
+    def _get_or_create_report(self, data: ReportType, count: int) -> CspReport:
+        report, created = CspReport.objects.get_or_create(
             effective_directive=data.effective_directive,
             blocked_uri=data.blocked_uri,
         )
-        # we udpate with the latest page that has caused the violation
-        report.document_uri = data.document_uri
-        report.disposition = data.disposition
-        report.request_count = F("request_count") + 1
-        report.last_updated_at = tz_now()
-        report.save()
+        if CSP_REPORT_COUNTER_SHARDS and not created:
+            # don't update the (possibly hot) report row at all
+            CspReportCounterShard.objects.increment(report, data, count)
+        else:
+            # we udpate with the latest page that has caused the violation
+            report.document_uri = data.document_uri
+            report.disposition = data.disposition
+            report.request_count = F("request_count") + count
+            report.last_updated_at = tz_now()
+            report.save()
         return report
 
+    def save_reports(self, reports: Iterable[ReportType]) -> int:
+        """
+        Save a batch of reports, collapsing duplicates.
+
+        Returns the number of distinct violations updated.
+
+        """
+        aggregated = aggregate_reports(reports)
+        for data, count in aggregated:
+            self.save_report(data, count=count)
+        return len(aggregated)
+
+    def _update_counts(
+        self,
+        pending: dict[tuple[str, str], int],
+        latest: dict[tuple[str, str], ReportType],
+        now: datetime,
+    ) -> None:
+        """Add the counts of existing reports - removing them from `pending`."""
+        existing = self.filter(blocked_uri__in={uri for _, uri in pending})
+        if not CSP_REPORT_COUNTER_SHARDS:
+            existing = existing.select_for_update()
+        updated = []
+        for report in existing:
+            key = (report.effective_directive, report.blocked_uri)
+            if key not in pending:
+                continue
+            data, count = latest[key], pending.pop(key)
+            if CSP_REPORT_COUNTER_SHARDS:
+                # don't update the (possibly hot) report row at all
+                CspReportCounterShard.objects.increment(report, data, count)
+                continue
+            report.document_uri = data.document_uri
+            report.disposition = data.disposition
+            report.request_count = F("request_count") + count
+            report.last_updated_at = now
+            updated.append(report)
+        self.bulk_update(
+            updated,
+            ["document_uri", "disposition", "request_count", "last_updated_at"],
+        )
+
+    def upsert_counts(self, counts: list[tuple[ReportType, int]]) -> int:
+        """
+        Save aggregated (report, count) tuples in bulk.
+
+        Each pair must be distinct. The existing reports are locked and
+        updated with a single bulk update (or, if CSP_REPORT_COUNTER_SHARDS
+        is set, not locked, and the counts added to their shards), and the
+        new ones inserted with a single bulk insert - if a concurrent
+        request inserts one of the new reports first then the batch is
+        saved one report at a time. Returns the number of violations saved.
+
+        """
+        pending = {(str(d.effective_directive), d.blocked_uri): c for d, c in counts}
+        latest = {(str(d.effective_directive), d.blocked_uri): d for d, _ in counts}
+        now = tz_now()
+        try:
+            with transaction.atomic(using=router.db_for_write(self.model)):
+                self._update_counts(pending, latest, now)
+                self.bulk_create(
+                    [
+                        CspReport(
+                            effective_directive=directive,
+                            blocked_uri=blocked_uri,
+                            document_uri=latest[(directive, blocked_uri)].document_uri,
+                            disposition=latest[(directive, blocked_uri)].disposition,
+                            request_count=count,
+                            created_at=now,
+                            last_updated_at=now,
+                        )
+                        for (directive, blocked_uri), count in pending.items()
+                    ]
+                )
+        except IntegrityError:
+            logger.debug("Conflict on bulk insert of CSP reports - saving singly")
+            for data, count in counts:
+                self.save_report(data, count=count)
+            return len(counts)
+        if CSP_REPORT_SUMMARY:
+            for data, count in counts:
+                CspReportSummary.objects.record(data, count=count)
+        return len(counts)
+
 
 class CspReport(models.Model):
     # {
@@ -209,7 +355,7 @@ class CspReport(models.Model):
     document_uri = models.URLField()
     effective_directive = models.TextField()
     disposition = models.CharField(max_length=12)
-    blocked_uri = models.URLField()
+    blocked_uri = models.URLField(db_index=True)
     request_count = models.IntegerField(default=0)
     created_at = models.DateTimeField(default=tz_now)
     last_updated_at = models.DateTimeField(default=tz_now)
@@ -220,6 +366,13 @@ class CspReport(models.Model):
         verbose_name = "CSP Violation"
         unique_together = ("effective_directive", "blocked_uri")
         ordering = ["effective_directive", "blocked_uri"]
+        indexes = [
+            # keyset pagination / date hierarchy in the admin
+            models.Index(
+                fields=["last_updated_at", "id"], name="csp_report_updated_idx"
+            ),
+            models.Index(fields=["request_count", "id"], name="csp_report_count_idx"),
+        ]
 
     def __str__(self) -> str:
         return (
@@ -227,6 +380,93 @@ class CspReport(models.Model):
             f"{self.blocked_uri} [{self.request_count}]"
         )
 
+    @property
+    def total_count(self) -> int:
+        """Return request_count plus any counts not yet compacted."""
+        return self.request_count + getattr(self, "pending_count", 0)
+
+
+class CspReportCounterShardManager(models.Manager):
+    def increment(self, report: CspReport, data: ReportType, count: int = 1) -> None:
+        """Add `count` to a random shard of the report's counter."""
+        shard = random.randrange(CSP_REPORT_COUNTER_SHARDS)  # noqa: S311
+        values = {
+            "document_uri": data.document_uri,
+            "disposition": data.disposition,
+            "last_updated_at": tz_now(),
+        }
+        shards = self.filter(report=report, shard=shard)
+        if shards.update(count=F("count") + count, **values):
+            return
+        try:
+            with transaction.atomic(using=router.db_for_write(self.model)):
+                self.create(report=report, shard=shard, count=count, **values)
+        except IntegrityError:
+            # the shard was created by a concurrent request
+            shards.update(count=F("count") + count, **values)
+
+    def compact(self, chunk_size: int = 1000) -> int:
+        """
+        Fold the shard counts back into CspReport.request_count.
+
+        The shards are processed in chunks, each in its own transaction -
+        the shard rows are locked, added to their report (along with the
+        latest document_uri / disposition / last_updated_at), and then
+        deleted. Returns the number of shard rows folded.
+
+        """
+        folded = 0
+        while True:
+            with transaction.atomic(using=router.db_for_write(self.model)):
+                shards = list(self.select_for_update().order_by("pk")[:chunk_size])
+                if not shards:
+                    return folded
+                totals: Counter[int] = Counter()
+                latest: dict[int, CspReportCounterShard] = {}
+                for shard in sorted(shards, key=lambda s: s.last_updated_at):
+                    totals[shard.report_id] += shard.count
+                    latest[shard.report_id] = shard
+                for report_id, shard in latest.items():
+                    reports = CspReport.objects.filter(pk=report_id)
+                    reports.update(request_count=F("request_count") + totals[report_id])
+                    reports.filter(last_updated_at__lt=shard.last_updated_at).update(
+                        document_uri=shard.document_uri,
+                        disposition=shard.disposition,
+                        last_updated_at=shard.last_updated_at,
+                    )
+                self.filter(pk__in=[s.pk for s in shards]).delete()
+                folded += len(shards)
+
+
+class CspReportCounterShard(models.Model):
+    """
+    Part of the request_count of a CspReport (see CSP_REPORT_COUNTER_SHARDS).
+
+    Increments for a report are spread across a number of shard rows, so
+    that concurrent updates for the same violation do not all wait on the
+    same row lock. The compact_csp_counters command folds the shards back
+    into the report.
+
+    """
+
+    report = models.ForeignKey(
+        CspReport, on_delete=models.CASCADE, related_name="counter_shards"
+    )
+    shard = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+    document_uri = models.URLField(blank=True)
+    disposition = models.CharField(max_length=12, blank=True)
+    last_updated_at = models.DateTimeField(default=tz_now)
+
+    objects = CspReportCounterShardManager()
+
+    class Meta:
+        verbose_name = "CSP Violation Counter Shard"
+        unique_together = ("report", "shard")
+
+    def __str__(self) -> str:
+        return f"{self.report_id} [{self.shard}]: {self.count}"
+
 
 def convert_report(report: CspReport, enable: bool = True) -> CspRule | None:
     """Convert report to a rule and deletion the violation."""
@@ -250,6 +490,66 @@ def convert_report(report: CspReport, enable: bool = True) -> CspRule | None:
         return rule
 
 
+def _delete_reports(pks: list[int]) -> None:
+    CspReport.objects.filter(pk__in=pks).delete()
+
+
+def convert_reports(reports: models.QuerySet, enable: bool = True) -> tuple[int, int]:
+    """
+    Convert reports to (all host) rules, and delete the reports, in bulk.
+
+    Returns (rules created, duplicates) - a report for which the rule
+    (i.e. one with the same normalized value) already exists is just
+    deleted. The number of queries does not
+    depend on the number of reports. NB this does not send the rule
+    signals, so the caller must clear the policy cache.
+
+    """
+    rows = list(reports.values_list("pk", "effective_directive", "blocked_uri"))
+    rules = {(directive, CspRule.clean_value(uri)) for _, directive, uri in rows}
+    # matched on the normalized value, as import_rules is - so a rule whose
+    # value only differs in normalization (e.g. a query string) is found.
+    existing = set(
+        CspRule.objects.filter(
+            host="", normalized_value__in={v for _, v in rules}
+        ).values_list("directive", "normalized_value")
+    )
+    new_rules = [
+        CspRule(
+            directive=directive, value=value, normalized_value=value, enabled=enable
+        )
+        for directive, value in sorted(rules - existing)
+    ]
+    CspRule.objects.bulk_create(new_rules, ignore_conflicts=True)
+    _delete_reports([pk for pk, _, _ in rows])
+    return len(new_rules), len(rows) - len(new_rules)
+
+
+def blacklist_reports(reports: models.QuerySet) -> tuple[int, int]:
+    """
+    Add reports to the (all host) blacklist, and delete them, in bulk.
+
+    Returns (entries created, duplicates). As with convert_reports the
+    number of queries is constant, and the caller must clear the
+    blacklist cache.
+
+    """
+    rows = list(reports.values_list("pk", "effective_directive", "blocked_uri"))
+    entries = {(directive, uri) for _, directive, uri in rows}
+    existing = set(
+        CspReportBlacklist.objects.filter(
+            host="", blocked_uri__in={uri for _, uri in entries}
+        ).values_list("directive", "blocked_uri")
+    )
+    new_entries = [
+        CspReportBlacklist(directive=directive, blocked_uri=uri)
+        for directive, uri in sorted(entries - existing)
+    ]
+    CspReportBlacklist.objects.bulk_create(new_entries, ignore_conflicts=True)
+    _delete_reports([pk for pk, _, _ in rows])
+    return len(new_entries), len(rows) - len(new_entries)
+
+
 class CspReportBlacklistQueryset(models.QuerySet):
     def as_dict(self) -> PolicyType:
         values = defaultdict(list)
@@ -257,6 +557,15 @@ class CspReportBlacklistQueryset(models.QuerySet):
             values[directive].append(blocked_uri)
         return values
 
+    def as_host_dict(self) -> dict[str, PolicyType]:
+        """Return {host: {directive: [blocked_uri]}} - host "" is all hosts."""
+        values: dict[str, PolicyType] = {}
+        for host, directive, blocked_uri in self.values_list(
+            "host", "directive", "blocked_uri"
+        ):
+            values.setdefault(host, {}).setdefault(directive, []).append(blocked_uri)
+        return values
+
 
 class CspReportBlacklist(models.Model):
     """
@@ -270,13 +579,381 @@ class CspReportBlacklist(models.Model):
 
     directive = models.CharField(max_length=50, choices=DirectiveChoices.choices)
     blocked_uri = models.URLField()
+    host = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        help_text=(
+            "Only ignore reports from pages on this host "
+            "(leave blank for all hosts)."
+        ),
+    )
 
     objects = CspReportBlacklistQueryset().as_manager()
 
     class Meta:
         verbose_name_plural = verbose_name = "CSP Blacklist"
-        unique_together = ("directive", "blocked_uri")
+        unique_together = ("directive", "blocked_uri", "host")
         ordering = ["directive", "blocked_uri"]
 
     def __str__(self) -> str:
+        if self.host:
+            return f"{self.directive} {self.blocked_uri} ({self.host})"
         return f"{self.directive} {self.blocked_uri}"
+
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        self.host = self.host.lower()
+        super().save(*args, **kwargs)
+
+
+# CspReportSummary.kind values
+SUMMARY_SOURCE = "source"
+SUMMARY_DOCUMENT = "document"
+
+# time.time() that the summary was last rebuilt - deltas buffered before
+# then may already be counted, and are discarded.
+CACHE_KEY_SUMMARY_REBUILT = "csp::summary::rebuilt_at"
+
+# (kind, directive, uri)
+SummaryKeyType = tuple[str, str, str]
+
+
+class SummaryBuffer:
+    """
+    Summary deltas recorded by this process, and not yet saved.
+
+    `since` is the time.time() of the oldest delta in the buffer, and
+    `flushed_at` the time.monotonic() of the last flush.
+
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counts: Counter[SummaryKeyType] = Counter()
+        self.last_seen: dict[SummaryKeyType, datetime] = {}
+        self.since: float | None = None
+        self.flushed_at = time.monotonic()
+        self.registered = False
+
+    def add(self, keys: list[SummaryKeyType], count: int, now: datetime) -> bool:
+        """Add `count` to each key, returning True if a flush is due."""
+        with self.lock:
+            for key in keys:
+                self.counts[key] += count
+                self.last_seen[key] = now
+            if self.since is None:
+                self.since = time.time()
+            return (
+                time.monotonic() - self.flushed_at >= CSP_REPORT_SUMMARY_FLUSH_INTERVAL
+            )
+
+    def take(
+        self,
+    ) -> tuple[Counter[SummaryKeyType], dict[SummaryKeyType, datetime], float | None]:
+        """Return (counts, last_seen, since) - and empty the buffer."""
+        with self.lock:
+            taken = (self.counts, self.last_seen, self.since)
+            self.counts, self.last_seen, self.since = Counter(), {}, None
+            self.flushed_at = time.monotonic()
+            return taken
+
+
+_summary_buffer = SummaryBuffer()
+
+
+class CspReportSummaryQuerySet(models.QuerySet):
+    def sources(self) -> CspReportSummaryQuerySet:
+        return self.filter(kind=SUMMARY_SOURCE)
+
+    def documents(self) -> CspReportSummaryQuerySet:
+        return self.filter(kind=SUMMARY_DOCUMENT)
+
+
+class CspReportSummaryManager(models.Manager):
+    def record(self, data: ReportType, count: int = 1) -> None:
+        """
+        Add `count` occurrences of a violation to the summary.
+
+        The counts are buffered in memory (per process), and saved in bulk
+        every CSP_REPORT_SUMMARY_FLUSH_INTERVAL seconds - so the shared
+        summary rows are not updated for each report.
+
+        """
+        keys = [
+            (
+                SUMMARY_SOURCE,
+                str(data.effective_directive),
+                strip_path(data.blocked_uri),
+            )
+        ]
+        if data.document_uri:
+            keys.append((SUMMARY_DOCUMENT, "", data.document_uri))
+        if not _summary_buffer.registered:
+            # save whatever is left when the process exits
+            _summary_buffer.registered = True
+            atexit.register(self.flush)
+        if _summary_buffer.add(keys, count, tz_now()):
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Save the counts buffered by this process, returning the rows saved.
+
+        If the summary has been rebuilt since the counts were buffered
+        then they are discarded, as they may already be included.
+
+        """
+        counts, last_seen, since = _summary_buffer.take()
+        if not counts:
+            return 0
+        rebuilt_at = cache.get(CACHE_KEY_SUMMARY_REBUILT)
+        if rebuilt_at and since and rebuilt_at >= since:
+            logger.debug("CSP summary rebuilt - discarding buffered counts")
+            return 0
+        for key, count in counts.items():
+            self._add_count(key, count, last_seen[key])
+        return len(counts)
+
+    def _add_count(self, key: SummaryKeyType, count: int, now: datetime) -> None:
+        kind, directive, uri = key
+        rows = self.filter(kind=kind, directive=directive, uri=uri)
+        values = {"request_count": F("request_count") + count, "last_seen_at": now}
+        if rows.update(**values):
+            return
+        try:
+            with transaction.atomic(using=router.db_for_write(self.model)):
+                self.create(
+                    kind=kind,
+                    directive=directive,
+                    uri=uri,
+                    request_count=count,
+                    first_seen_at=now,
+                    last_seen_at=now,
+                )
+        except IntegrityError:
+            # the row was created by a concurrent flush
+            rows.update(**values)
+
+    def rebuild(self, chunk_size: int = 2000) -> int:
+        """
+        Rebuild the summary from the stored violation reports.
+
+        The reports are read in chunks and aggregated in memory - memory
+        use is proportional to the number of distinct sources / documents,
+        not to the number of reports. The table is then replaced in a
+        single transaction - on PostgreSQL the table is locked, so that
+        no flush writes to it until the rebuild is committed. Returns the
+        number of summary rows.
+
+        """
+        # counts buffered (by any process) before now are discarded
+        cache.set(CACHE_KEY_SUMMARY_REBUILT, time.time(), None)
+        summaries: dict[SummaryKeyType, CspReportSummary] = {}
+
+        def add(kind: str, directive: str, uri: str, report: dict[str, Any]) -> None:
+            key = (kind, directive, uri)
+            if not (summary := summaries.get(key)):
+                summary = summaries[key] = CspReportSummary(
+                    kind=kind,
+                    directive=directive,
+                    uri=uri,
+                    first_seen_at=report["created_at"],
+                    last_seen_at=report["last_updated_at"],
+                )
+            summary.request_count += report["request_count"] + report["pending_count"]
+            summary.first_seen_at = min(summary.first_seen_at, report["created_at"])
+            summary.last_seen_at = max(summary.last_seen_at, report["last_updated_at"])
+
+        reports = (
+            CspReport.objects.order_by()
+            .with_pending_counts()
+            .values(
+                "effective_directive",
+                "blocked_uri",
+                "document_uri",
+                "request_count",
+                "pending_count",
+                "created_at",
+                "last_updated_at",
+            )
+        )
+        for report in reports.iterator(chunk_size=chunk_size):
+            add(
+                SUMMARY_SOURCE,
+                report["effective_directive"],
+                strip_path(report["blocked_uri"]),
+                report,
+            )
+            if report["document_uri"]:
+                add(SUMMARY_DOCUMENT, "", report["document_uri"], report)
+        using = router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            if (connection := connections[using]).vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    table = connection.ops.quote_name(self.model._meta.db_table)
+                    cursor.execute(f"LOCK TABLE {table} IN EXCLUSIVE MODE")
+            self.all().delete()
+            self.bulk_create(summaries.values(), batch_size=chunk_size)
+        return len(summaries)
+
+
+class CspReportSummary(models.Model):
+    """
+    Violation counts aggregated by blocked source (origin) and document.
+
+    This is a small, pre-aggregated, copy of the CspReport table used by
+    the summary view. It is either updated as each report is saved (see
+    CSP_REPORT_SUMMARY), or rebuilt periodically using the
+    refresh_csp_summary management command.
+
+    """
+
+    kind = models.CharField(
+        max_length=10,
+        choices=[(SUMMARY_SOURCE, "Blocked source"), (SUMMARY_DOCUMENT, "Document")],
+    )
+    directive = models.CharField(max_length=50, blank=True)
+    uri = models.URLField()
+    request_count = models.IntegerField(default=0)
+    first_seen_at = models.DateTimeField(default=tz_now)
+    last_seen_at = models.DateTimeField(default=tz_now)
+
+    objects = CspReportSummaryManager.from_queryset(CspReportSummaryQuerySet)()
+
+    class Meta:
+        verbose_name = "CSP Violation Summary"
+        verbose_name_plural = "CSP Violation Summaries"
+        unique_together = ("kind", "directive", "uri")
+        ordering = ["kind", "-request_count"]
+
+    def __str__(self) -> str:
+        return f"{self.directive or self.kind} {self.uri} [{self.request_count}]"
+
+
+# {CspConfig field: the setting that it overrides}
+CONFIG_SETTINGS = {
+    "enabled": "CSP_ENABLED",
+    "report_only": "CSP_REPORT_ONLY",
+    "report_sampling": "CSP_REPORT_SAMPLING",
+    "report_throttling": "CSP_REPORT_THROTTLING",
+}
+
+
+class CspConfigManager(models.Manager):
+    def get_overrides(self) -> dict[str, Any]:
+        """Return {setting: value} for the fields that are set."""
+        config = self.order_by("pk").first()
+        if not config:
+            return {}
+        return {
+            setting: value
+            for field, setting in CONFIG_SETTINGS.items()
+            if (value := getattr(config, field)) is not None
+        }
+
+
+class CspConfig(models.Model):
+    """
+    Runtime overrides of (a few) settings - editable in the admin.
+
+    There is (at most) one row. Fields that are empty use the setting
+    from django.conf.settings. See CSP_RUNTIME_CONFIG.
+
+    """
+
+    enabled = models.BooleanField(
+        null=True,
+        blank=True,
+        help_text=(
+            "Overrides CSP_ENABLED. This can only disable the CSP header - "
+            "the middleware is not loaded if CSP_ENABLED is False."
+        ),
+    )
+    report_only = models.BooleanField(
+        null=True, blank=True, help_text="Overrides CSP_REPORT_ONLY."
+    )
+    report_sampling = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(0.0), MaxValueValidator(1.0)],
+        help_text=(
+            "Overrides CSP_REPORT_SAMPLING (0..1) - and the adaptive sampling "
+            "ratio, if enabled."
+        ),
+    )
+    report_throttling = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(0.0), MaxValueValidator(1.0)],
+        help_text="Overrides CSP_REPORT_THROTTLING (0..1).",
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CspConfigManager()
+
+    class Meta:
+        verbose_name = "CSP Runtime Config"
+        verbose_name_plural = "CSP Runtime Config"
+
+    def __str__(self) -> str:
+        return f"CSP runtime config (updated {self.updated_at:%Y-%m-%d %H:%M})"
+
+
+class CspPolicySnapshotQuerySet(models.QuerySet):
+    def latest_snapshot(self) -> CspPolicySnapshot | None:
+        """Return the latest snapshot - a single row, read by primary key."""
+        return self.order_by("-version").first()
+
+
+class CspPolicySnapshotManager(models.Manager):
+    def publish(
+        self, policies: dict[str, tuple[str, str]], fingerprint: str
+    ) -> CspPolicySnapshot:
+        """Save the compiled policies as the next version."""
+        using = router.db_for_write(self.model)
+        for _ in range(3):
+            # versions are allocated max + 1 - retry if another process
+            # published the same version concurrently.
+            try:
+                with transaction.atomic(using=using):
+                    latest = self.using(using).latest_snapshot()
+                    return self.create(
+                        version=latest.version + 1 if latest else 1,
+                        policies=policies,
+                        fingerprint=fingerprint,
+                    )
+            except IntegrityError:
+                logger.debug("CSP policy snapshot version conflict - retrying")
+        raise IntegrityError("Unable to allocate a CSP policy snapshot version")
+
+
+class CspPolicySnapshot(models.Model):
+    """
+    A compiled version of the policy, saved each time the rules change.
+
+    `policies` is {host: [csp, report-uri]} - host "" is the global (or,
+    without CSP_HOST_POLICIES, the only) policy. See CSP_POLICY_SNAPSHOTS.
+
+    """
+
+    version = models.PositiveIntegerField(primary_key=True)
+    policies = models.JSONField()
+    fingerprint = models.CharField(
+        max_length=32, help_text="Hash of the settings the policies were built with."
+    )
+    created_at = models.DateTimeField(default=tz_now)
+
+    objects = CspPolicySnapshotManager.from_queryset(CspPolicySnapshotQuerySet)()
+
+    class Meta:
+        verbose_name = "CSP Policy Snapshot"
+        ordering = ["-version"]
+
+    def __str__(self) -> str:
+        return f"CSP policy v{self.version}"
+
+    def get_policy(self, host: str = "") -> tuple[str, str] | None:
+        """Return the compiled (csp, report-uri) for a host, if it has one."""
+        if policy := self.policies.get(host):
+            return tuple(policy)
+        return None
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Callable
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import CSP_REPORT_NORMALIZATION
+from .utils import strip_filename, strip_path, strip_subdomain
+
+# blocked_uri granularity options, finest first
+FULL = "full"
+PATH = "path"
+ORIGIN = "origin"
+DOMAIN = "domain"
+
+NORMALIZERS: dict[str, Callable[[str], str]] = {
+    # the query string is always stripped when the report is parsed
+    FULL: lambda uri: uri,
+    PATH: strip_filename,
+    ORIGIN: strip_path,
+    DOMAIN: strip_subdomain,
+}
+
+
+@lru_cache
+def get_normalizer(directive: str) -> Callable[[str], str]:
+    """Return the blocked_uri normalizer for a directive."""
+    granularity = CSP_REPORT_NORMALIZATION.get(
+        directive, CSP_REPORT_NORMALIZATION.get("*", FULL)
+    )
+    try:
+        return NORMALIZERS[granularity]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Invalid CSP_REPORT_NORMALIZATION value for '{directive}': "
+            f"'{granularity}' (must be one of {', '.join(NORMALIZERS)})"
+        )
+
+
+def normalize_uri(directive: str, blocked_uri: str) -> str:
+    """Normalize blocked_uri to the granularity configured for directive."""
+    if not CSP_REPORT_NORMALIZATION:
+        return blocked_uri
+    return get_normalizer(directive)(blocked_uri)
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+from typing import Iterator
+
+from .models import CspReport
+
+logger = logging.getLogger(__name__)
+
+# min number of items that a filter of known violations is sized for
+MIN_CAPACITY = 10000
+
+
+class BloomFilter:
+    """
+    Approximate set of strings.
+
+    Membership tests never return a false negative, and return a false
+    positive at (about) `error_rate` - so long as no more than `capacity`
+    items are added. The filter is a fixed size bytearray - about 1.8
+    bytes per item at the default 0.1% error rate.
+
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        self.capacity = max(capacity, 1)
+        # optimal number of bits, and of hash functions, for the capacity
+        self.size = max(
+            8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def __len__(self) -> int:
+        """Return the number of items added (including any duplicates)."""
+        return self.count
+
+    def _positions(self, key: str) -> Iterator[int]:
+        # double hashing - k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str) -> None:
+        for p in self._positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+
+def violation_key(directive: str, blocked_uri: str) -> str:
+    return f"{directive} {blocked_uri}"
+
+
+def build_known_filter(
+    error_rate: float = 0.001, chunk_size: int = 5000
+) -> BloomFilter:
+    """
+    Return a filter of the (directive, blocked_uri) pairs already stored.
+
+    The filter is sized for twice the number of stored reports, so that
+    new pairs can be added until it is next rebuilt.
+
+    """
+    reports = CspReport.objects.order_by().values_list(
+        "effective_directive", "blocked_uri"
+    )
+    known = BloomFilter(max(2 * reports.count(), MIN_CAPACITY), error_rate)
+    for directive, blocked_uri in reports.iterator(chunk_size=chunk_size):
+        known.add(violation_key(directive, blocked_uri))
+    logger.debug("Built filter of %s known CSP violations", len(known))
+    return known
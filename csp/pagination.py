@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from typing import Any
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Model, Q, QuerySet
+from django.http import HttpRequest
+from django.utils.functional import cached_property
+
+# querystring param used for the keyset cursor
+CURSOR_VAR = "cursor"
+
+
+def estimate_count(queryset: QuerySet) -> int | None:
+    """
+    Return the database's estimate of the number of rows in a table.
+
+    This is only supported for unfiltered querysets on PostgreSQL and
+    MySQL - which keep table statistics - and returns None otherwise.
+
+    """
+    if queryset.query.where:
+        return None
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == "postgresql":
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass"
+    elif connection.vendor == "mysql":
+        sql = (
+            "SELECT table_rows FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = %s"
+        )
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    # reltuples is -1 if the table has never been analyzed
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that does not COUNT(*) the entire table.
+
+    If the database can estimate the row count, and the estimate is over
+    `count_limit`, the estimate is used - otherwise the count is capped
+    at `count_limit` (by counting a LIMIT subquery), so the cost of the
+    count is bounded however many rows match.
+
+    """
+
+    def __init__(self, *args: Any, count_limit: int = 10000, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.count_limit = count_limit
+        self.is_estimate = False
+        self.is_capped = False
+
+    @cached_property
+    def count(self) -> int:
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate > self.count_limit:
+            self.is_estimate = True
+            return estimate
+        count = self.object_list.order_by()[: self.count_limit].count()
+        self.is_capped = count >= self.count_limit
+        return count
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Admin ChangeList that pages using a cursor rather than OFFSET.
+
+    If the list is ordered by one of the model admin's `keyset_fields`
+    then each page is fetched as "the next N rows after (value, pk)" -
+    which can use an index on (field, id), and so costs the same on
+    the last page as it does on the first. Any other ordering falls back
+    to the standard (OFFSET) pagination.
+
+    """
+
+    keyset_field: str | None = None
+    descending = True
+    cursor: str | None = None
+    next_cursor: str | None = None
+
+    def get_filters_params(self, params: dict | None = None) -> dict:
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(
+        self, new_params: dict | None = None, remove: list | None = None
+    ) -> str:
+        # a cursor only makes sense for the current filters / ordering
+        return super().get_query_string(
+            {CURSOR_VAR: None, **(new_params or {})}, remove
+        )
+
+    def get_queryset(self, request: HttpRequest, **kwargs: Any) -> QuerySet:
+        queryset = super().get_queryset(request, **kwargs)
+        ordering = queryset.query.order_by
+        if not ordering or not isinstance(ordering[0], str):
+            return queryset
+        field = ordering[0].lstrip("-")
+        if field not in getattr(self.model_admin, "keyset_fields", ()):
+            return queryset
+        self.keyset_field = field
+        self.descending = ordering[0].startswith("-")
+        # the pk is the tie-breaker, in the same direction, so that the
+        # (field, pk) index can be scanned in one direction.
+        pk = "-pk" if self.descending else "pk"
+        return queryset.order_by(ordering[0], pk)
+
+    def get_results(self, request: HttpRequest) -> None:
+        super().get_results(request)
+        if not self.keyset_field or (self.show_all and self.can_show_all):
+            return
+        queryset = self.queryset
+        if cursor := self.params.get(CURSOR_VAR):
+            queryset = queryset.filter(self.keyset_filter(cursor))
+            self.cursor = cursor
+        results = list(queryset[: self.list_per_page + 1])
+        self.result_list = results[: self.list_per_page]
+        if len(results) > self.list_per_page:
+            self.next_cursor = self.make_cursor(self.result_list[-1])
+
+    def make_cursor(self, obj: Model) -> str:
+        field = self.lookup_opts.get_field(str(self.keyset_field))
+        return f"{field.value_to_string(obj)}|{obj.pk}"
+
+    def keyset_filter(self, cursor: str) -> Q:
+        name = str(self.keyset_field)
+        field = self.lookup_opts.get_field(name)
+        value, _, pk = cursor.rpartition("|")
+        try:
+            value = field.to_python(value)
+            pk = self.lookup_opts.pk.to_python(pk)
+        except ValidationError as ex:
+            raise IncorrectLookupParameters(ex) from ex
+        op = "lt" if self.descending else "gt"
+        return Q(**{f"{name}__{op}": value}) | Q(**{name: value, f"pk__{op}": pk})
+
+    @property
+    def first_page_url(self) -> str:
+        return self.get_query_string()
+
+    @property
+    def next_page_url(self) -> str | None:
+        if not self.next_cursor:
+            return None
+        return self.get_query_string({CURSOR_VAR: self.next_cursor})
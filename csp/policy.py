@@ -1,42 +1,271 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import logging
+import uuid
 from collections import defaultdict
 
 from django.core.cache import cache
+from django.db import router, transaction
 from django.http import HttpRequest
+from django.http.request import split_domain_port
 from django.urls import reverse
 
-from .models import CspRule, DirectiveChoices
+from .blacklist import CACHE_KEY_BLACKLIST, refresh_cache as refresh_blacklist_cache
+from .breaker import CircuitOpen, policy_breaker
+from .minimize import minimize_policy
+from .models import CspPolicySnapshot, CspRule, DirectiveChoices
+from .policy_file import get_policy_file
+from .routers import rules_cache_timeout
 from .settings import (
     CSP_CACHE_TIMEOUT,
+    CSP_HOST_POLICIES,
+    CSP_MINIMIZE_POLICY,
+    CSP_POLICY_FILE,
+    CSP_POLICY_SNAPSHOTS,
     CSP_REPORT_DIRECTIVE_DOWNGRADE,
+    CSP_RULES_READ_DATABASE,
     PolicyType,
+    get_default_rules,
     get_default_rules_expanded,
 )
 
 logger = logging.getLogger(__name__)
 
 CACHE_KEY_RULES = "csp::rules"
+CACHE_KEY_FINGERPRINT = "csp::fingerprint"
+# per-host policies (see CSP_HOST_POLICIES) - the set of hosts that have
+# rules of their own, and the version stamp of the global rules that each
+# host policy is cached with.
+CACHE_KEY_HOSTS = "csp::hosts"
+CACHE_KEY_VERSION = "csp::version"
 
 
-def clear_cache() -> None:
-    """Clear the cached CSP."""
+def host_cache_key(host: str) -> str:
+    """Return the cache key for a host's policy."""
+    return f"{CACHE_KEY_RULES}::{host}"
+
+
+def clear_cache(host: str = "") -> None:
+    """
+    Clear the cached CSP.
+
+    If `host` is set (and CSP_HOST_POLICIES is enabled) then only that
+    host's policy is cleared. Otherwise the global policy is cleared,
+    along with the version stamp - so that every host policy is rebuilt
+    when it is next used.
+
+    """
+    if host and CSP_HOST_POLICIES:
+        logger.debug("Clearing CSP cache for host '%s'", host)
+        cache.delete_many([host_cache_key(host), CACHE_KEY_HOSTS])
+        return
     logger.debug("Clearing CSP cache")
-    cache.delete(CACHE_KEY_RULES)
+    cache.delete_many(
+        [CACHE_KEY_RULES, CACHE_KEY_FINGERPRINT, CACHE_KEY_HOSTS, CACHE_KEY_VERSION]
+    )
+
+
+def rules_changed(*hosts: str) -> None:
+    """
+    Record a change to the rules - for all hosts, or for `hosts` only.
+
+    If no hosts are given, or any of them is "" (i.e. a global rule has
+    changed) then every policy is cleared. If CSP_POLICY_SNAPSHOTS is
+    enabled then the policy is compiled, and saved as a new snapshot,
+    before the cache is cleared. If CSP_RULES_READ_DATABASE is set then
+    the cache is then rebuilt from the primary - as the replica may lag.
 
+    """
+    using = router.db_for_write(CspRule)
 
-def refresh_rules_cache() -> None:
-    """Refresh the cached CSP."""
+    def _rules_changed() -> None:
+        if CSP_POLICY_SNAPSHOTS:
+            create_snapshot()
+        if not hosts or "" in hosts:
+            clear_cache()
+        else:
+            for host in set(hosts):
+                clear_cache(host)
+        if CSP_RULES_READ_DATABASE:
+            warm_policies(using=using)
+
+    if CSP_POLICY_SNAPSHOTS or CSP_RULES_READ_DATABASE:
+        # the change must be visible when the policy is rebuilt - so this
+        # is done (from the primary, not a replica) once it is committed.
+        transaction.on_commit(_rules_changed, using=using)
+    else:
+        _rules_changed()
+
+
+def warm_policies(using: str | None = None) -> None:
+    """Rebuild the cached global policy, and that of every host, from `using`."""
+    refresh_rules_cache(using=using)
+    if CSP_HOST_POLICIES:
+        version = _get_version()
+        for host in refresh_hosts_cache(using=using):
+            refresh_host_cache(host, version, using=using)
+
+
+def refresh_rules_cache(using: str | None = None) -> tuple[str, str]:
+    """Refresh the cached CSP - from `using`, or CSP_RULES_READ_DATABASE."""
     logger.debug("Refreshing CSP cache")
-    policy = build_policy()
-    part_one = format_as_csp({k: v for k, v in policy.items() if k != "report-uri"})
-    part_two = format_as_csp({k: v for k, v in policy.items() if k == "report-uri"})
-    cache.set(CACHE_KEY_RULES, (part_one, part_two), CSP_CACHE_TIMEOUT)
+    csp = _get_snapshot_policy("", using) or split_policy(
+        build_policy(host="" if CSP_HOST_POLICIES else None, using=using)
+    )
+    cache.set_many(
+        {CACHE_KEY_RULES: csp, CACHE_KEY_FINGERPRINT: settings_fingerprint()},
+        rules_cache_timeout(using),
+    )
+    return csp
+
+
+def refresh_hosts_cache(using: str | None = None) -> frozenset[str]:
+    """Refresh the cached set of hosts that have rules of their own."""
+    if snapshot := load_snapshot(using):
+        hosts = frozenset(h for h in snapshot.policies if h)
+    else:
+        rules = CspRule.objects.using(using or CSP_RULES_READ_DATABASE)
+        hosts = frozenset(rules.enabled().hosts())
+    cache.set(CACHE_KEY_HOSTS, hosts, rules_cache_timeout(using))
+    return hosts
+
+
+def refresh_host_cache(
+    host: str, version: str, using: str | None = None
+) -> tuple[str, str]:
+    """Refresh the cached CSP for a host."""
+    logger.debug("Refreshing CSP cache for host '%s'", host)
+    csp = _get_snapshot_policy(host, using) or split_policy(
+        build_policy(host=host, using=using)
+    )
+    cache.set(host_cache_key(host), (version, csp), rules_cache_timeout(using))
+    return csp
+
+
+def _get_version() -> str:
+    # add (not set) so that concurrent requests agree on the new version
+    cache.add(CACHE_KEY_VERSION, uuid.uuid4().hex, CSP_CACHE_TIMEOUT)
+    return cache.get(CACHE_KEY_VERSION, "")
+
+
+def settings_fingerprint() -> str:
+    """
+    Return a hash of the settings that the cached CSP is built from.
+
+    This is cached alongside the CSP so that a new deployment with
+    different settings can tell that the cached CSP is stale.
+
+    """
+    config = json.dumps(
+        [
+            get_default_rules(),
+            CSP_REPORT_DIRECTIVE_DOWNGRADE,
+            CSP_MINIMIZE_POLICY,
+            CSP_HOST_POLICIES,
+        ],
+        sort_keys=True,
+    )
+    return hashlib.md5(config.encode(), usedforsecurity=False).hexdigest()
+
+
+def is_cache_valid() -> bool:
+    """Return True if the CSP and blacklist are cached, and up-to-date."""
+    cached = cache.get_many(
+        [CACHE_KEY_RULES, CACHE_KEY_FINGERPRINT, CACHE_KEY_BLACKLIST]
+    )
+    return (
+        CACHE_KEY_RULES in cached
+        and CACHE_KEY_BLACKLIST in cached
+        and cached.get(CACHE_KEY_FINGERPRINT) == settings_fingerprint()
+    )
+
+
+def compile_policies(using: str | None = None) -> dict[str, tuple[str, str]]:
+    """
+    Return the compiled CSP for every host, as {host: (csp, report-uri)}.
+
+    The global policy is keyed on "" - with CSP_HOST_POLICIES enabled
+    every host that has rules of its own also has an entry. The rules
+    are read from `using` (defaults to CSP_RULES_READ_DATABASE).
+
+    """
+    using = using or CSP_RULES_READ_DATABASE
+    policies = {
+        "": split_policy(
+            build_policy(host="" if CSP_HOST_POLICIES else None, using=using)
+        )
+    }
+    if CSP_HOST_POLICIES:
+        rules = CspRule.objects.using(using).enabled()
+        for host in sorted(rules.hosts()):
+            policies[host] = split_policy(build_policy(host=host, using=using))
+    return policies
+
+
+def create_snapshot() -> CspPolicySnapshot:
+    """Compile the current policy, from the primary, as a new snapshot."""
+    snapshot = CspPolicySnapshot.objects.publish(
+        compile_policies(using=router.db_for_write(CspRule)), settings_fingerprint()
+    )
+    logger.debug("Saved CSP policy snapshot v%s", snapshot.version)
+    return snapshot
+
+
+def load_snapshot(using: str | None = None) -> CspPolicySnapshot | None:
+    """
+    Return the latest policy snapshot, if enabled (see CSP_POLICY_SNAPSHOTS).
+
+    This is a single row read, and never writes - if there is no snapshot,
+    or the latest was built with different settings, then None is returned
+    and the caller builds the policy from the rules. Snapshots are only
+    published by `rules_changed` and `warm_cache`.
+
+    """
+    if not CSP_POLICY_SNAPSHOTS:
+        return None
+    snapshots = CspPolicySnapshot.objects.using(using or CSP_RULES_READ_DATABASE)
+    snapshot = snapshots.latest_snapshot()
+    if snapshot and snapshot.fingerprint == settings_fingerprint():
+        return snapshot
+    logger.debug("CSP policy snapshot missing or stale - building policy")
+    return None
+
+
+def _get_snapshot_policy(host: str, using: str | None) -> tuple[str, str] | None:
+    if snapshot := load_snapshot(using):
+        return snapshot.get_policy(host)
+    return None
+
+
+def restore_snapshot(snapshot: CspPolicySnapshot) -> CspPolicySnapshot:
+    """
+    Republish the policies of an earlier snapshot as the latest version.
+
+    The rules themselves are not changed - the restored policy is used
+    until the rules next change (or the settings do).
+
+    """
+    restored = CspPolicySnapshot.objects.publish(
+        snapshot.policies, settings_fingerprint()
+    )
+    logger.debug("Restored CSP policy v%s as v%s", snapshot.version, restored.version)
+    clear_cache()
+    return restored
+
+
+def warm_cache() -> None:
+    """Build and cache the CSP and the report blacklist."""
+    if CSP_POLICY_SNAPSHOTS and not load_snapshot():
+        create_snapshot()
+    refresh_rules_cache()
+    refresh_blacklist_cache()
 
 
 def _dedupe(values: list[str]) -> list[str]:
-    retval = {CspRule.clean_value(v) for v in values}
+    # values are cleaned as they are added - see CspRule.normalized_value
+    retval = set(values)
     if "'none'" in retval and len(retval) > 1:
         return list(retval - {"'none'"})
     return list(retval)
@@ -57,7 +286,12 @@ def _downgrade(directive: str) -> str:
     return directive
 
 
-def build_policy() -> PolicyType:
+def build_policy(
+    minimize: bool | None = None,
+    host: str | None = None,
+    defaults_only: bool = False,
+    using: str | None = None,
+) -> PolicyType:
     """
     Build the CSP by combining default settings and CspRules.
 
@@ -70,6 +304,15 @@ def build_policy() -> PolicyType:
     values, and format any special values ('self', 'unsafe-inline',
     etc.) which must be formatted with the single-quotes.
 
+    If `minimize` is True (defaults to CSP_MINIMIZE_POLICY) then any
+    redundant sources and directives are removed - see `minimize_policy`.
+
+    If `host` is None then all rules are included, whatever their host.
+    Otherwise only the global rules (those without a host) are included,
+    plus the rules for `host` if it is not empty. If `defaults_only` is
+    True then the database is not read at all - otherwise the rules are
+    read from `using` (defaults to CSP_RULES_READ_DATABASE).
+
     NB the CSP as cached is not quite complete - if the settings require
     a nonce to be added to any directives then this cannot be cached,
     and so the nonce is applied per-request.
@@ -89,14 +332,27 @@ def build_policy() -> PolicyType:
             logger.debug('Ignoring unknown directive "%s"', directive)
 
     for directive, value in get_default_rules_expanded():
-        add_directive(directive, value)
+        add_directive(directive, CspRule.clean_value(value))
+
+    if not defaults_only:
+        # returns list of additional (directive, value) tuples.
+        rules = CspRule.objects.using(using or CSP_RULES_READ_DATABASE).enabled()
+        if host is not None:
+            rules = rules.for_host(host)
+        for directive, value in rules.directive_values():
+            add_directive(directive, value)
+
+    deduped = {k: _dedupe(v) for k, v in policy.items()}
+    if CSP_MINIMIZE_POLICY if minimize is None else minimize:
+        return minimize_policy(deduped)
+    return deduped
 
-    # returns list of additional (directive, value) tuples.
-    new_rules = CspRule.objects.enabled().directive_values()
-    for directive, value in new_rules:
-        add_directive(directive, value)
 
-    return {k: _dedupe(v) for k, v in policy.items()}
+def split_policy(policy: PolicyType) -> tuple[str, str]:
+    """Format policy as two parts - the main CSP, and the report-uri."""
+    part_one = format_as_csp({k: v for k, v in policy.items() if k != "report-uri"})
+    part_two = format_as_csp({k: v for k, v in policy.items() if k == "report-uri"})
+    return part_one, part_two
 
 
 def format_as_csp(policy: PolicyType) -> str:
@@ -120,12 +376,103 @@ def _context(request: HttpRequest) -> dict[str, str]:
     return context
 
 
+def get_request_host(request: HttpRequest) -> str:
+    """Return the request host - lower case, without the port."""
+    return split_domain_port(request.get_host())[0]
+
+
+def _get_host_csp(host: str, cached: dict) -> tuple[str, str] | None:
+    """Return the CSP for a host with rules of its own, else None."""
+    if (hosts := cached.get(CACHE_KEY_HOSTS)) is None:
+        hosts = refresh_hosts_cache()
+    if host not in hosts:
+        return None
+    version = cached.get(CACHE_KEY_VERSION) or _get_version()
+    # a policy cached before the global rules last changed is stale
+    if (entry := cached.get(host_cache_key(host))) and entry[0] == version:
+        logger.debug("Found cached CSP for host '%s'", host)
+        return entry[1]
+    return refresh_host_cache(host, version)
+
+
+def get_cached_csp(host: str = "") -> tuple[str, str]:
+    """
+    Fetch the CSP for a host from the cache, or rebuild if it's missing.
+
+    If `host` is set then all of the keys that may be required are read
+    in a single cache call - the host's own policy is used if it has any
+    rules, otherwise the global policy. Hosts are looked up by key, so
+    the cost is the same however many hosts have rules.
+
+    """
+    return _get_cached_csp(host)[1]
+
+
+def _get_cached_csp(host: str) -> tuple[str, tuple[str, str]]:
+    """Return (the host whose policy was used - "" if global, CSP)."""
+    if host:
+        cached = cache.get_many(
+            [CACHE_KEY_RULES, CACHE_KEY_HOSTS, CACHE_KEY_VERSION, host_cache_key(host)]
+        )
+        if host_csp := _get_host_csp(host, cached):
+            return host, host_csp
+        cached_csp = cached.get(CACHE_KEY_RULES)
+    else:
+        cached_csp = cache.get(CACHE_KEY_RULES)
+    if cached_csp:
+        logger.debug("Found cached CSP")
+        return "", cached_csp
+    logger.debug("No cached CSP - rebuilding policy")
+    return "", refresh_rules_cache()
+
+
+# the last compiled policy read for each host with rules of its own (and
+# "" for the global policy) - used if the cache or database is failing
+# (see get_resilient_csp). Other hosts, which may be any Host header
+# that a client sends, share the global entry.
+_last_known_good: dict[str, tuple[str, str]] = {}
+
+
+def get_resilient_csp(host: str = "") -> tuple[str, str]:
+    """
+    Fetch the CSP for a host, falling back if the cache / database fails.
+
+    The policy is read through the policy circuit breaker. If the read
+    fails, or the circuit is open, then the last policy successfully
+    read by this process is used (that of the host, else the global
+    policy) - or, if there is none, the policy from CSP_DEFAULTS.
+
+    """
+    try:
+        policy_host, csp = policy_breaker.call(_get_cached_csp, host)
+    except CircuitOpen:
+        logger.debug("CSP policy circuit open - using last known good policy")
+    except Exception:
+        logger.exception("Error reading CSP - using last known good policy")
+    else:
+        _last_known_good[policy_host] = csp
+        return csp
+    return (
+        _last_known_good.get(host)
+        or _last_known_good.get("")
+        or split_policy(build_policy(defaults_only=True))
+    )
+
+
+def get_policy_header(host: str = "") -> str:
+    """Return the current CSP (unformatted, without the report-uri)."""
+    if CSP_POLICY_FILE:
+        return get_policy_file().headers[0]
+    return get_cached_csp(host)[0]
+
+
 def get_csp(request: HttpRequest, add_report_uri: bool) -> str:
     """Fetch the CSP from the cache, or rebuild if it's missing."""
-    if cached_csp := cache.get(CACHE_KEY_RULES):
-        logger.debug("Found cached CSP (add report-uri: %s)", add_report_uri)
-        csp = "; ".join(cached_csp) if add_report_uri else cached_csp[0]
-        return csp.format(**_context(request))
-    logger.debug("No cached CSP - rebuilding policy")
-    refresh_rules_cache()
-    return get_csp(request, add_report_uri)
+    if CSP_POLICY_FILE:
+        # compiled policy is held in memory - no cache / db access
+        compiled_csp = get_policy_file().headers
+    else:
+        host = get_request_host(request) if CSP_HOST_POLICIES else ""
+        compiled_csp = get_resilient_csp(host)
+    csp = "; ".join(compiled_csp) if add_report_uri else compiled_csp[0]
+    return csp.format(**_context(request))
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.timezone import now as tz_now
+
+from .settings import (
+    CSP_HOST_POLICIES,
+    CSP_POLICY_FILE,
+    CSP_POLICY_FILE_CHECK_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+# bump this if the structure of the file changes
+POLICY_FILE_FORMAT = 1
+
+
+def compile_policy() -> dict[str, Any]:
+    """Build the CSP and return it in its serializable (file) form."""
+    from .policy import build_policy, split_policy
+
+    # per-host rules are not compiled - the file holds the global policy
+    policy = build_policy(host="" if CSP_HOST_POLICIES else None)
+    csp, report_uri = split_policy(policy)
+    return {
+        "format": POLICY_FILE_FORMAT,
+        "version": hashlib.sha256(f"{csp}|{report_uri}".encode()).hexdigest()[:12],
+        "created_at": tz_now().isoformat(),
+        "policy": policy,
+        "headers": {"csp": csp, "report_uri": report_uri},
+    }
+
+
+def write_policy_file(path: str, compiled: dict[str, Any]) -> None:
+    """Write the compiled policy to disk (atomically)."""
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=".csp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(compiled, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_policy_file(path: str) -> dict[str, Any]:
+    """Read and validate a compiled policy file."""
+    with open(path) as f:
+        compiled = json.load(f)
+    if compiled.get("format") != POLICY_FILE_FORMAT:
+        raise ValueError(
+            f"Unsupported CSP policy file format: {compiled.get('format')}"
+        )
+    headers = compiled["headers"]
+    if not isinstance(headers["csp"], str) or not isinstance(
+        headers["report_uri"], str
+    ):
+        raise ValueError("Invalid CSP policy file headers")
+    return compiled
+
+
+class PolicyFile:
+    """
+    In-memory copy of a compiled policy file.
+
+    The file is read when the object is created, and then reloaded if
+    its mtime changes - the mtime is checked at most once every
+    `check_interval` seconds, so the request path does no I/O in
+    between. If a reload fails the last good copy is kept.
+
+    """
+
+    def __init__(self, path: str, check_interval: float = 5.0) -> None:
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        try:
+            self._mtime = os.stat(path).st_mtime_ns
+            self.compiled = read_policy_file(path)
+        except (OSError, ValueError, KeyError) as ex:
+            raise ImproperlyConfigured(f"Invalid CSP_POLICY_FILE: {ex}") from ex
+        self._next_check = time.monotonic() + check_interval
+        logger.debug("Loaded CSP policy file (version %s)", self.version)
+
+    @property
+    def version(self) -> str:
+        return self.compiled["version"]
+
+    @property
+    def headers(self) -> tuple[str, str]:
+        """Return (csp, report-uri) header parts."""
+        if time.monotonic() >= self._next_check:
+            self.reload_if_changed()
+        headers = self.compiled["headers"]
+        return headers["csp"], headers["report_uri"]
+
+    def reload_if_changed(self) -> bool:
+        # only one thread need check, the others use the current copy
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return False
+            self.compiled = read_policy_file(self.path)
+            self._mtime = mtime
+        except (OSError, ValueError, KeyError):
+            logger.exception("Error reloading CSP policy file - using last version")
+            return False
+        else:
+            logger.info("Reloaded CSP policy file (version %s)", self.version)
+            return True
+        finally:
+            self._lock.release()
+
+
+_policy_file: PolicyFile | None = None
+
+
+def get_policy_file() -> PolicyFile:
+    """Return the PolicyFile for CSP_POLICY_FILE, loading it if required."""
+    global _policy_file
+    if _policy_file is None:
+        _policy_file = PolicyFile(
+            str(CSP_POLICY_FILE), check_interval=CSP_POLICY_FILE_CHECK_INTERVAL
+        )
+    return _policy_file
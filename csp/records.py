@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import json
+import logging
+from typing import TYPE_CHECKING, Any, Iterator, TypeAlias, Union
+
+from .utils import strip_query
+
+if TYPE_CHECKING:
+    from .reports import ReportData
+
+logger = logging.getLogger(__name__)
+
+# field names used by the Reporting API ("report-to") version of the
+# report body, which are camelCase rather than kebab-case.
+REPORTING_API_FIELDS = {
+    "blocked-uri": "blockedURL",
+    "document-uri": "documentURL",
+    "effective-directive": "effectiveDirective",
+    "original-policy": "originalPolicy",
+    "script-sample": "sample",
+    "status-code": "statusCode",
+    "violated-directive": "violatedDirective",
+}
+
+# {attribute: names it may be sent as} for the fields that ReportRecord
+# keeps - in the same order of precedence as the ReportData aliases.
+FIELD_NAMES: dict[str, tuple[str, ...]] = {
+    "blocked_uri": ("blocked-uri", "blockedURL", "blocked_uri"),
+    "effective_directive": (
+        "effective-directive",
+        "effectiveDirective",
+        "effective_directive",
+    ),
+    "violated_directive": (
+        "violated-directive",
+        "violatedDirective",
+        "violated_directive",
+    ),
+    "disposition": ("disposition",),
+    "document_uri": ("document-uri", "documentURL", "document_uri"),
+}
+
+
+class InvalidReport(ValueError):
+    """Raised by ReportRecord.from_dict - `fields` are the invalid fields."""
+
+    def __init__(self, fields: list[str]) -> None:
+        super().__init__(", ".join(fields))
+        self.fields = fields
+
+
+def strip_uri(uri: str | None) -> str:
+    """
+    Strip querystring and truncate to fit model length.
+
+    We don't care about querystring params (CSP doesn't), and we can't
+    store URLs > 200 chars long, so we truncate here.
+
+    """
+    return strip_query(uri)[:200] if uri else ""
+
+
+def _get_str(data: dict[str, Any], names: tuple[str, ...]) -> str | None:
+    """Return the first of `names` in data, raising TypeError if not a str."""
+    for name in names:
+        if name in data:
+            value = data[name]
+            break
+    else:
+        return None
+    if value is None or isinstance(value, str):
+        return value
+    # numbers are coerced, as they are by ReportData - but bools are not
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise TypeError(names[0])
+
+
+class ReportRecord:
+    """
+    Compact violation report, used on the report ingestion hot path.
+
+    This holds only the fields that are stored - use ReportData for the
+    full report. `from_dict` applies the same validation and
+    normalization rules as ReportData (including the fallback from
+    effective_directive to violated_directive), but without building a
+    pydantic model, and the instance has no __dict__.
+
+    """
+
+    __slots__ = ("effective_directive", "blocked_uri", "document_uri", "disposition")
+
+    def __init__(
+        self,
+        effective_directive: str,
+        blocked_uri: str,
+        document_uri: str = "",
+        disposition: str = "",
+    ) -> None:
+        self.effective_directive = effective_directive
+        self.blocked_uri = blocked_uri
+        self.document_uri = document_uri
+        self.disposition = disposition
+
+    def __repr__(self) -> str:
+        return (
+            f"ReportRecord(effective_directive={self.effective_directive!r}, "
+            f"blocked_uri={self.blocked_uri!r})"
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> ReportRecord:
+        """
+        Validate a report body (report-uri or Reporting API format).
+
+        Raises InvalidReport listing the invalid fields, or TypeError if
+        data is not a dict.
+
+        """
+        if not isinstance(data, dict):
+            raise TypeError("Report data must be a dict")
+        values: dict[str, str | None] = {}
+        invalid: list[str] = []
+        for field, names in FIELD_NAMES.items():
+            try:
+                values[field] = _get_str(data, names)
+            except TypeError:
+                invalid.append(names[0])
+        if not values.get("blocked_uri") and "blocked-uri" not in invalid:
+            invalid.append("blocked-uri")
+        if invalid:
+            raise InvalidReport(invalid)
+        directive = values["effective_directive"] or values["violated_directive"]
+        if not directive:
+            raise InvalidReport(["effective-directive"])
+        return cls(
+            directive,
+            strip_uri(values["blocked_uri"]),
+            strip_uri(values["document_uri"]),
+            values["disposition"] or "",
+        )
+
+
+def records_from_payload(data: Any) -> list[ReportRecord]:
+    """
+    Return the violation reports in a report-uri, or Reporting API, body.
+
+    A Reporting API ("report-to") body is a list of reports of any type,
+    of which only the valid "csp-violation" reports are returned - an
+    invalid entry is skipped, rather than rejecting the whole batch. A
+    report-uri body raises KeyError or TypeError if it is not in the
+    expected format, and InvalidReport if the report is invalid.
+
+    """
+    if isinstance(data, list):
+        return list(_batch_records(data))
+    return [ReportRecord.from_dict(data["csp-report"])]
+
+
+def _batch_records(batch: list[Any]) -> Iterator[ReportRecord]:
+    """Yield the valid csp-violation reports in a Reporting API batch."""
+    for entry in batch:
+        try:
+            if entry["type"] != "csp-violation":
+                continue
+            yield ReportRecord.from_dict(entry["body"])
+        except (KeyError, TypeError, InvalidReport) as ex:
+            logger.debug("Skipping invalid Reporting API report: %r", ex)
+
+
+def parse_log_lines(lines: list[str]) -> tuple[list[ReportRecord], int]:
+    """
+    Parse lines of JSON report bodies, returning (reports, invalid lines).
+
+    Each line is a request body as accepted by the report_uri view - blank
+    lines are skipped. This does not use Django, so it can be run in a
+    worker process.
+
+    """
+    records: list[ReportRecord] = []
+    invalid = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            records.extend(records_from_payload(json.loads(line)))
+        except (ValueError, KeyError, TypeError):
+            # JSONDecodeError and InvalidReport are both ValueErrors
+            invalid += 1
+    return records, invalid
+
+
+# anything that can be stored - the full, or the compact, report.
+ReportType: TypeAlias = Union["ReportData", ReportRecord]
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable, Sequence
+
+from django.db import connections
+
+from .backends import get_report_backend
+from .breaker import report_breaker
+from .settings import (
+    CSP_REPORT_QUEUE_BATCH_SIZE,
+    CSP_REPORT_QUEUE_OVERFLOW,
+    CSP_REPORT_QUEUE_SHUTDOWN_TIMEOUT,
+    CSP_REPORT_QUEUE_SIZE,
+    CSP_REPORT_QUEUE_WORKERS,
+)
+
+if TYPE_CHECKING:
+    from .records import ReportType
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop-oldest"
+DROP_NEWEST = "drop-newest"
+
+FlushFunc = Callable[[Sequence[Any]], Any]
+
+
+def _save_reports(batch: Sequence[ReportType]) -> None:
+    # a failing database opens the breaker, so that report_uri fails fast
+    report_breaker.call(get_report_backend().save_reports, batch)
+
+
+class ReportQueue:
+    """
+    Bounded queue drained by a pool of worker threads.
+
+    The threads are started lazily on the first `put`, and restarted if
+    the process has forked since (e.g. gunicorn with --preload), so that
+    each worker process owns its own pool.
+
+    """
+
+    def __init__(
+        self,
+        flush: FlushFunc,
+        maxsize: int = 1000,
+        workers: int = 2,
+        batch_size: int = 100,
+        overflow: str = DROP_OLDEST,
+    ) -> None:
+        if overflow not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Invalid queue overflow policy: '{overflow}'")
+        self.flush = flush
+        self.maxsize = max(maxsize, 1)
+        self.workers = max(workers, 1)
+        self.batch_size = max(batch_size, 1)
+        self.overflow = overflow
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._pid: int | None = None
+        self._closed = False
+        self._in_flight = 0
+        # metrics
+        self.accepted = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> dict[str, Any]:
+        """Return snapshot of queue metrics."""
+        with self._cond:
+            return {
+                "depth": len(self._items),
+                "in_flight": self._in_flight,
+                "maxsize": self.maxsize,
+                "workers": sum(t.is_alive() for t in self._threads),
+                "overflow": self.overflow,
+                "accepted": self.accepted,
+                "dropped": self.dropped,
+                "processed": self.processed,
+                "failed": self.failed,
+            }
+
+    def put(self, item: Any) -> bool:
+        """
+        Add item to the queue, applying the overflow policy if full.
+
+        Returns False if the item itself was discarded (queue closed, or
+        full with the "drop-newest" policy).
+
+        """
+        with self._cond:
+            if self._closed:
+                logger.debug("Report queue is closed - discarding report")
+                return False
+            self._ensure_started()
+            if len(self._items) >= self.maxsize:
+                self.dropped += 1
+                if self.overflow == DROP_NEWEST:
+                    logger.debug("Report queue is full - dropping newest report")
+                    return False
+                logger.debug("Report queue is full - dropping oldest report")
+                self._items.popleft()
+            self._items.append(item)
+            self.accepted += 1
+            self._cond.notify()
+        return True
+
+    def join(self, timeout: float | None = None) -> bool:
+        """Block until all queued items have been flushed."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._items and not self._in_flight, timeout
+            )
+
+    def shutdown(self, timeout: float | None = None) -> None:
+        """Stop accepting items and drain the queue."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        if remaining := len(self._items):
+            logger.warning("Report queue shut down with %s unsaved reports", remaining)
+
+    def _ensure_started(self) -> None:
+        # must be called with the lock held
+        if self._pid == os.getpid():
+            return
+        # either first use, or we are in a forked child process which
+        # has inherited the parent's queue without its threads.
+        self._pid = os.getpid()
+        self._items.clear()
+        self._in_flight = 0
+        self._threads = [
+            threading.Thread(
+                target=self._run, name=f"csp-report-queue-{i}", daemon=True
+            )
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _next_batch(self) -> list[Any] | None:
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._closed)
+            if not self._items:
+                # closed and fully drained
+                return None
+            size = min(self.batch_size, len(self._items))
+            batch = [self._items.popleft() for _ in range(size)]
+            self._in_flight += size
+            return batch
+
+    def _run(self) -> None:
+        try:
+            while (batch := self._next_batch()) is not None:
+                failed = 0
+                try:
+                    self.flush(batch)
+                except Exception:
+                    logger.exception("Error saving batch of %s CSP reports", len(batch))
+                    failed = len(batch)
+                with self._cond:
+                    self._in_flight -= len(batch)
+                    self.processed += len(batch) - failed
+                    self.failed += failed
+                    self._cond.notify_all()
+        finally:
+            connections.close_all()
+
+
+_queue: ReportQueue | None = None
+_queue_lock = threading.Lock()
+
+
+def get_report_queue() -> ReportQueue:
+    """Return the process-wide report queue, creating it if required."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ReportQueue(
+                flush=_save_reports,
+                maxsize=CSP_REPORT_QUEUE_SIZE,
+                workers=CSP_REPORT_QUEUE_WORKERS,
+                batch_size=CSP_REPORT_QUEUE_BATCH_SIZE,
+                overflow=CSP_REPORT_QUEUE_OVERFLOW,
+            )
+            atexit.register(_queue.shutdown, CSP_REPORT_QUEUE_SHUTDOWN_TIMEOUT)
+        return _queue
+
+
+def join_report_queue(timeout: float | None = None) -> bool:
+    """Wait for queued reports to be saved - False if the timeout expires."""
+    return _queue.join(timeout) if _queue else True
+
+
+def queue_stats() -> dict[str, Any] | None:
+    """Return the report queue metrics, or None if it's not in use."""
+    return _queue.stats() if _queue else None
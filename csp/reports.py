@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import logging
+
+from pydantic import (
+    AliasChoices,
+    BaseModel,
+    ConfigDict,
+    Field,
+    field_validator,
+    model_validator,
+)
+
+from .records import REPORTING_API_FIELDS, ReportRecord, strip_uri
+
+logger = logging.getLogger(__name__)
+
+
+def _aliases(name: str) -> AliasChoices:
+    """Accept either the report-uri or the Reporting API field name."""
+    return AliasChoices(name, REPORTING_API_FIELDS[name])
+
+
+class ReportData(BaseModel):
+    # browser support for CSP reports turns out to be patchy at best -
+    # all fields are optional on the way in, but we need at least the
+    # violated_directive and the blocked_uri to be able to make sense of
+    # the report.
+
+    # mandatory fields - without these we cannot process the report the
+    # min_length ensures we don't have an empty string
+    blocked_uri: str = Field(
+        alias="blocked-uri", validation_alias=_aliases("blocked-uri"), min_length=1
+    )
+    # we must have one of these - validate_directives enforces this
+    effective_directive: str | None = Field(
+        None,
+        alias="effective-directive",
+        validation_alias=_aliases("effective-directive"),
+    )
+    violated_directive: str | None = Field(
+        None,
+        alias="violated-directive",
+        validation_alias=_aliases("violated-directive"),
+    )
+    # optional
+    disposition: str | None = Field("", alias="disposition")
+    document_uri: str | None = Field(
+        "", alias="document-uri", validation_alias=_aliases("document-uri")
+    )
+    original_policy: str | None = Field(
+        None, alias="original-policy", validation_alias=_aliases("original-policy")
+    )
+    referrer: str | None = Field(None, alias="referrer")
+    script_sample: str | None = Field(
+        None, alias="script-sample", validation_alias=_aliases("script-sample")
+    )
+    status_code: str | None = Field(
+        0, alias="status-code", validation_alias=_aliases("status-code")
+    )
+
+    @field_validator("document_uri", "blocked_uri")
+    @classmethod
+    def strip_uri(cls, uri: str) -> str:
+        """Strip querystring and truncate to fit model length."""
+        return strip_uri(uri)
+
+    @model_validator(mode="after")
+    def validate_directives(self) -> ReportData:
+        """Ensure that we have either effective_directive or violated_directive."""
+        if self.effective_directive:
+            return self
+        # if effective_directive is empty, but violated_directive is not,
+        # then update the former with the latter.
+        if self.violated_directive:
+            logger.debug(
+                "'effective_directive' missing - using 'violated_directive' attr."
+            )
+            self.effective_directive = self.violated_directive
+            return self
+        raise ValueError(
+            "Either 'effective_directive' or 'violated_directive' must be present."
+        )
+
+    model_config = ConfigDict(populate_by_name=True, coerce_numbers_to_str=True)
+
+    def to_record(self) -> ReportRecord:
+        """Return the compact form of the report - the fields that are stored."""
+        return ReportRecord(
+            str(self.effective_directive),
+            self.blocked_uri,
+            self.document_uri or "",
+            self.disposition or "",
+        )
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from typing import Any
+
+from django.db.models import Model
+
+from .settings import (
+    CSP_CACHE_TIMEOUT,
+    CSP_REPORT_DATABASE,
+    CSP_RULES_READ_CACHE_TIMEOUT,
+    CSP_RULES_READ_DATABASE,
+)
+
+# models that are stored in CSP_REPORT_DATABASE
+REPORT_MODELS = frozenset(["cspreport", "cspreportcountershard", "cspreportsummary"])
+
+
+def is_report_model(model: type[Model]) -> bool:
+    return model._meta.app_label == "csp" and model._meta.model_name in REPORT_MODELS
+
+
+def rules_cache_timeout(using: str | None) -> int:
+    """
+    Return the cache timeout of a policy / blacklist read from `using`.
+
+    If `using` is None then CSP_RULES_READ_DATABASE is read - which, if
+    it is a replica, may lag a change - so the result is cached for
+    CSP_RULES_READ_CACHE_TIMEOUT rather than CSP_CACHE_TIMEOUT.
+
+    """
+    if CSP_RULES_READ_DATABASE and not using:
+        return min(CSP_CACHE_TIMEOUT, CSP_RULES_READ_CACHE_TIMEOUT)
+    return CSP_CACHE_TIMEOUT
+
+
+class CspRouter:
+    """
+    Database router that sends violation reports to CSP_REPORT_DATABASE.
+
+    Reports (and their counter shards and summaries) are read from, and
+    written to, the report database - and are only migrated there. All
+    other models, including rules, are left to the default routing, and
+    are not migrated to the report database.
+
+    Add "csp.routers.CspRouter" to DATABASE_ROUTERS to use it.
+
+    """
+
+    def db_for_read(self, model: type[Model], **hints: Any) -> str | None:
+        if CSP_REPORT_DATABASE and is_report_model(model):
+            return CSP_REPORT_DATABASE
+        return None
+
+    def db_for_write(self, model: type[Model], **hints: Any) -> str | None:
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1: Model, obj2: Model, **hints: Any) -> bool | None:
+        if CSP_REPORT_DATABASE and is_report_model(type(obj1)):
+            return is_report_model(type(obj2))
+        return None
+
+    def allow_migrate(
+        self, db: str, app_label: str, model_name: str | None = None, **hints: Any
+    ) -> bool | None:
+        if not CSP_REPORT_DATABASE or app_label != "csp":
+            return None
+        if model_name in REPORT_MODELS:
+            return db == CSP_REPORT_DATABASE
+        if model_name:
+            # rules, blacklist, config etc. are not stored in the report db
+            return db != CSP_REPORT_DATABASE
+        return None
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any
+
+import django
+from django.db import transaction
+from django.utils.timezone import now as tz_now
+
+from .models import CspRule, DirectiveChoices
+from .policy import rules_changed
+
+# bulk_create(update_conflicts=True) was added in Django 4.1
+BULK_UPSERT = django.VERSION >= (4, 1)
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("json", "yaml")
+
+# (directive, value, host) - the rule natural key
+RuleKeyType = tuple[str, str, str]
+
+
+def get_format(path: str | None, fmt: str | None = None) -> str:
+    """Return the file format - explicit, or from the file extension."""
+    if fmt:
+        return fmt
+    if path and path.lower().endswith((".yaml", ".yml")):
+        return "yaml"
+    return "json"
+
+
+def _yaml() -> Any:
+    # PyYAML is an optional dependency - only required for YAML files
+    try:
+        import yaml
+    except ImportError as ex:
+        raise ValueError("PyYAML must be installed to read / write YAML") from ex
+    return yaml
+
+
+def dumps_rules(rules: list[dict[str, Any]], fmt: str) -> str:
+    if fmt == "yaml":
+        return _yaml().safe_dump(rules, sort_keys=False)
+    return json.dumps(rules, indent=2) + "\n"
+
+
+def loads_rules(text: str, fmt: str) -> list[dict[str, Any]]:
+    rules = _yaml().safe_load(text) if fmt == "yaml" else json.loads(text)
+    if not isinstance(rules, list):
+        raise ValueError("Rules file must contain a list of rules")
+    return rules
+
+
+def export_rules(enabled_only: bool = False) -> list[dict[str, Any]]:
+    """Return rules in their serializable (file) form."""
+    rules = CspRule.objects.all()
+    if enabled_only:
+        rules = rules.enabled()
+    exported = []
+    for directive, value, host, enabled in rules.order_by(
+        "directive", "value", "host"
+    ).values_list("directive", "value", "host", "enabled"):
+        rule: dict[str, Any] = {"directive": directive, "value": value}
+        if host:
+            rule["host"] = host
+        rule["enabled"] = enabled
+        exported.append(rule)
+    return exported
+
+
+@dataclass
+class RuleDiff:
+    created: list[CspRule] = field(default_factory=list)
+    updated: list[CspRule] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def changed(self) -> list[CspRule]:
+        return self.created + self.updated
+
+    def lines(self) -> list[str]:
+        """Return a human-readable diff."""
+        return [f"+ {r} (enabled={r.enabled})" for r in self.created] + [
+            f"~ {r} (enabled={r.enabled})" for r in self.updated
+        ]
+
+
+def parse_rules(rules: list[dict[str, Any]]) -> dict[RuleKeyType, bool]:
+    """
+    Validate imported rules.
+
+    Returns {(directive, value, host): enabled}. Values are kept as they
+    are in the file (as they would be in the admin) - they are matched
+    with existing rules on their normalized value (see diff_rules).
+    Raises ValueError for an invalid rule.
+
+    """
+    parsed: dict[RuleKeyType, bool] = {}
+    for index, rule in enumerate(rules):
+        try:
+            directive, value = rule["directive"], str(rule["value"])
+            host = str(rule.get("host") or "").lower()
+            enabled = bool(rule.get("enabled", True))
+        except (KeyError, TypeError, AttributeError) as ex:
+            raise ValueError(f"Invalid rule at index {index}: {rule!r}") from ex
+        if directive not in DirectiveChoices.values:
+            raise ValueError(f"Invalid directive at index {index}: '{directive}'")
+        parsed[(directive, value, host)] = enabled
+    return parsed
+
+
+def diff_rules(rules: dict[RuleKeyType, bool]) -> RuleDiff:
+    """
+    Compare imported rules with the database.
+
+    Rules are matched on (directive, normalized value, host) - so that
+    e.g. "self" matches an existing "'self'" rule. An existing rule keeps
+    its value, and only `enabled` is updated.
+
+    """
+    # {(directive, normalized value, host): (value, enabled)}
+    imported: dict[RuleKeyType, tuple[str, bool]] = {}
+    cleaned: dict[str, str] = {}
+    for (directive, value, host), enabled in rules.items():
+        if value not in cleaned:
+            cleaned[value] = CspRule.clean_value(value)
+        imported[(directive, cleaned[value], host)] = (value, enabled)
+    existing = {
+        (directive, normalized_value, host): (value, enabled)
+        for directive, normalized_value, host, value, enabled in CspRule.objects.filter(
+            normalized_value__in={value for _, value, _ in imported}
+        ).values_list("directive", "normalized_value", "host", "value", "enabled")
+    }
+    diff = RuleDiff()
+    now = tz_now()
+    for key, (value, enabled) in imported.items():
+        directive, normalized_value, host = key
+        if key in existing:
+            # update the existing rule - not a new one with this value
+            value = existing[key][0]
+        rule = CspRule(
+            directive=directive,
+            value=value,
+            normalized_value=normalized_value,
+            host=host,
+            enabled=enabled,
+            created_at=now,
+            modified_at=now,
+        )
+        if key not in existing:
+            diff.created.append(rule)
+        elif existing[key][1] != enabled:
+            diff.updated.append(rule)
+        else:
+            diff.unchanged += 1
+    return diff
+
+
+def _save_rules(diff: RuleDiff) -> None:
+    """Save the changed rules, without sending post_save for each rule."""
+    if BULK_UPSERT:
+        CspRule.objects.bulk_create(
+            diff.changed,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["value", "directive", "host"],
+            update_fields=["enabled", "modified_at"],
+        )
+        return
+    CspRule.objects.bulk_create(diff.created, batch_size=500)
+    for rule in diff.updated:
+        CspRule.objects.filter(
+            directive=rule.directive, value=rule.value, host=rule.host
+        ).update(enabled=rule.enabled, modified_at=rule.modified_at)
+
+
+def import_rules(rules: dict[RuleKeyType, bool], dry_run: bool = False) -> RuleDiff:
+    """
+    Create / update rules in bulk, and clear the cached CSP once.
+
+    Rules are saved in a single transaction - as neither bulk_create nor
+    update sends post_save, the cache is not cleared for each rule, but
+    once at the end (see rules_changed - which also rebuilds the policy
+    from the primary once committed, if a replica or snapshots are in use).
+
+    """
+    diff = diff_rules(rules)
+    if dry_run or not diff.changed:
+        return diff
+    with transaction.atomic():
+        _save_rules(diff)
+    logger.debug("Imported %s CSP rules - clearing cache", len(diff.changed))
+    rules_changed()
+    return diff
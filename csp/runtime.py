@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from typing import Any
+
+from django.core.cache import cache
+
+from .settings import CSP_RUNTIME_CONFIG, CSP_RUNTIME_CONFIG_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# shared (cross-process) copy of the overrides, with a version stamp
+CACHE_KEY_CONFIG = "csp::config"
+
+
+def publish_config() -> dict[str, Any]:
+    """
+    Read the overrides from the database, and publish them to the cache.
+
+    The cached value is stamped with a new version, so each process picks
+    up the change the next time that it checks the cache. It does not
+    expire, so the database is only read again when the config is saved,
+    or the cache entry is evicted.
+
+    """
+    from .models import CspConfig
+
+    config = {
+        "version": uuid.uuid4().hex,
+        "overrides": CspConfig.objects.get_overrides(),
+    }
+    cache.set(CACHE_KEY_CONFIG, config, None)
+    logger.debug("Published CSP runtime config %s", config["version"])
+    return config
+
+
+class RuntimeConfig:
+    """
+    Per-process copy of the CspConfig overrides.
+
+    The shared cache is checked (a single cache read) at most once every
+    `interval` seconds, and the local copy replaced only if the version
+    has changed - so a change made in the admin is picked up by all
+    processes within `interval` seconds, without a database read.
+
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.version: str | None = None
+        self.overrides: dict[str, Any] = {}
+        self.checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """Return the override for a setting, or default if it is not set."""
+        now = time.monotonic()
+        if now - self.checked_at >= self.interval:
+            self.refresh(now)
+        return self.overrides.get(name, default)
+
+    def refresh(self, now: float) -> None:
+        # only one thread per process checks the cache - others carry on
+        # using the current values.
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self.checked_at = now
+            try:
+                config = cache.get(CACHE_KEY_CONFIG) or publish_config()
+            except Exception:
+                # cache / database outage - keep the current overrides, and
+                # try again once the interval has passed.
+                logger.exception("Error reading CSP runtime config")
+                return
+            if config["version"] != self.version:
+                logger.debug("Loaded CSP runtime config %s", config["version"])
+                self.version = config["version"]
+                self.overrides = config["overrides"]
+        finally:
+            self._lock.release()
+
+
+_runtime_config = RuntimeConfig(CSP_RUNTIME_CONFIG_INTERVAL)
+
+
+def get_runtime_setting(name: str, default: Any = None) -> Any:
+    """
+    Return the runtime override of a setting, or default.
+
+    If CSP_RUNTIME_CONFIG is False then this always returns the default.
+
+    """
+    if not CSP_RUNTIME_CONFIG:
+        return default
+    return _runtime_config.get(name, default)
+
+
+def runtime_overrides() -> dict[str, Any]:
+    """Return the overrides in use by this process."""
+    return dict(_runtime_config.overrides) if CSP_RUNTIME_CONFIG else {}
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import time
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.http import HttpRequest
+
+from .settings import (
+    CSP_REPORT_SAMPLING,
+    CSP_REPORT_SAMPLING_MAX,
+    CSP_REPORT_SAMPLING_MIN,
+    CSP_REPORT_SAMPLING_TARGET,
+    CSP_REPORT_SAMPLING_WINDOW,
+)
+
+logger = logging.getLogger(__name__)
+
+# number of reports accepted in a window, and the ratio used in a window
+CACHE_KEY_REPORT_COUNT = "csp::sampling::reports::{}"
+CACHE_KEY_SAMPLING_RATIO = "csp::sampling::ratio::{}"
+
+# the ratio can fall as fast as it needs to, but is only allowed to
+# double in each window, to prevent it from swinging wildly up after a
+# quiet window.
+MAX_RATIO_INCREASE = 2.0
+
+
+def current_window() -> int:
+    return int(time.time() // CSP_REPORT_SAMPLING_WINDOW)
+
+
+def record_report() -> None:
+    """Increment the accepted-report counter for the current window."""
+    key = CACHE_KEY_REPORT_COUNT.format(current_window())
+    timeout = CSP_REPORT_SAMPLING_WINDOW * 3
+    if cache.add(key, 1, timeout):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout)
+
+
+def client_hash(request: HttpRequest, window: int) -> float:
+    """Return deterministic value 0..1 for the client / page in the window."""
+    client = "{}|{}|{}|{}".format(
+        request.META.get("REMOTE_ADDR", ""),
+        request.headers.get("User-Agent", ""),
+        request.path,
+        window,
+    )
+    digest = hashlib.blake2b(client.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64
+
+
+class AdaptiveSampler:
+    """
+    Adjust the report-uri sampling ratio to meet a target report rate.
+
+    Time is divided into windows (CSP_REPORT_SAMPLING_WINDOW seconds).
+    The report-uri view counts the reports it accepts in each window,
+    and at the start of each window the ratio is recalculated from the
+    previous window's ratio and report rate, so that if the rate was
+    double the target, the ratio is halved (and vice versa), within the
+    configured min / max.
+
+    The ratio for each window is calculated once, by the first process
+    to need it, and shared via the cache - each process then holds it in
+    memory for the rest of the window.
+
+    Whether or not a response gets the report-uri is determined by a hash
+    of the client (IP + User-Agent), the page (path) and the window, so
+    a client reports on a stable subset of pages for the duration of a
+    window - rather than on every page it loads, or on a random
+    selection of its page views (e.g. every reload of the same page).
+
+    """
+
+    def __init__(
+        self,
+        target: float,
+        min_ratio: float = 0.0,
+        max_ratio: float = 1.0,
+        initial_ratio: float = 1.0,
+    ) -> None:
+        self.target = target
+        self.min_ratio = min_ratio
+        self.max_ratio = max_ratio
+        self._window = -1
+        self._ratio = self.clamp(initial_ratio)
+
+    def clamp(self, ratio: float) -> float:
+        return min(max(ratio, self.min_ratio), self.max_ratio)
+
+    def calculate_ratio(self, previous_ratio: float, report_count: int) -> float:
+        rate = report_count / CSP_REPORT_SAMPLING_WINDOW
+        increase = MAX_RATIO_INCREASE * previous_ratio
+        if not rate:
+            return self.clamp(increase)
+        return self.clamp(min(previous_ratio * self.target / rate, increase))
+
+    def ratio(self) -> float:
+        """Return the sampling ratio for the current window."""
+        window = current_window()
+        if window == self._window:
+            return self._ratio
+        key = CACHE_KEY_SAMPLING_RATIO.format(window)
+        if (ratio := cache.get(key)) is None:
+            previous = cache.get_many(
+                [
+                    CACHE_KEY_SAMPLING_RATIO.format(window - 1),
+                    CACHE_KEY_REPORT_COUNT.format(window - 1),
+                ]
+            )
+            ratio = self.calculate_ratio(
+                previous.get(CACHE_KEY_SAMPLING_RATIO.format(window - 1), self._ratio),
+                previous.get(CACHE_KEY_REPORT_COUNT.format(window - 1), 0),
+            )
+            # another process may have got there first - theirs wins
+            if not cache.add(key, ratio, CSP_REPORT_SAMPLING_WINDOW * 3):
+                ratio = cache.get(key, ratio)
+            logger.debug("CSP report sampling ratio set to %.4f", ratio)
+        self._window, self._ratio = window, ratio
+        return ratio
+
+    def sample(self, request: HttpRequest) -> bool:
+        """Return True if the response should include the report-uri."""
+        ratio = self.ratio()
+        return client_hash(request, self._window) < ratio
+
+
+@lru_cache
+def get_sampler() -> AdaptiveSampler | None:
+    """Return the process-wide sampler, if adaptive sampling is enabled."""
+    if CSP_REPORT_SAMPLING_TARGET is None:
+        return None
+    return AdaptiveSampler(
+        target=CSP_REPORT_SAMPLING_TARGET,
+        min_ratio=CSP_REPORT_SAMPLING_MIN,
+        max_ratio=CSP_REPORT_SAMPLING_MAX,
+        initial_ratio=CSP_REPORT_SAMPLING,
+    )
@@ -1,20 +1,51 @@
 from __future__ import annotations
 
 from copy import deepcopy
-from typing import Callable, TypeAlias
+from typing import Any, Callable, TypeAlias
 
 from django.conf import settings
 from django.http import HttpRequest, HttpResponse
 
 PolicyType: TypeAlias = dict[str, list[str]]
 
+# Settings are read from django.conf.settings on first access, rather
+# than at import, so that importing this module (e.g. from the middleware)
+# doesn't incur the cost of every setting. Each setting is declared with
+# its type, and registered with a loader function.
+_LOADERS: dict[str, Callable[[], Any]] = {}
+
+
+def _lazy(
+    name: str,
+    default: Any,
+    cast: Callable[[Any], Any] | None = None,
+    setting: str | None = None,
+) -> None:
+    """Register a module attribute to be read from django settings."""
+
+    def loader() -> Any:
+        value = getattr(settings, setting or name, default)
+        return cast(value) if cast else value
+
+    _LOADERS[name] = loader
+
+
+def __getattr__(name: str) -> Any:
+    # only called if the attribute has not been loaded yet (PEP 562)
+    if name not in _LOADERS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = _LOADERS[name]()
+    return value
+
 
 # If False then the middleware is disabled completely
-CSP_ENABLED = bool(getattr(settings, "CSP_ENABLED", False))
+CSP_ENABLED: bool
+_lazy("CSP_ENABLED", False, bool)
 
 
 # If True then set the report-only attr on the CSP
-CSP_REPORT_ONLY = bool(getattr(settings, "CSP_REPORT_ONLY", True))
+CSP_REPORT_ONLY: bool
+_lazy("CSP_REPORT_ONLY", True, bool)
 
 # === reporting ===
 #
@@ -41,19 +72,44 @@ CSP_REPORT_ONLY = bool(getattr(settings, "CSP_REPORT_ONLY", True))
 # The Report-To header value - if supplied it will be added to the response -
 # and you can then add a "report-to: <endpoint>" directive to the CSP.
 # https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/Content-Security-Policy/report-to  # noqa: E501
-REPORT_TO_HEADER = getattr(settings, "REPORT_TO_HEADER", None)
+REPORT_TO_HEADER: dict | None
+_lazy("REPORT_TO_HEADER", None)
 
 
 # The Reporting-Endpoints value - if supplied it will be added to the response -
 # and you can then add a "report-to: <endpoint>" directive to the CSP.
 # https://developer.chrome.com/blog/reporting-api-migration/#migration-steps-for-csp-reporting  # noqa: E501
-REPORTING_ENDPOINTS_HEADER = getattr(settings, "REPORTING_ENDPOINTS_HEADER", None)
+REPORTING_ENDPOINTS_HEADER: str | None
+_lazy("REPORTING_ENDPOINTS_HEADER", None)
 
 
 # Value 0..1 - used to tune the percentage of responses that get the
 # report-uri valuable if the reporting is too noisy. Set to 0.0 to
 # disable report-uri completely, or 1.0 to include it on all responses.
-CSP_REPORT_SAMPLING = float(getattr(settings, "CSP_REPORT_SAMPLING", 1.0))
+CSP_REPORT_SAMPLING: float
+_lazy("CSP_REPORT_SAMPLING", 1.0, float)
+
+
+# Target number of reports/sec (across all processes) - if set then the
+# sampling ratio is adjusted continuously to meet the target, within the
+# min / max values below, with CSP_REPORT_SAMPLING used as the initial
+# ratio. Set to None to use the fixed CSP_REPORT_SAMPLING ratio.
+CSP_REPORT_SAMPLING_TARGET: float | None
+_lazy(
+    "CSP_REPORT_SAMPLING_TARGET",
+    None,
+    lambda v: None if v is None else float(v),
+)
+CSP_REPORT_SAMPLING_MIN: float
+_lazy("CSP_REPORT_SAMPLING_MIN", 0.001, float)
+CSP_REPORT_SAMPLING_MAX: float
+_lazy("CSP_REPORT_SAMPLING_MAX", 1.0, float)
+
+
+# Length (seconds) of the window over which the report rate is measured,
+# and for which each adaptive sampling ratio is used.
+CSP_REPORT_SAMPLING_WINDOW: int
+_lazy("CSP_REPORT_SAMPLING_WINDOW", 10, int)
 
 
 # Value 0..1 - used to throttle report-uri requests. The report-uri is
@@ -61,14 +117,129 @@ CSP_REPORT_SAMPLING = float(getattr(settings, "CSP_REPORT_SAMPLING", 1.0))
 # DOS vulnerability. Use this to throw away a percentage of reports
 # received without attempting to process them. Set to 1.0 to ignore all
 # inbound reports.
-CSP_REPORT_THROTTLING = float(getattr(settings, "CSP_REPORT_THROTTLING", 0.0))
+CSP_REPORT_THROTTLING: float
+_lazy("CSP_REPORT_THROTTLING", 0.0, float)
+
+
+# If True then the violation summary (used by the summary view) is
+# updated as each report is saved to the database - otherwise it is only
+# updated by the refresh_csp_summary management command.
+CSP_REPORT_SUMMARY: bool
+_lazy("CSP_REPORT_SUMMARY", False, bool)
+
+
+# Seconds between saves of the summary counts buffered by each process
+# (see CSP_REPORT_SUMMARY).
+CSP_REPORT_SUMMARY_FLUSH_INTERVAL: float
+_lazy("CSP_REPORT_SUMMARY_FLUSH_INTERVAL", 10.0, float)
+
+
+# If > 0 then count increments for existing reports are written to one of
+# this many shard rows (chosen at random), rather than to the CspReport
+# row itself, so that concurrent reports for the same violation do not
+# wait on a single row lock. See the compact_csp_counters command.
+CSP_REPORT_COUNTER_SHARDS: int
+_lazy("CSP_REPORT_COUNTER_SHARDS", 0, int)
+
+
+# If True then reports for a source that the current policy already
+# allows (e.g. from browsers with a stale policy, after the violation was
+# converted to a rule) are dropped - and counted - before they are saved.
+CSP_REPORT_DROP_ALLOWED: bool
+_lazy("CSP_REPORT_DROP_ALLOWED", False, bool)
+
+
+# Database alias that violation reports (CspReport, and its counter shards
+# and summary) are stored in, via csp.routers.CspRouter - so that report
+# traffic can be kept off the primary database. None uses the default.
+CSP_REPORT_DATABASE: str | None
+_lazy("CSP_REPORT_DATABASE", None)
+
+
+# Database alias that rules and blacklist entries are read from when the
+# cached policy / blacklist is (re)built - e.g. a read replica. The admin
+# is unaffected. None uses the default.
+CSP_RULES_READ_DATABASE: str | None
+_lazy("CSP_RULES_READ_DATABASE", None)
+
+
+# Cache timeout (seconds) of a policy / blacklist rebuilt from
+# CSP_RULES_READ_DATABASE, which may lag a change. After each change the
+# cache is rebuilt from the primary (and cached for CSP_CACHE_TIMEOUT).
+CSP_RULES_READ_CACHE_TIMEOUT: int
+_lazy("CSP_RULES_READ_CACHE_TIMEOUT", 60, int)
+
+
+# If True then the compiled policy (for every host) is saved as a new
+# CspPolicySnapshot when the rules change, and a cache miss reads the
+# latest snapshot - a single row - rather than rebuilding the policy.
+CSP_POLICY_SNAPSHOTS: bool
+_lazy("CSP_POLICY_SNAPSHOTS", False, bool)
+
+
+# Dotted path to the class used to store violation reports, and the
+# kwargs used to initialise it - see csp.backends for the builtins.
+CSP_REPORT_BACKEND: str
+_lazy("CSP_REPORT_BACKEND", "csp.backends.DatabaseReportBackend", str)
+CSP_REPORT_BACKEND_OPTIONS: dict
+_lazy("CSP_REPORT_BACKEND_OPTIONS", {})
+
+
+# Timeout (seconds) for counters stored by the CacheReportBackend - the
+# timeout is reset each time the counter is incremented.
+CSP_REPORT_CACHE_TIMEOUT: int
+_lazy("CSP_REPORT_CACHE_TIMEOUT", 86400, int)
+
+
+# If True then valid reports are pushed on to a bounded in-process queue
+# and the report-uri view returns immediately (204) - a small pool of
+# worker threads drains the queue to the database in batches.
+CSP_REPORT_ASYNC: bool
+_lazy("CSP_REPORT_ASYNC", False, bool)
+
+
+# Max number of reports held in the in-process queue.
+CSP_REPORT_QUEUE_SIZE: int
+_lazy("CSP_REPORT_QUEUE_SIZE", 1000, int)
+
+
+# Number of worker threads draining the queue.
+CSP_REPORT_QUEUE_WORKERS: int
+_lazy("CSP_REPORT_QUEUE_WORKERS", 2, int)
+
+
+# Max number of reports saved by a worker in a single batch.
+CSP_REPORT_QUEUE_BATCH_SIZE: int
+_lazy("CSP_REPORT_QUEUE_BATCH_SIZE", 100, int)
+
+
+# What to do when the queue is full - "drop-oldest" evicts the report at
+# the head of the queue to make room, "drop-newest" discards the inbound
+# report.
+CSP_REPORT_QUEUE_OVERFLOW: str
+_lazy("CSP_REPORT_QUEUE_OVERFLOW", "drop-oldest", str)
+
+
+# Max number of seconds to wait for the queue to drain on shutdown.
+CSP_REPORT_QUEUE_SHUTDOWN_TIMEOUT: float
+_lazy("CSP_REPORT_QUEUE_SHUTDOWN_TIMEOUT", 5.0, float)
+
+
+# dict of {directive: granularity} used to normalize the blocked_uri of
+# inbound reports, to reduce the number of distinct violations stored.
+# Granularity is one of "full" (the default - full URL minus the query
+# string), "path" (URL minus the last path segment), "origin" (scheme,
+# host and port), or "domain" (origin with subdomains replaced by a
+# wildcard). Use the "*" key to set the default for all directives.
+CSP_REPORT_NORMALIZATION: dict[str, str]
+_lazy("CSP_REPORT_NORMALIZATION", {}, dict)
 
 
 # dict to downgrade unsupported directives when converting to rules,
 # e.g. if the violation from Chrome is "script-src-elem", which is not
 # universally supported, then convert it to "script-src" on the fly.
-CSP_REPORT_DIRECTIVE_DOWNGRADE: dict[str, str] = getattr(
-    settings,
+CSP_REPORT_DIRECTIVE_DOWNGRADE: dict[str, str]
+_lazy(
     "CSP_REPORT_DIRECTIVE_DOWNGRADE",
     {
         "script-src-elem": "script-src",
@@ -80,35 +251,138 @@ CSP_REPORT_DIRECTIVE_DOWNGRADE: dict[str, str] = getattr(
 
 
 # Name of the header value to use based on CSP_REPORT_ONLY
-CSP_RESPONSE_HEADER = {
+RESPONSE_HEADERS = {
     True: "Content-Security-Policy-Report-Only",
     False: "Content-Security-Policy",
-}[CSP_REPORT_ONLY]
+}
+CSP_RESPONSE_HEADER: str
+_LOADERS["CSP_RESPONSE_HEADER"] = lambda: RESPONSE_HEADERS[
+    __getattr__("CSP_REPORT_ONLY")
+]
+
+
+# If True then CSP_ENABLED, CSP_REPORT_ONLY, CSP_REPORT_SAMPLING and
+# CSP_REPORT_THROTTLING can be overridden at runtime from the admin (the
+# CspConfig model).
+CSP_RUNTIME_CONFIG: bool
+_lazy("CSP_RUNTIME_CONFIG", False, bool)
+
+# Max number of seconds before a process picks up a runtime config change
+CSP_RUNTIME_CONFIG_INTERVAL: float
+_lazy("CSP_RUNTIME_CONFIG_INTERVAL", 5.0, float)
+
+
+# Circuit breakers around the policy cache / database reads, and report
+# saves - the number of consecutive failed (or slow) calls that opens
+# the circuit (0 to never open it), the number of seconds before it is
+# retried, and the number of seconds after which a call counts as failed.
+CSP_BREAKER_FAILURES: int
+_lazy("CSP_BREAKER_FAILURES", 5, int)
+
+CSP_BREAKER_RESET_TIMEOUT: float
+_lazy("CSP_BREAKER_RESET_TIMEOUT", 30.0, float)
+
+CSP_BREAKER_SLOW_CALL: float
+_lazy("CSP_BREAKER_SLOW_CALL", 1.0, float)
 
 
 # cache timeout in seconds - defaults to one hour
-CSP_CACHE_TIMEOUT = int(getattr(settings, "CSP_CACHE_TIMEOUT", 3600))
+CSP_CACHE_TIMEOUT: int
+_lazy("CSP_CACHE_TIMEOUT", 3600, int)
 
 
-# default process_request func
-def _process_request(request: HttpRequest) -> bool:
-    return True
+# If True then the admin changelists for rules and reports avoid queries
+# that scale with the size of the table - the result count is estimated
+# (or capped at CSP_ADMIN_COUNT_LIMIT), pages are fetched using a cursor
+# rather than OFFSET, and search is a (case-sensitive) prefix match.
+CSP_ADMIN_SCALABLE: bool
+_lazy("CSP_ADMIN_SCALABLE", False, bool)
 
 
-# default process_response funct
-def _process_response(response: HttpResponse) -> bool:
-    return "text/html" in response.headers.get("content-type", "")
+# Max number of rows counted by the admin changelist in scalable mode.
+CSP_ADMIN_COUNT_LIMIT: int
+_lazy("CSP_ADMIN_COUNT_LIMIT", 10000, int)
 
 
-# True if the request should have the header; defaults to HTML pages only.
-process_request: Callable[[HttpRequest], bool] = getattr(
-    settings, "CSP_FILTER_REQUEST_FUNC", _process_request
-)
+# If True then sources and directives that are made redundant by other
+# sources / directives (per the CSP source-matching rules) are removed
+# when the policy is built, to reduce the size of the header.
+CSP_MINIMIZE_POLICY: bool
+_lazy("CSP_MINIMIZE_POLICY", False, bool)
 
 
-process_response: Callable[[HttpResponse], bool] = getattr(
-    settings, "CSP_FILTER_RESPONSE_FUNC", _process_response
-)
+# If True then rules with a `host` only apply to requests for that host -
+# each host with rules of its own gets a separately cached policy (the
+# global rules plus its own). If False the host is ignored, and all rules
+# apply to all requests.
+CSP_HOST_POLICIES: bool
+_lazy("CSP_HOST_POLICIES", False, bool)
+
+
+# If True then the cached CSP and blacklist are built on startup (if they
+# are missing, or stale), rather than being cleared - so that workers
+# booting after the first find a hot cache. NB this queries the database
+# from AppConfig.ready().
+CSP_WARM_CACHE_ON_STARTUP: bool
+_lazy("CSP_WARM_CACHE_ON_STARTUP", False, bool)
+
+
+# Path to a compiled policy file (see the compile_csp command). If set
+# then the CSP is served from this file, which is held in memory and
+# reloaded when it changes, rather than from the cache / database.
+CSP_POLICY_FILE: str | None
+_lazy("CSP_POLICY_FILE", None)
+
+
+# Min number of seconds between checks for changes to CSP_POLICY_FILE.
+CSP_POLICY_FILE_CHECK_INTERVAL: float
+_lazy("CSP_POLICY_FILE_CHECK_INTERVAL", 5.0, float)
+
+
+# Optional callables that take the request / response and return False
+# if the response should not get the header. These are run on every
+# response, after the (cheaper) include / exclude settings below.
+process_request: Callable[[HttpRequest], bool] | None
+_lazy("process_request", None, setting="CSP_FILTER_REQUEST_FUNC")
+
+
+process_response: Callable[[HttpResponse], bool] | None
+_lazy("process_response", None, setting="CSP_FILTER_RESPONSE_FUNC")
+
+
+# Media types of responses that get the header. None (the default) means
+# HTML only - unless CSP_FILTER_RESPONSE_FUNC is set, in which case the
+# function decides (as it did before this setting was added).
+CSP_INCLUDE_CONTENT_TYPES: list[str] | None
+_lazy("CSP_INCLUDE_CONTENT_TYPES", None)
+
+
+# If set, only requests with a path starting with one of these prefixes
+# get the header.
+CSP_INCLUDE_PATHS: list[str] | None
+_lazy("CSP_INCLUDE_PATHS", None)
+
+
+# Requests with a path starting with one of these prefixes do not get the
+# header - e.g. ["/api/", "/static/", "/health/"].
+CSP_EXCLUDE_PATHS: list[str]
+_lazy("CSP_EXCLUDE_PATHS", [], list)
+
+
+# Requests that resolve to one of these url names (including namespace,
+# e.g. "admin:index") do not get the header.
+CSP_EXCLUDE_URL_NAMES: list[str]
+_lazy("CSP_EXCLUDE_URL_NAMES", [], list)
+
+
+# If set, only responses with one of these status codes get the header.
+CSP_INCLUDE_STATUS_CODES: list[int] | None
+_lazy("CSP_INCLUDE_STATUS_CODES", None)
+
+
+# If True then streaming responses do not get the header.
+CSP_EXCLUDE_STREAMING_RESPONSES: bool
+_lazy("CSP_EXCLUDE_STREAMING_RESPONSES", False, bool)
 
 
 # Default rules from https://content-security-policy.com/
@@ -1,14 +1,35 @@
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from .blacklist import clear_cache as clear_blacklist_cache
-from .models import CspReportBlacklist, CspRule
-from .policy import clear_cache as clear_policy_cache
+from .blacklist import blacklist_changed
+from .models import CspConfig, CspReportBlacklist, CspRule
+from .policy import rules_changed
+from .runtime import publish_config
+
+
+@receiver(pre_save, sender=CspRule, dispatch_uid="record_previous_host")
+def record_previous_host(
+    sender: type[CspRule], instance: CspRule, **kwargs: object
+) -> None:
+    # a rule moved to another host must be cleared from the old host too
+    previous = None
+    if instance.pk:
+        previous = (
+            CspRule.objects.filter(pk=instance.pk)
+            .values_list("host", flat=True)
+            .first()
+        )
+    instance._previous_host = previous
 
 
 @receiver([post_save, post_delete], sender=CspRule, dispatch_uid="clear_policy_cache")
-def clear_cache_1(sender: type[CspRule], **kwargs: object) -> None:
-    clear_policy_cache()
+def clear_cache_1(sender: type[CspRule], instance: CspRule, **kwargs: object) -> None:
+    # a rule for a single host only affects that host's policy
+    previous = instance.__dict__.pop("_previous_host", None)
+    if previous is None:
+        rules_changed(instance.host)
+    else:
+        rules_changed(instance.host, previous)
 
 
 @receiver(
@@ -17,4 +38,11 @@ def clear_cache_1(sender: type[CspRule], **kwargs: object) -> None:
     dispatch_uid="clear_blacklist_cache",
 )
 def clear_clear_cache_2(sender: type[CspReportBlacklist], **kwargs: object) -> None:
-    clear_blacklist_cache()
+    blacklist_changed()
+
+
+@receiver(
+    [post_save, post_delete], sender=CspConfig, dispatch_uid="publish_runtime_config"
+)
+def publish_runtime_config(sender: type[CspConfig], **kwargs: object) -> None:
+    publish_config()
@@ -1,10 +1,12 @@
 from django.urls import path
 
-from .views import csp_diagnostics, report_uri
+from .views import csp_diagnostics, csp_export, csp_summary, report_uri
 
 app_name = "csp"
 
 urlpatterns = [
     path("report-uri/", report_uri, name="report_uri"),
     path("diagnostics/", csp_diagnostics, name="csp_diagnostics"),
+    path("summary/", csp_summary, name="csp_summary"),
+    path("export/<str:name>.<str:fmt>", csp_export, name="csp_export"),
 ]
@@ -24,3 +24,48 @@ def strip_path(url: str) -> str:
     if scheme and not netloc:
         return url
     return urlunparse((scheme, netloc, "", "", "", ""))
+
+
+# second-level labels under which domains are registered in some ccTLDs
+# (e.g. example.co.uk) - this is a heuristic, not the public suffix list.
+COMMON_SECOND_LEVEL_LABELS = frozenset(
+    ["ac", "co", "com", "edu", "gov", "ltd", "net", "org", "plc", "sch"]
+)
+
+
+def registrable_domain(host: str) -> str:
+    """Return the (approximate) registrable domain for a host."""
+    labels = host.split(".")
+    if len(labels) <= 2:
+        return host
+    size = 2
+    if len(labels[-1]) == 2 and labels[-2] in COMMON_SECOND_LEVEL_LABELS:
+        size = 3
+    return ".".join(labels[-size:])
+
+
+def strip_filename(url: str) -> str:
+    """Strip the last path segment, query, fragment from a url."""
+    scheme, netloc, path, _, _, _ = urlparse(url)
+    if not (scheme and netloc) or not path:
+        return url
+    return urlunparse((scheme, netloc, path.rsplit("/", 1)[0] + "/", "", "", ""))
+
+
+def strip_subdomain(url: str) -> str:
+    """Strip the path etc. and replace subdomains with a wildcard."""
+    parsed = urlparse(url)
+    try:
+        host, port = parsed.hostname, parsed.port
+    except ValueError:
+        return url
+    if not (parsed.scheme and host):
+        return url
+    if ":" in host or host.replace(".", "").isdigit():
+        # IP address
+        return strip_path(url)
+    if (domain := registrable_domain(host)) != host:
+        domain = f"*.{domain}"
+    return urlunparse(
+        (parsed.scheme, f"{domain}:{port}" if port else domain, "", "", "", "")
+    )
@@ -1,62 +1,136 @@
+from __future__ import annotations
+
 import json
 import logging
 import random
-from typing import Callable, TypeAlias
+from datetime import timedelta
+from typing import TYPE_CHECKING, Callable, TypeAlias
 
 from django.contrib.auth.decorators import user_passes_test
-from django.db.utils import IntegrityError
-from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest
+from django.db.utils import DatabaseError, IntegrityError
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBadRequest,
+    StreamingHttpResponse,
+)
 from django.shortcuts import render
+from django.utils.timezone import now as tz_now
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from pydantic import ValidationError
 
+from .backends import get_report_backend
 from .blacklist import is_blacklisted
-from .models import CspReport, CspRule, ReportData
-from .policy import get_csp
+from .breaker import CircuitOpen, breaker_stats, report_breaker
+from .export import EXPORTS, FORMATS, export, parse_timestamp
+from .matcher import covered_report_count, is_allowed_by_policy, record_covered_report
+from .minimize import minimize_policy
+from .models import CspReport, CspReportSummary, CspRule
+from .normalization import normalize_uri
+from .policy import build_policy, get_csp, split_policy
+from .records import InvalidReport, records_from_payload
+from .report_queue import get_report_queue, queue_stats
+from .runtime import get_runtime_setting, runtime_overrides
+from .sampling import get_sampler, record_report
 from .settings import (
+    CSP_MINIMIZE_POLICY,
+    CSP_REPORT_ASYNC,
     CSP_REPORT_DIRECTIVE_DOWNGRADE,
+    CSP_REPORT_DROP_ALLOWED,
     CSP_REPORT_THROTTLING,
+    PolicyType,
     get_default_rules,
 )
 
+if TYPE_CHECKING:
+    from .records import ReportType
+
 logger = logging.getLogger(__name__)
 
 SimpleViewType: TypeAlias = Callable[[HttpRequest], HttpResponse]
 
+# number of rows in each section of the summary view
+SUMMARY_TOP_N = 20
+
 
 def throttle_view(func: SimpleViewType) -> SimpleViewType:
     def wrapper(request: HttpRequest) -> HttpResponse:
         # CSP_REPORT_THROTTLING is a float 0..1 - if we're below the value,
         # then respond immediately without attempting to process the
         # payload.
-        if random.random() < CSP_REPORT_THROTTLING:  # noqa: S311
+        throttling = get_runtime_setting("CSP_REPORT_THROTTLING", CSP_REPORT_THROTTLING)
+        if random.random() < throttling:  # noqa: S311
             return HttpResponse()
         return func(request)
 
     return wrapper
 
 
-def _validation_error(ex: ValidationError) -> str:
+def filter_report(report: ReportType) -> bool:
     """
-    Parse Pydantic error into output message.
-
-    This message goes back to the requestor, so we don't want the
-    full Pydantic error - just the list of invalid fields.
+    Return True if a valid report should be stored.
 
-    See https://docs.pydantic.dev/usage/models/#error-handling
+    This normalizes the report's blocked_uri in place. It is also used by
+    the `ingest_csp_reports` command, so that reports read from log files
+    are filtered in the same way as those sent to `report_uri`.
 
     """
-    try:
-        return ", ".join([str(e["loc"][0]) for e in ex.errors()])
-    except (IndexError, KeyError):
-        logger.exception("Unparseable Pydantic error: %s", ex.json())
-        return "unknown error"
+    if CSP_REPORT_DROP_ALLOWED and is_allowed_by_policy(report):
+        # checked before normalization, as that may widen the blocked_uri
+        logger.debug("Ignoring CSP report for a source allowed by the policy")
+        record_covered_report()
+        return False
+    # checked against the raw blocked_uri first, as normalization may strip
+    # the path that a more specific blacklist entry matches on, and then
+    # against the normalized blocked_uri, for entries in that form.
+    if is_blacklisted(report):
+        logger.debug("Ignoring blacklisted CSP report")
+        return False
+    blocked_uri = report.blocked_uri
+    report.blocked_uri = normalize_uri(str(report.effective_directive), blocked_uri)
+    if report.blocked_uri != blocked_uri and is_blacklisted(report):
+        logger.debug("Ignoring blacklisted CSP report")
+        return False
+    return True
+
+
+def _process_report(report: ReportType) -> HttpResponse:
+    """Filter and store a valid report, returning the view response."""
+    if not filter_report(report):
+        return HttpResponse()
+    if get_sampler():
+        # feed the accepted report rate back to the adaptive sampler
+        record_report()
+    if CSP_REPORT_ASYNC:
+        # hand off to the background workers and return immediately
+        get_report_queue().put(report)
+        return HttpResponse(status=204)
+    get_report_backend().save_report(report)
+    return HttpResponse(status=201, content_type="application/json")
+
+
+def breaker_view(func: SimpleViewType) -> SimpleViewType:
+    def wrapper(request: HttpRequest) -> HttpResponse:
+        # while the report circuit breaker is open (the database is
+        # failing) respond immediately, rather than add to the load.
+        if report_breaker.is_open:
+            return HttpResponse(status=204)
+        try:
+            return func(request)
+        except CircuitOpen:
+            return HttpResponse(status=204)
+        except DatabaseError:
+            # counted by the circuit breaker, which opens if it persists
+            logger.exception("Database error saving CspReport")
+            return HttpResponse(status=204)
+
+    return wrapper
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
 @throttle_view
+@breaker_view
 def report_uri(request: HttpRequest) -> HttpResponse:
     # {
     #     'csp-report': {
@@ -73,6 +147,8 @@ def report_uri(request: HttpRequest) -> HttpResponse:
     #         'script-sample': ''
     #     }
     # }
+    # the compact ReportRecord (rather than the pydantic ReportData) is
+    # used here, as this is the hot path under a flood of reports.
     request_body = request.body.decode()
     user_agent = request.headers.get("User-Agent", "missing User-Agent")
 
@@ -84,23 +160,32 @@ def report_uri(request: HttpRequest) -> HttpResponse:
 
     try:
         data = json.loads(request_body)
-        report = ReportData(**data["csp-report"])
-        if is_blacklisted(report):
-            logger.debug("Ignoring blacklisted CSP report")
-            return HttpResponse()
-        CspReport.objects.save_report(report)
+        reports = records_from_payload(data)
+        response = HttpResponse()
+        for report in reports:
+            response = report_breaker.call(_process_report, report)
+        return response
     except json.decoder.JSONDecodeError:
         return _bad_request("Invalid CSP report - must contain valid JSON.")
-    except KeyError:
+    except (KeyError, TypeError):
         return _bad_request("Invalid CSP report - must contain 'csp-report'")
-    except ValidationError as ex:
-        return _bad_request(
-            f"Invalid CSP report - report data is invalid: {_validation_error(ex)}"
-        )
+    except InvalidReport as ex:
+        return _bad_request(f"Invalid CSP report - report data is invalid: {ex}")
     except (IntegrityError, CspReport.DoesNotExist, CspReport.MultipleObjectsReturned):
         logger.exception("Error saving CspReport")
         return HttpResponse()
-    return HttpResponse(status=201, content_type="application/json")
+
+
+def _policy_size(policy: PolicyType) -> dict[str, int | bool]:
+    """Return the header size (bytes) of the policy, before / after minimizing."""
+    full = len("; ".join(split_policy(policy)).encode())
+    minimized = len("; ".join(split_policy(minimize_policy(policy))).encode())
+    return {
+        "full": full,
+        "minimized": minimized,
+        "saving": full - minimized,
+        "enabled": CSP_MINIMIZE_POLICY,
+    }
 
 
 @user_passes_test(lambda user: user.is_staff)
@@ -109,6 +194,8 @@ def csp_diagnostics(request: HttpRequest) -> HttpResponse:
     default_rules = get_default_rules()
     extra_rules = list(CspRule.objects.enabled().directive_values())
     csp_list = [x.strip() for x in get_csp(request, True).split(";")]
+    report_backend = get_report_backend()
+    sampler = get_sampler()
     return render(
         request,
         "csp/diagnostics.txt",
@@ -117,6 +204,68 @@ def csp_diagnostics(request: HttpRequest) -> HttpResponse:
             "extra_rules": extra_rules,
             "downgrades": CSP_REPORT_DIRECTIVE_DOWNGRADE,
             "csp": csp_list,
+            "policy_size": _policy_size(build_policy(minimize=False)),
+            "report_queue": queue_stats(),
+            "sampling_ratio": sampler.ratio() if sampler else None,
+            "drop_allowed": CSP_REPORT_DROP_ALLOWED,
+            "covered_reports": covered_report_count(),
+            "runtime_overrides": runtime_overrides(),
+            "breakers": breaker_stats(),
+            "report_backend": report_backend,
+            "report_counts": (report_backend.get_counts() or [])[:50],
         },
         content_type="text/plain",
     )
+
+
+@user_passes_test(lambda user: user.is_staff)
+@require_http_methods(["GET"])
+def csp_summary(request: HttpRequest) -> HttpResponse:
+    # everything here comes from the (small) summary table - see the
+    # CSP_REPORT_SUMMARY setting and the refresh_csp_summary command.
+    CspReportSummary.objects.flush()
+    summaries = CspReportSummary.objects.all()
+    directives = summaries.sources().order_by("directive").distinct()
+    # one (limited) query per directive - there are only a few dozen
+    top_sources = {
+        directive: list(
+            summaries.sources()
+            .filter(directive=directive)
+            .order_by("-request_count")[:SUMMARY_TOP_N]
+        )
+        for directive in directives.values_list("directive", flat=True)
+    }
+    new_sources = summaries.sources().filter(
+        first_seen_at__gte=tz_now() - timedelta(hours=24)
+    )
+    return render(
+        request,
+        "csp/summary.txt",
+        {
+            "top_sources": top_sources,
+            "top_documents": summaries.documents()[:SUMMARY_TOP_N],
+            "new_sources": new_sources.order_by("-request_count")[:SUMMARY_TOP_N],
+        },
+        content_type="text/plain",
+    )
+
+
+@user_passes_test(lambda user: user.is_staff)
+@require_http_methods(["GET"])
+def csp_export(request: HttpRequest, name: str, fmt: str) -> HttpResponse:
+    """Stream reports / rules as CSV or JSONL (constant memory)."""
+    if name not in EXPORTS or fmt not in FORMATS:
+        return HttpResponseBadRequest("Invalid export")
+    try:
+        filters = {
+            "directive": request.GET.get("directive"),
+            "since": parse_timestamp(s) if (s := request.GET.get("since")) else None,
+            "until": parse_timestamp(u) if (u := request.GET.get("until")) else None,
+        }
+    except ValueError as ex:
+        return HttpResponseBadRequest(str(ex))
+    response = StreamingHttpResponse(
+        export(name, fmt, **filters), content_type=FORMATS[fmt]
+    )
+    response["Content-Disposition"] = f'attachment; filename="csp-{name}.{fmt}"'
+    return response
@@ -4,7 +4,11 @@ DEBUG = True
 TEMPLATE_DEBUG = True
 USE_TZ = True
 
-DATABASES = {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": "test.db"}}
+DATABASES = {
+    "default": {"ENGINE": "django.db.backends.sqlite3", "NAME": "test.db"},
+    # used to test CSP_REPORT_DATABASE / CSP_RULES_READ_DATABASE
+    "reports": {"ENGINE": "django.db.backends.sqlite3", "NAME": "test_reports.db"},
+}
 
 INSTALLED_APPS = (
     "django.contrib.admin",
@@ -23,7 +27,8 @@ MIDDLEWARE = [
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
-    "csp.middleware.CSPMiddleware",
+    "csp.middleware.CspNonceMiddleware",
+    "csp.middleware.CspHeaderMiddleware",
 ]
 
 PROJECT_DIR = path.abspath(path.join(path.dirname(__file__)))
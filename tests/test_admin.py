@@ -0,0 +1,163 @@
+from datetime import timedelta
+from typing import Iterator
+from unittest import mock
+
+import pytest
+from django.contrib.admin.views.main import ChangeList
+from django.test import Client
+from django.urls import reverse
+from django.utils.timezone import now as tz_now
+
+from csp.admin import CspReportAdmin
+from csp.models import (
+    CspConfig,
+    CspPolicySnapshot,
+    CspReport,
+    CspReportCounterShard,
+)
+from csp.pagination import EstimatedCountPaginator, KeysetChangeList
+
+URL = reverse("admin:csp_cspreport_changelist")
+
+
+@pytest.fixture
+def reports() -> list[CspReport]:
+    now = tz_now()
+    return [
+        CspReport.objects.create(
+            effective_directive="img-src",
+            blocked_uri=f"https://{i}.example.com",
+            request_count=i,
+            last_updated_at=now - timedelta(minutes=i),
+        )
+        for i in range(5)
+    ]
+
+
+@pytest.fixture
+def scalable() -> Iterator[None]:
+    with mock.patch("csp.admin.CSP_ADMIN_SCALABLE", True), mock.patch.object(
+        CspReportAdmin, "list_per_page", 2
+    ):
+        yield
+
+
+@pytest.mark.django_db
+def test_estimated_count_paginator(reports: list[CspReport]) -> None:
+    paginator = EstimatedCountPaginator(
+        CspReport.objects.all(), per_page=2, count_limit=3
+    )
+    assert paginator.count == 3
+    assert paginator.is_capped
+    assert not paginator.is_estimate
+
+
+@pytest.mark.django_db
+def test_changelist_default(admin_client: Client, reports: list[CspReport]) -> None:
+    response = admin_client.get(URL)
+    cl = response.context["cl"]
+    assert type(cl) is ChangeList
+    assert cl.full_result_count == 5
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("scalable")
+def test_changelist_keyset(admin_client: Client, reports: list[CspReport]) -> None:
+    pages = []
+    query: str | None = ""
+    while query is not None:
+        cl = admin_client.get(URL + query).context["cl"]
+        assert isinstance(cl, KeysetChangeList)
+        assert cl.full_result_count is None
+        pages.append([r.request_count for r in cl.result_list])
+        query = cl.next_page_url
+    # ordered by last_updated_at desc
+    assert pages == [[0, 1], [2, 3], [4]]
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("scalable")
+def test_changelist_keyset_order_by_count(
+    admin_client: Client, reports: list[CspReport]
+) -> None:
+    # order by request_count (3rd column) ascending
+    response = admin_client.get(URL, {"o": "3"})
+    cl = response.context["cl"]
+    assert cl.keyset_field == "request_count"
+    assert [r.request_count for r in cl.result_list] == [0, 1]
+    response = admin_client.get(URL + cl.next_page_url)
+    assert [r.request_count for r in response.context["cl"].result_list] == [2, 3]
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("scalable")
+def test_changelist_invalid_cursor(
+    admin_client: Client, reports: list[CspReport]
+) -> None:
+    response = admin_client.get(URL, {"cursor": "foo|bar"})
+    assert response.status_code == 302
+    assert response.url.endswith("?e=1")
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("scalable")
+def test_changelist_prefix_search(
+    admin_client: Client, reports: list[CspReport]
+) -> None:
+    response = admin_client.get(URL, {"q": "https://3."})
+    assert [r.request_count for r in response.context["cl"].result_list] == [3]
+
+
+@pytest.mark.django_db
+def test_changelist_counter_shards(
+    admin_client: Client, reports: list[CspReport]
+) -> None:
+    CspReportCounterShard.objects.create(report=reports[1], shard=0, count=5)
+    CspReportCounterShard.objects.create(report=reports[1], shard=1, count=10)
+    response = admin_client.get(URL)
+    totals = {r.pk: r.total_count for r in response.context["cl"].result_list}
+    assert totals[reports[1].pk] == 16
+    assert totals[reports[2].pk] == 2
+
+
+@pytest.mark.django_db
+def test_config_single_row(admin_client: Client) -> None:
+    url = reverse("admin:csp_cspconfig_add")
+    assert admin_client.get(url).status_code == 200
+    CspConfig.objects.create(report_throttling=0.5)
+    assert admin_client.get(url).status_code == 403
+
+
+@pytest.mark.django_db
+def test_snapshot_restore(admin_client: Client) -> None:
+    snapshots = [
+        CspPolicySnapshot.objects.publish({"": [f"img-src {v}", ""]}, "x")
+        for v in ("'self'", "'none'")
+    ]
+    response = admin_client.get(
+        reverse("admin:csp_csppolicysnapshot_change", args=[snapshots[1].pk])
+    )
+    assert "+    &quot;img-src &#x27;none&#x27;&quot;" in response.content.decode()
+    response = admin_client.post(
+        reverse("admin:csp_csppolicysnapshot_changelist"),
+        {"action": "restore_snapshot", "_selected_action": [snapshots[0].pk]},
+    )
+    assert response.status_code == 302
+    latest = CspPolicySnapshot.objects.latest_snapshot()
+    assert latest and latest.version == 3
+    assert latest.policies == snapshots[0].policies
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "scalable,date_hierarchy", [(False, None), (True, "last_updated_at")]
+)
+def test_changelist_date_hierarchy(
+    admin_client: Client,
+    reports: list[CspReport],
+    scalable: bool,
+    date_hierarchy: str | None,
+) -> None:
+    with mock.patch("csp.admin.CSP_ADMIN_SCALABLE", scalable):
+        cl = admin_client.get(URL).context["cl"]
+    assert cl.date_hierarchy == date_hierarchy
@@ -0,0 +1,52 @@
+from unittest import mock
+
+import pytest
+from django.apps import apps
+from django.core.cache import cache
+from django.db.utils import DatabaseError
+
+from csp.policy import (
+    CACHE_KEY_FINGERPRINT,
+    CACHE_KEY_RULES,
+    is_cache_valid,
+    warm_cache,
+)
+
+
+@pytest.mark.django_db
+class TestCSPTrackerConfig:
+    def setup_method(self) -> None:
+        cache.clear()
+
+    def reset(self, warm: bool) -> None:
+        with mock.patch("csp.settings.CSP_WARM_CACHE_ON_STARTUP", warm):
+            apps.get_app_config("csp").reset()
+
+    def test_reset_clears_cache(self) -> None:
+        warm_cache()
+        self.reset(warm=False)
+        assert CACHE_KEY_RULES not in cache
+
+    def test_reset_warms_cache(self) -> None:
+        self.reset(warm=True)
+        assert is_cache_valid()
+
+    def test_reset_keeps_valid_cache(self) -> None:
+        warm_cache()
+        with mock.patch("csp.policy.warm_cache") as mock_warm:
+            self.reset(warm=True)
+        mock_warm.assert_not_called()
+        assert is_cache_valid()
+
+    def test_reset_rebuilds_stale_cache(self) -> None:
+        warm_cache()
+        cache.set(CACHE_KEY_FINGERPRINT, "stale")
+        assert not is_cache_valid()
+        self.reset(warm=True)
+        assert is_cache_valid()
+
+    def test_reset_database_error(self) -> None:
+        cache.set(CACHE_KEY_RULES, ("stale", ""))
+        with mock.patch("csp.policy.warm_cache", side_effect=DatabaseError):
+            self.reset(warm=True)
+        assert CACHE_KEY_RULES not in cache
@@ -0,0 +1,206 @@
+from typing import Callable
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.db import DatabaseError
+
+from csp.backends import (
+    CacheReportBackend,
+    DatabaseReportBackend,
+    NoveltyReportBackend,
+    NullReportBackend,
+    SamplingReportBackend,
+    load_backend,
+    scale_count,
+)
+from csp.models import CspReport, ReportData
+from csp.novelty import build_known_filter
+
+REPORT_A = ReportData(effective_directive="img-src", blocked_uri="https://a.com")
+REPORT_B = ReportData(effective_directive="img-src", blocked_uri="https://b.com")
+
+
+def test_load_backend() -> None:
+    backend = load_backend("csp.backends.CacheReportBackend", {"timeout": 10})
+    assert isinstance(backend, CacheReportBackend)
+    assert backend.timeout == 10
+
+
+@pytest.mark.django_db
+class TestDatabaseReportBackend:
+    def test_save_reports(self) -> None:
+        backend = DatabaseReportBackend()
+        backend.save_report(REPORT_A)
+        backend.save_reports([REPORT_A, REPORT_B, REPORT_A])
+        assert CspReport.objects.get(blocked_uri="https://a.com").request_count == 3
+        assert CspReport.objects.get(blocked_uri="https://b.com").request_count == 1
+        assert backend.get_counts() is None
+
+
+class TestCacheReportBackend:
+    def setup_method(self) -> None:
+        cache.clear()
+
+    def test_save_reports(self) -> None:
+        backend = CacheReportBackend()
+        backend.save_report(REPORT_A)
+        backend.save_report(REPORT_B)
+        backend.save_reports([REPORT_A, REPORT_A])
+        assert backend.get_counts() == [
+            ("img-src", "https://a.com", 3),
+            ("img-src", "https://b.com", 1),
+        ]
+
+    def test_expired_counter(self) -> None:
+        backend = CacheReportBackend()
+        backend.save_report(REPORT_A)
+        cache.delete(backend.make_key("img-src", "https://a.com"))
+        assert backend.get_counts() == []
+        backend.save_report(REPORT_A)
+        assert backend.get_counts() == [("img-src", "https://a.com", 1)]
+
+    def test_clear(self) -> None:
+        backend = CacheReportBackend()
+        backend.save_report(REPORT_A)
+        backend.clear()
+        assert backend.get_counts() == []
+
+
+@pytest.mark.django_db
+def test_null_backend() -> None:
+    backend = NullReportBackend()
+    backend.save_report(REPORT_A)
+    backend.save_reports([REPORT_A, REPORT_B])
+    assert not CspReport.objects.exists()
+
+
+@pytest.mark.parametrize(
+    "count,rate,sample,scaled",
+    [
+        (1, 0.25, 0.9, 4),
+        (2, 0.25, 0.9, 8),
+        # 1 / 0.6 = 1.67 - rounded up two thirds of the time
+        (1, 0.6, 0.5, 2),
+        (1, 0.6, 0.7, 1),
+        # 1 / 0.75 = 1.33 - rounded up a third of the time
+        (1, 0.75, 0.3, 2),
+        (1, 0.75, 0.4, 1),
+    ],
+)
+def test_scale_count(count: int, rate: float, sample: float, scaled: int) -> None:
+    with mock.patch("csp.backends.random.random", return_value=sample):
+        assert scale_count(count, rate) == scaled
+
+
+class TestSamplingReportBackend:
+    def get_backend(self) -> SamplingReportBackend:
+        return SamplingReportBackend(
+            rate=0.25, backend="csp.backends.NullReportBackend"
+        )
+
+    @pytest.mark.parametrize("sample,saved", [(0.1, True), (0.5, False)])
+    def test_save_report(self, sample: float, saved: bool) -> None:
+        backend = self.get_backend()
+        with mock.patch("csp.backends.random.random", return_value=sample):
+            with mock.patch.object(backend.backend, "save_report") as mock_save:
+                backend.save_report(REPORT_A)
+        if saved:
+            mock_save.assert_called_once_with(REPORT_A, count=4)
+        else:
+            mock_save.assert_not_called()
+
+    def test_save_reports(self) -> None:
+        backend = self.get_backend()
+        with mock.patch("csp.backends.random.random", return_value=0.1):
+            with mock.patch.object(backend.backend, "save_report") as mock_save:
+                backend.save_reports([REPORT_A, REPORT_A])
+        # duplicates are collapsed, then scaled up
+        mock_save.assert_called_once_with(REPORT_A, count=8)
+
+    def test_zero_rate(self) -> None:
+        backend = SamplingReportBackend(rate=0)
+        with mock.patch.object(backend.backend, "save_report") as mock_save:
+            backend.save_report(REPORT_A)
+        mock_save.assert_not_called()
+
+
+@pytest.mark.django_db
+class TestNoveltyReportBackend:
+    def get_backend(self) -> NoveltyReportBackend:
+        cache.clear()
+        backend = NoveltyReportBackend(rate=0.25)
+        backend.build()
+        return backend
+
+    def test_save_report(self) -> None:
+        CspReport.objects.create(
+            effective_directive="img-src", blocked_uri="https://a.com", request_count=1
+        )
+        backend = self.get_backend()
+        # known pair - sampled, and scaled up
+        with mock.patch("csp.backends.random.random", return_value=0.5):
+            backend.save_report(REPORT_A)
+        assert CspReport.objects.get(blocked_uri="https://a.com").request_count == 1
+        with mock.patch("csp.backends.random.random", return_value=0.1):
+            backend.save_report(REPORT_A)
+        assert CspReport.objects.get(blocked_uri="https://a.com").request_count == 5
+        # new pair - always stored, and then known
+        with mock.patch("csp.backends.random.random", return_value=0.5):
+            backend.save_report(REPORT_B)
+            backend.save_report(REPORT_B)
+        assert CspReport.objects.get(blocked_uri="https://b.com").request_count == 1
+
+    def test_false_positive(self) -> None:
+        backend = self.get_backend()
+        assert backend.known is not None
+        # a new pair that the filter (wrongly) says is known is still stored
+        backend.known.add("img-src https://b.com")
+        with mock.patch("csp.backends.random.random", return_value=0.5):
+            backend.save_report(REPORT_B)
+        assert CspReport.objects.get(blocked_uri="https://b.com").request_count == 1
+        # confirmed known pairs are cached - no further database reads
+        assert backend.is_known(REPORT_B, "img-src https://b.com")
+        with mock.patch("csp.backends.CspReport.objects.filter") as mock_filter:
+            assert backend.is_known(REPORT_B, "img-src https://b.com")
+        mock_filter.assert_not_called()
+
+    def test_not_built(self) -> None:
+        cache.clear()
+        backend = NoveltyReportBackend(rate=0.25)
+        # until the filter is built every report is stored
+        with mock.patch("csp.backends.threading.Thread") as mock_thread:
+            with mock.patch("csp.backends.random.random", return_value=0.5):
+                backend.save_report(REPORT_A)
+                backend.save_report(REPORT_A)
+        mock_thread.return_value.start.assert_called_once()
+        assert CspReport.objects.get(blocked_uri="https://a.com").request_count == 2
+
+    def test_refresh(self) -> None:
+        backend = NoveltyReportBackend(rate=0.25)
+
+        def run_now(target: Callable[[], None], **kwargs: object) -> mock.Mock:
+            return mock.Mock(start=target)
+
+        with mock.patch(
+            "csp.backends.threading.Thread", side_effect=run_now
+        ), mock.patch("csp.backends.connections") as mock_connections:
+            with mock.patch(
+                "csp.backends.build_known_filter", wraps=build_known_filter
+            ) as mock_build:
+                assert backend.get_known() is not None
+                backend.get_known()
+                mock_build.assert_called_once()
+                backend.built_at -= backend.refresh + 1  # type: ignore[operator]
+                backend.get_known()
+        assert mock_build.call_count == 2
+        # the thread's connections are closed after each build
+        assert mock_connections.close_all.call_count == 2
+        assert not backend._lock.locked()
+
+    def test_build_error(self) -> None:
+        backend = NoveltyReportBackend(rate=0.25)
+        with mock.patch("csp.backends.build_known_filter", side_effect=DatabaseError):
+            backend.build()
+        assert backend.known is None
+        assert backend.built_at is not None
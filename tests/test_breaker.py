@@ -0,0 +1,163 @@
+from typing import Callable, Iterator
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.db.utils import IntegrityError, OperationalError
+from django.test import RequestFactory
+
+from csp.breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpen,
+    policy_breaker,
+    report_breaker,
+)
+from csp.models import CspRule
+from csp.policy import _last_known_good, get_resilient_csp
+from csp.views import report_uri
+
+
+def fail() -> None:
+    raise OperationalError("database is down")
+
+
+@pytest.fixture
+def breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        "test", failures=2, reset_timeout=30, slow_call=1, ignore=(IntegrityError,)
+    )
+
+
+@pytest.fixture(autouse=True)
+def reset_breakers() -> Iterator[None]:
+    yield
+    policy_breaker.reset()
+    report_breaker.reset()
+    _last_known_good.clear()
+
+
+class TestCircuitBreaker:
+    def test_open(self, breaker: CircuitBreaker) -> None:
+        assert breaker.call(lambda: 1) == 1
+        for _ in range(2):
+            with pytest.raises(OperationalError):
+                breaker.call(fail)
+        assert breaker.state == OPEN
+        assert breaker.is_open
+        with pytest.raises(CircuitOpen):
+            breaker.call(lambda: 1)
+        assert breaker.stats()["retry_in"] > 29
+
+    def test_success_resets_count(self, breaker: CircuitBreaker) -> None:
+        with pytest.raises(OperationalError):
+            breaker.call(fail)
+        breaker.call(lambda: 1)
+        with pytest.raises(OperationalError):
+            breaker.call(fail)
+        assert breaker.state == CLOSED
+
+    def test_ignored(self, breaker: CircuitBreaker) -> None:
+        for _ in range(2):
+            with pytest.raises(IntegrityError):
+                breaker.call(mock.Mock(side_effect=IntegrityError))
+        assert breaker.state == CLOSED
+
+    def test_slow_call(self, breaker: CircuitBreaker) -> None:
+        with mock.patch("csp.breaker.time.monotonic", side_effect=[0, 2, 2, 4, 4]):
+            assert breaker.call(lambda: 1) == 1
+            assert breaker.call(lambda: 2) == 2
+        assert breaker.state == OPEN
+
+    @pytest.mark.parametrize("trial,state", [(lambda: 1, CLOSED), (fail, OPEN)])
+    def test_half_open(
+        self, breaker: CircuitBreaker, trial: Callable[[], object], state: str
+    ) -> None:
+        breaker.failures = 1
+        with pytest.raises(OperationalError):
+            breaker.call(fail)
+        breaker.opened_at -= 30
+        assert not breaker.is_open
+
+        def call() -> None:
+            # only the trial call is let through
+            assert breaker.state == HALF_OPEN
+            assert breaker.is_open
+            with pytest.raises(CircuitOpen):
+                breaker.call(lambda: 1)
+            trial()
+
+        try:
+            breaker.call(call)
+        except OperationalError:
+            pass
+        assert breaker.state == state
+
+    def test_never_opens(self, breaker: CircuitBreaker) -> None:
+        breaker.failures = 0
+        for _ in range(5):
+            with pytest.raises(OperationalError):
+                breaker.call(fail)
+        assert breaker.state == CLOSED
+
+
+@pytest.mark.django_db
+class TestResilientCsp:
+    def test_last_known_good(self) -> None:
+        csp = get_resilient_csp()
+        with mock.patch("csp.policy._get_cached_csp", side_effect=fail):
+            assert get_resilient_csp() == csp
+            assert get_resilient_csp("example.com") == csp
+
+    @mock.patch("csp.policy.CSP_HOST_POLICIES", True)
+    def test_last_known_good_hosts(self) -> None:
+        cache.clear()
+        CspRule.objects.create(
+            directive="img-src", value="https://a.com", host="a.com", enabled=True
+        )
+        for host in ["a.com", "b.com", "c.com"]:
+            get_resilient_csp(host)
+        # hosts without rules of their own share the global policy
+        assert set(_last_known_good) == {"", "a.com"}
+        with mock.patch("csp.policy._get_cached_csp", side_effect=fail):
+            assert "https://a.com" in get_resilient_csp("a.com")[0]
+            assert "https://a.com" not in get_resilient_csp("d.com")[0]
+
+    def test_defaults(self) -> None:
+        with mock.patch("csp.policy._get_cached_csp", side_effect=fail) as mock_get:
+            for _ in range(10):
+                csp = get_resilient_csp()
+        assert "default-src" in csp[0]
+        # fail fast once the circuit is open
+        assert mock_get.call_count == 5
+        assert policy_breaker.state == OPEN
+
+
+@pytest.mark.django_db
+class TestReportUri:
+    def post(self, rf: RequestFactory) -> int:
+        request = rf.post(
+            "/",
+            data={
+                "csp-report": {
+                    "effective-directive": "img-src",
+                    "blocked-uri": "https://example.com",
+                }
+            },
+            content_type="application/json",
+        )
+        return report_uri(request).status_code
+
+    def test_fail_fast(self, rf: RequestFactory) -> None:
+        with mock.patch(
+            "csp.views.get_report_backend", side_effect=fail
+        ) as mock_backend:
+            assert [self.post(rf) for _ in range(10)] == [204] * 10
+        assert mock_backend.call_count == 5
+        assert report_breaker.state == OPEN
+
+    def test_ok(self, rf: RequestFactory) -> None:
+        assert self.post(rf) == 201
+        assert report_breaker.state == CLOSED
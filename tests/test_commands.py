@@ -0,0 +1,326 @@
+import csv
+import json
+from io import StringIO
+from pathlib import Path
+from typing import Iterator
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+
+from csp.loadtest import cleanup, legacy_payload, reporting_api_payload
+from csp.models import (
+    CspReport,
+    CspReportCounterShard,
+    CspReportSummary,
+    CspRule,
+    ReportData,
+)
+from csp.normalization import get_normalizer
+from csp.policy import is_cache_valid
+from csp.policy_file import read_policy_file
+
+
+@pytest.mark.django_db
+class TestWarmCspCache:
+    def test_warm_cache(self) -> None:
+        cache.clear()
+        out = StringIO()
+        call_command("warm_csp_cache", stdout=out)
+        assert is_cache_valid()
+        assert "blacklist (0 entries)" in out.getvalue()
+
+    def test_if_stale(self) -> None:
+        call_command("warm_csp_cache", stdout=StringIO())
+        out = StringIO()
+        with mock.patch("csp.management.commands.warm_csp_cache.warm_cache") as m:
+            call_command("warm_csp_cache", "--if-stale", stdout=out)
+        m.assert_not_called()
+        assert out.getvalue() == "CSP cache is valid - nothing to do.\n"
+
+
+@pytest.mark.django_db
+class TestCompileCsp:
+    def test_compile_csp(self, tmp_path: Path) -> None:
+        path = str(tmp_path / "csp.json")
+        out = StringIO()
+        call_command("compile_csp", path, stdout=out)
+        compiled = read_policy_file(path)
+        assert f"Compiled CSP version {compiled['version']}" in out.getvalue()
+
+    def test_no_path(self) -> None:
+        with pytest.raises(CommandError):
+            call_command("compile_csp")
+
+
+@pytest.mark.django_db
+class TestCompactCspReports:
+    def create_report(self, blocked_uri: str, count: int) -> CspReport:
+        return CspReport.objects.create(
+            effective_directive="img-src",
+            blocked_uri=blocked_uri,
+            request_count=count,
+        )
+
+    @pytest.fixture(autouse=True)
+    def normalization(self) -> Iterator[None]:
+        get_normalizer.cache_clear()
+        with mock.patch("csp.normalization.CSP_REPORT_NORMALIZATION", {"*": "origin"}):
+            yield
+        get_normalizer.cache_clear()
+
+    def test_compact(self) -> None:
+        self.create_report("https://example.com/a.png", 1)
+        self.create_report("https://example.com/b.png", 2)
+        self.create_report("https://example.com", 3)
+        self.create_report("https://other.com", 4)
+        out = StringIO()
+        call_command("compact_csp_reports", "--chunk-size=2", stdout=out)
+        assert out.getvalue() == "Merged 2 of 4 CspReport objects.\n"
+        assert list(CspReport.objects.values_list("blocked_uri", "request_count")) == [
+            ("https://example.com", 6),
+            ("https://other.com", 4),
+        ]
+
+    def test_dry_run(self) -> None:
+        self.create_report("https://example.com/a.png", 1)
+        out = StringIO()
+        call_command("compact_csp_reports", "--dry-run", stdout=out)
+        assert out.getvalue() == "[dry-run] Would merge 1 of 1 CspReport objects.\n"
+        assert CspReport.objects.get().blocked_uri == "https://example.com/a.png"
+
+
+@pytest.mark.django_db
+def test_compact_csp_counters() -> None:
+    report = CspReport.objects.create(
+        effective_directive="img-src", blocked_uri="https://a.com", request_count=1
+    )
+    CspReportCounterShard.objects.create(report=report, shard=0, count=2)
+    CspReportCounterShard.objects.create(report=report, shard=1, count=3)
+    out = StringIO()
+    call_command("compact_csp_counters", stdout=out)
+    assert out.getvalue() == "Folded 2 CSP report counter shards.\n"
+    report.refresh_from_db()
+    assert report.request_count == 6
+
+
+@pytest.mark.django_db
+def test_ingest_csp_reports(tmp_path: Path) -> None:
+    path = tmp_path / "reports.jsonl"
+    document_uri = "https://example.com/"
+    path.write_bytes(
+        b"\n".join(
+            [
+                legacy_payload("img-src", "https://a.com", document_uri),
+                reporting_api_payload("img-src", "https://a.com", document_uri),
+                b"{}",
+            ]
+        )
+    )
+    out = StringIO()
+    call_command("ingest_csp_reports", str(path), "--workers=0", stdout=out)
+    assert out.getvalue() == (
+        "Read 2 CSP reports (1 invalid lines), dropped 0, saved 1 violations.\n"
+    )
+    assert CspReport.objects.get().request_count == 2
+
+
+@pytest.mark.django_db
+def test_refresh_csp_summary() -> None:
+    CspReport.objects.create(effective_directive="img-src", blocked_uri="https://a.com")
+    out = StringIO()
+    call_command("refresh_csp_summary", stdout=out)
+    assert out.getvalue() == "Rebuilt CSP violation summary (1 rows).\n"
+
+
+@pytest.mark.django_db
+class TestExportCsp:
+    @pytest.fixture(autouse=True)
+    def reports(self) -> None:
+        for directive in ["img-src", "font-src", "img-src"]:
+            CspReport.objects.create(
+                effective_directive=directive,
+                blocked_uri=f"https://{CspReport.objects.count()}.com",
+                request_count=1,
+            )
+
+    def test_export_csv(self) -> None:
+        out = StringIO()
+        call_command(
+            "export_csp", "reports", "--directive=img-src", "--chunk-size=1", stdout=out
+        )
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        assert [r["blocked_uri"] for r in rows] == ["https://0.com", "https://2.com"]
+
+    def test_export_jsonl(self, tmp_path: Path) -> None:
+        path = tmp_path / "reports.jsonl"
+        call_command("export_csp", "reports", "--format=jsonl", f"--output={path}")
+        rows = [json.loads(line) for line in path.read_text().splitlines()]
+        assert len(rows) == 3
+        assert rows[0]["blocked_uri"] == "https://0.com"
+
+    def test_export_since(self) -> None:
+        out = StringIO()
+        call_command("export_csp", "rules", "--since=2099-01-01", stdout=out)
+        assert out.getvalue() == "directive,value,enabled,created_at,modified_at\r\n"
+
+    def test_invalid_since(self) -> None:
+        with pytest.raises(CommandError):
+            call_command("export_csp", "reports", "--since=yesterday")
+
+
+@pytest.mark.django_db
+class TestImportExportCspRules:
+    RULES = [
+        {"directive": "img-src", "value": "https://a.com?v=1", "enabled": True},
+        {"directive": "img-src", "value": "self"},
+        {"directive": "font-src", "value": "https://b.com", "enabled": False},
+    ]
+
+    def write_rules(self, path: Path, rules: list) -> str:
+        path.write_text(json.dumps(rules))
+        return str(path)
+
+    # the per-rule fallback is used before Django 4.1
+    @pytest.mark.parametrize("bulk_upsert", [True, False])
+    def test_import(self, tmp_path: Path, bulk_upsert: bool) -> None:
+        CspRule.objects.create(
+            directive="font-src", value="https://b.com", enabled=True
+        )
+        CspRule.objects.create(directive="img-src", value="'self'", enabled=True)
+        path = self.write_rules(tmp_path / "rules.json", self.RULES)
+        out = StringIO()
+        with mock.patch("csp.rules_file.BULK_UPSERT", bulk_upsert), mock.patch(
+            "csp.rules_file.rules_changed"
+        ) as mock_changed, mock.patch("csp.signals.rules_changed") as mock_saved:
+            call_command("import_csp_rules", path, stdout=out)
+        # the cache is cleared once - not once per rule
+        mock_changed.assert_called_once_with()
+        mock_saved.assert_not_called()
+        assert out.getvalue().splitlines() == [
+            "+ img-src https://a.com?v=1 (enabled=True)",
+            "~ font-src https://b.com (enabled=False)",
+            "Imported 1 new, 1 updated (1 unchanged) CSP rules.",
+        ]
+        # values are stored as imported, and matched on the normalized value
+        assert set(
+            CspRule.objects.values_list(
+                "directive", "value", "normalized_value", "enabled"
+            )
+        ) == {
+            ("img-src", "https://a.com?v=1", "https://a.com", True),
+            ("img-src", "'self'", "'self'", True),
+            ("font-src", "https://b.com", "https://b.com", False),
+        }
+
+    def test_export_import_roundtrip(self, tmp_path: Path) -> None:
+        for value in ["self", "https://a.com/?v=1", "'unsafe-inline'"]:
+            CspRule.objects.create(directive="script-src", value=value, enabled=True)
+        rules = set(CspRule.objects.values_list("directive", "value", "enabled"))
+        path = str(tmp_path / "rules.json")
+        call_command("export_csp_rules", path, stderr=StringIO())
+        out = StringIO()
+        call_command("import_csp_rules", path, stdout=out)
+        assert out.getvalue().splitlines() == [
+            "Imported 0 new, 0 updated (3 unchanged) CSP rules."
+        ]
+        assert set(CspRule.objects.values_list("directive", "value", "enabled")) == (
+            rules
+        )
+
+    def test_import_dry_run(self, tmp_path: Path) -> None:
+        path = self.write_rules(tmp_path / "rules.json", self.RULES)
+        out = StringIO()
+        call_command("import_csp_rules", path, "--dry-run", stdout=out)
+        assert out.getvalue().splitlines()[-1] == (
+            "[dry-run] Would import 3 new, 0 updated (0 unchanged) CSP rules."
+        )
+        assert not CspRule.objects.exists()
+
+    def test_import_invalid(self, tmp_path: Path) -> None:
+        path = self.write_rules(tmp_path / "rules.json", [{"directive": "foo"}])
+        with pytest.raises(CommandError):
+            call_command("import_csp_rules", path)
+
+    def test_export_yaml_roundtrip(self, tmp_path: Path) -> None:
+        CspRule.objects.create(directive="img-src", value="https://a.com", enabled=True)
+        CspRule.objects.create(
+            directive="img-src", value="https://a.com", host="a.example.com"
+        )
+        path = str(tmp_path / "rules.yaml")
+        call_command("export_csp_rules", path, stderr=StringIO())
+        CspRule.objects.all().delete()
+        call_command("import_csp_rules", path, stdout=StringIO())
+        assert set(CspRule.objects.values_list("value", "host", "enabled")) == {
+            ("https://a.com", "", True),
+            ("https://a.com", "a.example.com", False),
+        }
+
+
+@pytest.mark.django_db
+class TestCspLoadtest:
+    def test_loadtest(self) -> None:
+        out = StringIO()
+        call_command(
+            "csp_loadtest",
+            "--requests=50",
+            "--concurrency=1",
+            "--unique-ratio=0.2",
+            "--blacklisted-ratio=0.2",
+            "--invalid-ratio=0.2",
+            "--cleanup",
+            stdout=out,
+        )
+        output = out.getvalue()
+        assert "Requests         50\n" in output
+        # invalid, blacklisted and saved reports
+        assert "400: " in output
+        assert "200: " in output
+        assert "201: " in output
+        assert not CspReport.objects.exists()
+
+    @mock.patch("csp.models.CSP_REPORT_SUMMARY", True)
+    @mock.patch("csp.models.CSP_REPORT_COUNTER_SHARDS", 4)
+    def test_cleanup(self) -> None:
+        CspReportSummary.objects.flush()
+        for blocked_uri, document_uri in [
+            ("https://cdn-1.loadtest.invalid", "https://www.loadtest.invalid/"),
+            ("https://a.com", "https://example.com/"),
+        ]:
+            data = ReportData(
+                effective_directive="img-src",
+                blocked_uri=blocked_uri,
+                document_uri=document_uri,
+            )
+            CspReport.objects.save_reports([data])
+            CspReport.objects.save_reports([data])
+        queue = mock.Mock()
+        with mock.patch("csp.report_queue._queue", queue):
+            deleted = cleanup()
+        # queued reports, and buffered summary counts, are saved first
+        queue.join.assert_called_once()
+        assert deleted == {
+            "CspReportCounterShard": 1,
+            "CspReportSummary": 2,
+            "CspReport": 1,
+            "CspReportBlacklist": 0,
+        }
+        assert CspReport.objects.get().blocked_uri == "https://a.com"
+        assert CspReportCounterShard.objects.count() == 1
+        assert set(CspReportSummary.objects.values_list("uri", flat=True)) == {
+            "https://a.com",
+            "https://example.com/",
+        }
+
+    def test_replay(self, tmp_path: Path) -> None:
+        path = tmp_path / "reports.jsonl"
+        path.write_bytes(
+            legacy_payload("img-src", "https://a.com", "https://example.com")
+            + b"\n"
+            + reporting_api_payload("img-src", "https://a.com", "https://example.com")
+        )
+        out = StringIO()
+        call_command("csp_loadtest", f"--replay={path}", "--concurrency=1", stdout=out)
+        assert "Status codes     201: 2\n" in out.getvalue()
+        assert CspReport.objects.get().request_count == 2
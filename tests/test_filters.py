@@ -0,0 +1,101 @@
+from typing import Callable
+from unittest import mock
+
+import pytest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.test import RequestFactory
+from django.urls import resolve
+
+from csp.filters import HeaderFilter
+
+
+class TestHeaderFilter:
+    @pytest.mark.parametrize(
+        "response,result",
+        [
+            (HttpResponse(), True),
+            (HttpResponse(content_type="TEXT/HTML"), True),
+            (HttpResponse(content_type="text/plain"), False),
+            (HttpResponse(content_type="text/htmlx"), False),
+            (JsonResponse({}), False),
+        ],
+    )
+    def test_content_types(
+        self, rf: RequestFactory, response: HttpResponse, result: bool
+    ) -> None:
+        assert HeaderFilter()(rf.get("/"), response) == result
+
+    @pytest.mark.parametrize(
+        "path,result",
+        [
+            ("/", True),
+            ("/api", True),
+            ("/api/", False),
+            ("/api/v1/", False),
+            ("/static/css/main.css", False),
+        ],
+    )
+    def test_exclude_paths(self, rf: RequestFactory, path: str, result: bool) -> None:
+        header_filter = HeaderFilter(exclude_paths=["/api/", "/static/"])
+        assert header_filter(rf.get(path), HttpResponse()) == result
+
+    @pytest.mark.parametrize(
+        "path,result", [("/", False), ("/app/", True), ("/app/api/", False)]
+    )
+    def test_include_paths(self, rf: RequestFactory, path: str, result: bool) -> None:
+        header_filter = HeaderFilter(
+            include_paths=["/app/"], exclude_paths=["/app/api/"]
+        )
+        assert header_filter(rf.get(path), HttpResponse()) == result
+
+    def test_exclude_url_names(self, rf: RequestFactory) -> None:
+        request = rf.get("/csp/diagnostics/")
+        assert HeaderFilter()(request, HttpResponse())
+        request.resolver_match = resolve(request.path_info)
+        header_filter = HeaderFilter(exclude_url_names=["csp:csp_diagnostics"])
+        assert not header_filter(request, HttpResponse())
+
+    @pytest.mark.parametrize("status_code,result", [(200, True), (404, False)])
+    def test_status_codes(
+        self, rf: RequestFactory, status_code: int, result: bool
+    ) -> None:
+        header_filter = HeaderFilter(status_codes=[200])
+        response = HttpResponse(status=status_code)
+        assert header_filter(rf.get("/"), response) == result
+
+    def test_exclude_streaming(self, rf: RequestFactory) -> None:
+        response = StreamingHttpResponse(iter([b""]), content_type="text/html")
+        assert HeaderFilter()(rf.get("/"), response)
+        assert not HeaderFilter(exclude_streaming=True)(rf.get("/"), response)
+
+    def test_funcs(self, rf: RequestFactory) -> None:
+        request = rf.get("/")
+        response = HttpResponse()
+        assert not HeaderFilter(request_func=lambda r: False)(request, response)
+        assert not HeaderFilter(response_func=lambda r: False)(request, response)
+
+    @pytest.mark.parametrize(
+        "content_types,response_func,result",
+        [
+            # HTML only by default
+            (None, None, False),
+            # ... unless a response func is set, which decides
+            (None, lambda r: True, True),
+            (None, lambda r: False, False),
+            # an explicit setting always applies
+            (["application/json"], None, True),
+            (["text/html"], lambda r: True, False),
+        ],
+    )
+    def test_from_settings_content_types(
+        self,
+        rf: RequestFactory,
+        content_types: list[str] | None,
+        response_func: Callable[[HttpResponse], bool] | None,
+        result: bool,
+    ) -> None:
+        response = HttpResponse(content_type="application/json")
+        with mock.patch("csp.filters.CSP_INCLUDE_CONTENT_TYPES", content_types):
+            with mock.patch("csp.filters.process_response", response_func):
+                header_filter = HeaderFilter.from_settings()
+        assert header_filter(rf.get("/"), response) == result
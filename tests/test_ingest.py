@@ -0,0 +1,80 @@
+import gzip
+import json
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from csp.ingest import ingest_reports, parse_chunks, read_chunks
+from csp.models import CspReport, CspReportBlacklist
+from csp.normalization import get_normalizer
+from csp.records import parse_log_lines
+
+
+def legacy(blocked_uri: str, directive: str = "img-src") -> str:
+    report = {"effective-directive": directive, "blocked-uri": blocked_uri}
+    return json.dumps({"csp-report": report})
+
+
+def reporting_api(blocked_uri: str) -> str:
+    body = {"effectiveDirective": "img-src", "blockedURL": blocked_uri}
+    return json.dumps([{"type": "csp-violation", "body": body}])
+
+
+LINES = [
+    legacy("https://a.com/1.png?foo"),
+    "",
+    reporting_api("https://b.com/1.png"),
+    legacy("https://cdn.a.com/1.png", directive="font-src"),
+    "not json",
+    json.dumps({"csp-report": {"effective-directive": "img-src"}}),
+    legacy("https://a.com/1.png"),
+]
+
+
+def test_parse_log_lines() -> None:
+    records, invalid = parse_log_lines(LINES)
+    assert invalid == 2
+    assert [(r.effective_directive, r.blocked_uri) for r in records] == [
+        ("img-src", "https://a.com/1.png"),
+        ("img-src", "https://b.com/1.png"),
+        ("font-src", "https://cdn.a.com/1.png"),
+        ("img-src", "https://a.com/1.png"),
+    ]
+
+
+@pytest.mark.parametrize("gzipped", [True, False])
+def test_read_chunks(tmp_path: Path, gzipped: bool) -> None:
+    path = tmp_path / "reports.jsonl"
+    content = "\n".join(LINES).encode()
+    path.write_bytes(gzip.compress(content) if gzipped else content)
+    chunks = list(read_chunks([str(path), str(path)], chunk_size=5))
+    assert [len(c) for c in chunks] == [5, 5, 4]
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_parse_chunks(workers: int) -> None:
+    chunks = [LINES[:3], LINES[3:]]
+    parsed = list(parse_chunks(chunks, workers))
+    assert [(len(records), invalid) for records, invalid in parsed] == [(2, 0), (2, 2)]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("batch_size", [1, 500])
+def test_ingest_reports(tmp_path: Path, batch_size: int) -> None:
+    get_normalizer.cache_clear()
+    CspReportBlacklist.objects.create(directive="img-src", blocked_uri="https://b.com")
+    path = tmp_path / "reports.jsonl"
+    path.write_text("\n".join(LINES))
+    with mock.patch(
+        "csp.normalization.CSP_REPORT_NORMALIZATION", {"font-src": "domain"}
+    ):
+        stats = ingest_reports([str(path)], batch_size=batch_size)
+    assert (stats.reports, stats.invalid, stats.dropped) == (4, 2, 1)
+    assert stats.saved == (3 if batch_size == 1 else 2)
+    assert sorted(
+        CspReport.objects.values_list("effective_directive", "request_count")
+    ) == [("font-src", 1), ("img-src", 2)]
+    assert CspReport.objects.get(effective_directive="font-src").blocked_uri == (
+        "https://*.a.com"
+    )
@@ -0,0 +1,99 @@
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+
+from csp.matcher import (
+    PolicyMatcher,
+    compile_matcher,
+    covered_report_count,
+    is_allowed_by_policy,
+    parse_header,
+    record_covered_report,
+)
+from csp.records import ReportRecord
+
+DOCUMENT = "https://example.com/foo/"
+
+
+def test_parse_header() -> None:
+    assert parse_header("default-src 'self';  img-src https: data:;") == {
+        "default-src": ["'self'"],
+        "img-src": ["https:", "data:"],
+    }
+
+
+@pytest.mark.parametrize(
+    "sources,blocked_uri,allowed",
+    [
+        (["'self'"], "https://example.com/img.png", True),
+        (["'self'"], "https://cdn.example.com/img.png", False),
+        (["https:"], "https://cdn.com/img.png", True),
+        (["http:"], "https://cdn.com/img.png", True),
+        (["https:"], "http://cdn.com/img.png", False),
+        (["*"], "https://cdn.com/img.png", True),
+        (["*"], "data", False),
+        (["data:"], "data", True),
+        (["cdn.com"], "https://cdn.com/img.png", True),
+        (["cdn.com"], "http://cdn.com/img.png", False),
+        (["cdn.com"], "https://www.cdn.com/img.png", False),
+        (["*.cdn.com"], "https://a.b.cdn.com/img.png", True),
+        (["*.cdn.com"], "https://cdn.com/img.png", False),
+        (["http://cdn.com"], "https://cdn.com/img.png", True),
+        (["https://cdn.com"], "https://cdn.com:8443/img.png", False),
+        (["https://cdn.com:*"], "https://cdn.com:8443/img.png", True),
+        (["https://cdn.com:8443"], "https://cdn.com:8443/img.png", True),
+        (["cdn.com/img/"], "https://cdn.com/img/1.png", True),
+        (["cdn.com/img/"], "https://cdn.com/1.png", False),
+        (["cdn.com/img.png"], "https://cdn.com/img.png", True),
+        (["cdn.com/img.png"], "https://cdn.com/img.png/x", False),
+        (["'unsafe-inline'"], "inline", True),
+        (["'unsafe-inline'", "'nonce-{nonce}'"], "inline", False),
+        (["'unsafe-eval'"], "eval", True),
+        (["'unsafe-inline'"], "eval", False),
+        (["'strict-dynamic'", "https:"], "https://cdn.com/a.js", False),
+    ],
+)
+def test_source_list(sources: list[str], blocked_uri: str, allowed: bool) -> None:
+    matcher = PolicyMatcher({"img-src": sources})
+    assert matcher.allows("img-src", blocked_uri, DOCUMENT) == allowed
+
+
+@pytest.mark.parametrize(
+    "directive,allowed",
+    [
+        ("img-src", True),
+        ("script-src-elem", True),
+        ("style-src", False),
+        ("frame-ancestors", False),
+    ],
+)
+def test_fallbacks(directive: str, allowed: bool) -> None:
+    matcher = PolicyMatcher(
+        {"default-src": ["cdn.com"], "style-src": ["'self'"], "img-src": ["cdn.com"]}
+    )
+    assert matcher.allows(directive, "https://cdn.com/a", DOCUMENT) == allowed
+
+
+@pytest.mark.django_db
+def test_is_allowed_by_policy() -> None:
+    compile_matcher.cache_clear()
+    report = ReportRecord("img-src", "https://cdn.com/1.png", DOCUMENT)
+    with mock.patch(
+        "csp.matcher.get_policy_header", return_value="img-src cdn.com"
+    ) as mock_header:
+        assert is_allowed_by_policy(report)
+    mock_header.assert_called_once_with("")
+    with mock.patch(
+        "csp.matcher.get_policy_header", return_value="img-src 'self'"
+    ), mock.patch("csp.matcher.CSP_HOST_POLICIES", True):
+        assert not is_allowed_by_policy(report)
+        assert compile_matcher.cache_info().currsize == 2
+
+
+def test_covered_report_count() -> None:
+    cache.clear()
+    assert covered_report_count() == 0
+    record_covered_report()
+    record_covered_report()
+    assert covered_report_count() == 2
@@ -1,9 +1,10 @@
 from unittest import mock
 
 import pytest
-from django.http import HttpResponse
+from django.http import HttpRequest, HttpResponse
 from django.test import RequestFactory
 
+from csp.decorators import csp_exempt
 from csp.middleware import CspHeaderMiddleware
 
 TEST_REPORT_TO = {
@@ -46,3 +47,18 @@ class TestCspHeaderMiddleware:
             response: HttpResponse = self.middleware()(request)
         assert response.has_header("Report-To") is False
         assert response.has_header("Reporting-Endpoints") == has_header
+
+    def test_csp_exempt(self, rf: RequestFactory) -> None:
+        @csp_exempt
+        def view(request: HttpRequest) -> HttpResponse:
+            return HttpResponse()
+
+        middleware = self.middleware()
+        request = rf.get("/")
+        middleware.process_view(request, view, (), {})
+        response = middleware(request)
+        assert not response.has_header("Content-Security-Policy-Report-Only")
+
+    def test_csp_header(self, rf: RequestFactory) -> None:
+        response = self.middleware()(rf.get("/"))
+        assert response.has_header("Content-Security-Policy-Report-Only")
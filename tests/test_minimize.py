@@ -0,0 +1,77 @@
+import pytest
+
+from csp.minimize import HostSource, minimize_policy, minimize_sources
+
+
+@pytest.mark.parametrize(
+    "source,other,covers",
+    [
+        ("https://*.example.com", "https://cdn.example.com", True),
+        ("https://*.example.com", "https://a.b.example.com/js/", True),
+        ("https://*.example.com", "https://example.com", False),
+        ("https://*.example.com", "http://cdn.example.com", False),
+        ("https://*.example.com", "cdn.example.com", False),
+        ("*.example.com", "https://cdn.example.com", False),
+        ("https://example.com", "https://example.com/js/", True),
+        ("https://example.com/js/", "https://example.com/js/app.js", False),
+        ("https://example.com", "https://example.com:8443", False),
+        ("https://example.com:*", "https://example.com:8443", True),
+        ("*", "https://example.com", True),
+        ("*", "example.com", True),
+        ("https://*", "https://example.com", True),
+    ],
+)
+def test_covers(source: str, other: str, covers: bool) -> None:
+    host, other_host = HostSource.parse(source), HostSource.parse(other)
+    assert host and other_host
+    assert host.covers(other_host) == covers
+
+
+@pytest.mark.parametrize(
+    "values,output",
+    [
+        (["'self'", "https://example.com"], ["'self'", "https://example.com"]),
+        (["https:", "https://example.com", "http://a.com"], ["https:", "http://a.com"]),
+        (
+            ["https://*.example.com", "https://cdn.example.com", "https://example.com"],
+            ["https://*.example.com", "https://example.com"],
+        ),
+        (
+            ["data:", "'unsafe-inline'", "{nonce}"],
+            ["data:", "'unsafe-inline'", "{nonce}"],
+        ),
+    ],
+)
+def test_minimize_sources(values: list[str], output: list[str]) -> None:
+    assert minimize_sources(values) == output
+
+
+def test_minimize_policy() -> None:
+    policy = {
+        "default-src": ["'self'"],
+        "img-src": ["'self'"],
+        "script-src": ["'self'", "https://*.example.com", "https://cdn.example.com"],
+        "script-src-elem": ["https://*.example.com", "'self'"],
+        "style-src": ["'self'", "'unsafe-inline'"],
+        "report-uri": ["{report_uri}"],
+    }
+    assert minimize_policy(policy) == {
+        "default-src": ["'self'"],
+        "script-src": ["'self'", "https://*.example.com"],
+        "style-src": ["'self'", "'unsafe-inline'"],
+        "report-uri": ["{report_uri}"],
+    }
+
+
+def test_minimize_policy_fallback_chain() -> None:
+    # worker-src falls back to child-src - which can't be removed as it
+    # would change worker-src to fall back to script-src.
+    policy = {
+        "default-src": ["'self'"],
+        "child-src": ["'self'"],
+        "script-src": ["'self'", "https://example.com"],
+    }
+    assert minimize_policy(policy) == policy
+    assert minimize_policy({"default-src": ["'self'"], "child-src": ["'self'"]}) == {
+        "default-src": ["'self'"]
+    }
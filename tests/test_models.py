@@ -1,7 +1,25 @@
+from unittest import mock
+
 import pytest
+from django.core.cache import cache
+from django.db.utils import IntegrityError
 from pydantic import ValidationError
 
-from csp.models import CspReportBlacklist, CspRule, ReportData
+from csp.blacklist import is_blacklisted
+from csp.models import (
+    CACHE_KEY_SUMMARY_REBUILT,
+    CspPolicySnapshot,
+    CspReport,
+    CspReportBlacklist,
+    CspReportCounterShard,
+    CspReportManager,
+    CspReportSummary,
+    CspReportSummaryManager,
+    CspRule,
+    ReportData,
+    convert_reports,
+)
+from csp.records import ReportRecord
 
 
 @pytest.mark.parametrize(
@@ -38,6 +56,44 @@ def test_clean_value(input: str, output: str) -> None:  # noqa: A002
     assert CspRule.clean_value(input) == output
 
 
+@pytest.mark.django_db
+def test_rule_normalized_value() -> None:
+    rule = CspRule.objects.create(directive="script-src", value="self")
+    assert rule.normalized_value == "'self'"
+    rule.value = "https://a.com/?foo"
+    rule.save(update_fields=["value"])
+    rule.refresh_from_db()
+    assert rule.normalized_value == "https://a.com/"
+    assert list(CspRule.objects.directive_values()) == [
+        ("script-src", "https://a.com/")
+    ]
+
+
+@pytest.mark.django_db
+def test_convert_reports() -> None:
+    CspRule.objects.create(directive="img-src", value="https://a.com/?v=1")
+    for uri in ["https://a.com/", "https://b.com/"]:
+        CspReport.objects.create(effective_directive="img-src", blocked_uri=uri)
+    # the existing rule matches on its normalized value
+    assert convert_reports(CspReport.objects.all()) == (1, 1)
+    assert set(CspRule.objects.values_list("value", "normalized_value")) == {
+        ("https://a.com/?v=1", "https://a.com/"),
+        ("https://b.com/", "https://b.com/"),
+    }
+    assert not CspReport.objects.exists()
+
+
+@pytest.mark.django_db
+def test_snapshot_publish() -> None:
+    assert CspPolicySnapshot.objects.latest_snapshot() is None
+    first = CspPolicySnapshot.objects.publish({"": ["img-src 'self'", ""]}, "abc")
+    second = CspPolicySnapshot.objects.publish({"": ["img-src 'none'", ""]}, "abc")
+    assert (first.version, second.version) == (1, 2)
+    assert CspPolicySnapshot.objects.latest_snapshot() == second
+    assert second.get_policy() == ("img-src 'none'", "")
+    assert second.get_policy("a.example.com") is None
+
+
 class TestReportData:
     def test_defaults(self) -> None:
         report = ReportData(
@@ -112,3 +168,214 @@ class TestBlacklist:
             "img-src": ["inline", "http://example.com"],
             "font-src": ["https://google.com"],
         }
+
+    def test_queryset_as_host_dict(self) -> None:
+        CspReportBlacklist.objects.create(directive="img-src", blocked_uri="inline")
+        CspReportBlacklist.objects.create(
+            directive="img-src", blocked_uri="https://a.com", host="A.example.com"
+        )
+        assert CspReportBlacklist.objects.order_by("id").as_host_dict() == {
+            "": {"img-src": ["inline"]},
+            "a.example.com": {"img-src": ["https://a.com"]},
+        }
+
+    def test_is_blacklisted_host(self) -> None:
+        CspReportBlacklist.objects.create(
+            directive="img-src", blocked_uri="https://a.com", host="a.example.com"
+        )
+        report = ReportData(
+            effective_directive="img-src",
+            blocked_uri="https://a.com/foo.png",
+            document_uri="https://a.example.com/page/",
+        )
+        assert is_blacklisted(report)
+        report.document_uri = "https://b.example.com/page/"
+        assert not is_blacklisted(report)
+
+
+@pytest.mark.django_db
+class TestCspReportManager:
+    def test_save_reports(self) -> None:
+        reports = [
+            ReportData(effective_directive="img-src", blocked_uri="https://a.com"),
+            ReportData(effective_directive="img-src", blocked_uri="https://b.com"),
+            ReportData(
+                effective_directive="img-src",
+                blocked_uri="https://a.com",
+                document_uri="https://example.com/2",
+            ),
+        ]
+        assert CspReport.objects.save_reports(reports) == 2
+        report = CspReport.objects.get(blocked_uri="https://a.com")
+        assert report.request_count == 2
+        assert report.document_uri == "https://example.com/2"
+        assert CspReport.objects.get(blocked_uri="https://b.com").request_count == 1
+
+    @pytest.mark.parametrize("shards", [0, 4])
+    def test_save_report_returns(self, shards: int) -> None:
+        data = ReportData(effective_directive="img-src", blocked_uri="https://a.com")
+        with mock.patch("csp.models.CSP_REPORT_COUNTER_SHARDS", shards):
+            # a new violation returns the report
+            report = CspReport.objects.save_report(data)
+            assert report == CspReport.objects.get()
+            # a known violation is updated in place, without fetching it -
+            # unless the count goes to a shard
+            known = CspReport.objects.save_report(data)
+        assert known == (report if shards else None)
+
+    def test_upsert_counts(self) -> None:
+        CspReport.objects.create(
+            effective_directive="img-src", blocked_uri="https://a.com", request_count=1
+        )
+        counts = [
+            (
+                ReportRecord("img-src", "https://a.com", "https://example.com/2"),
+                2,
+            ),
+            (ReportRecord("font-src", "https://a.com", "", "enforce"), 3),
+        ]
+        assert CspReport.objects.upsert_counts(counts) == 2
+        report = CspReport.objects.get(effective_directive="img-src")
+        assert report.request_count == 3
+        assert report.document_uri == "https://example.com/2"
+        report = CspReport.objects.get(effective_directive="font-src")
+        assert report.request_count == 3
+        assert report.disposition == "enforce"
+
+    @mock.patch("csp.models.CSP_REPORT_COUNTER_SHARDS", 4)
+    def test_upsert_counts_shards(self) -> None:
+        CspReport.objects.create(
+            effective_directive="img-src", blocked_uri="https://a.com", request_count=1
+        )
+        counts = [
+            (ReportRecord("img-src", "https://a.com"), 2),
+            (ReportRecord("font-src", "https://a.com"), 3),
+        ]
+        assert CspReport.objects.upsert_counts(counts) == 2
+        # the existing report row is not updated - the count goes to a shard
+        report = CspReport.objects.with_pending_counts().get(
+            effective_directive="img-src"
+        )
+        assert (report.request_count, report.pending_count) == (1, 2)
+        assert CspReport.objects.get(effective_directive="font-src").request_count == 3
+
+    def test_upsert_counts_conflict(self) -> None:
+        counts = [(ReportRecord("img-src", "https://a.com"), 2)]
+        with mock.patch.object(
+            CspReportManager, "bulk_create", side_effect=IntegrityError
+        ):
+            assert CspReport.objects.upsert_counts(counts) == 1
+        assert CspReport.objects.get().request_count == 2
+
+
+@pytest.mark.django_db
+@mock.patch("csp.models.CSP_REPORT_COUNTER_SHARDS", 4)
+class TestCspReportCounterShard:
+    def save(self, count: int) -> None:
+        for i in range(count):
+            CspReport.objects.save_report(
+                ReportData(
+                    effective_directive="img-src",
+                    blocked_uri="https://a.com",
+                    document_uri=f"https://example.com/{i}",
+                )
+            )
+
+    def test_increment(self) -> None:
+        self.save(10)
+        report = CspReport.objects.get()
+        # only the first report is written to the report row
+        assert report.request_count == 1
+        assert report.document_uri == "https://example.com/0"
+        assert 1 <= CspReportCounterShard.objects.count() <= 4
+        report = CspReport.objects.with_pending_counts().get()
+        assert report.pending_count == 9
+        assert report.total_count == 10
+
+    def test_compact(self) -> None:
+        self.save(10)
+        assert CspReportCounterShard.objects.compact(chunk_size=1) >= 1
+        assert not CspReportCounterShard.objects.exists()
+        report = CspReport.objects.with_pending_counts().get()
+        assert report.request_count == report.total_count == 10
+        assert report.document_uri == "https://example.com/9"
+
+    def test_summary_rebuild(self) -> None:
+        self.save(10)
+        CspReportSummary.objects.rebuild()
+        assert CspReportSummary.objects.sources().get().request_count == 10
+
+
+@pytest.mark.django_db
+class TestCspReportSummaryManager:
+    REPORTS = [
+        ReportData(
+            effective_directive="img-src",
+            blocked_uri="https://a.com/1.png",
+            document_uri="https://example.com/1",
+        ),
+        ReportData(
+            effective_directive="img-src",
+            blocked_uri="https://a.com/2.png",
+            document_uri="https://example.com/1",
+        ),
+        ReportData(effective_directive="font-src", blocked_uri="https://a.com"),
+    ]
+
+    def get_summary(self) -> list[tuple[str, str, str, int]]:
+        return list(
+            CspReportSummary.objects.order_by("kind", "directive", "uri").values_list(
+                "kind", "directive", "uri", "request_count"
+            )
+        )
+
+    @mock.patch("csp.models.CSP_REPORT_SUMMARY", True)
+    def test_record(self) -> None:
+        CspReportSummary.objects.flush()
+        # the counts are buffered, and saved in bulk
+        with mock.patch.object(CspReportSummaryManager, "filter") as mock_filter:
+            CspReport.objects.save_reports(self.REPORTS)
+        mock_filter.assert_not_called()
+        assert not CspReportSummary.objects.exists()
+        assert CspReportSummary.objects.flush() == 3
+        CspReport.objects.save_reports(self.REPORTS)
+        assert CspReportSummary.objects.flush() == 3
+        assert self.get_summary() == [
+            ("document", "", "https://example.com/1", 4),
+            ("source", "font-src", "https://a.com", 2),
+            ("source", "img-src", "https://a.com", 4),
+        ]
+
+    @mock.patch("csp.models.CSP_REPORT_SUMMARY", True)
+    @mock.patch("csp.models.CSP_REPORT_SUMMARY_FLUSH_INTERVAL", 0)
+    def test_record_flush_interval(self) -> None:
+        CspReport.objects.save_reports(self.REPORTS)
+        assert len(self.get_summary()) == 3
+
+    @mock.patch("csp.models.CSP_REPORT_SUMMARY", True)
+    def test_record_rebuilt(self) -> None:
+        CspReportSummary.objects.flush()
+        CspReport.objects.save_reports(self.REPORTS)
+        # the rebuild includes the buffered counts - which are discarded
+        CspReportSummary.objects.rebuild()
+        assert CspReportSummary.objects.flush() == 0
+        assert self.get_summary() == [
+            ("document", "", "https://example.com/1", 2),
+            ("source", "font-src", "https://a.com", 1),
+            ("source", "img-src", "https://a.com", 2),
+        ]
+        cache.delete(CACHE_KEY_SUMMARY_REBUILT)
+
+    def test_record_disabled(self) -> None:
+        CspReport.objects.save_reports(self.REPORTS)
+        assert not CspReportSummary.objects.exists()
+
+    def test_rebuild(self) -> None:
+        CspReport.objects.save_reports(self.REPORTS + self.REPORTS)
+        CspReportSummary.objects.create(kind="source", uri="https://stale.com")
+        assert CspReportSummary.objects.rebuild(chunk_size=2) == 3
+        assert self.get_summary() == [
+            ("document", "", "https://example.com/1", 4),
+            ("source", "font-src", "https://a.com", 2),
+            ("source", "img-src", "https://a.com", 4),
+        ]
@@ -0,0 +1,38 @@
+from unittest import mock
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from csp.normalization import get_normalizer, normalize_uri
+
+URI = "https://cdn.example.com/js/app.js"
+
+
+@pytest.fixture(autouse=True)
+def clear_normalizers() -> None:
+    get_normalizer.cache_clear()
+
+
+@pytest.mark.parametrize(
+    "directive,output",
+    [
+        ("script-src", "https://cdn.example.com/js/"),
+        ("img-src", "https://*.example.com"),
+        ("font-src", "https://cdn.example.com"),
+    ],
+)
+def test_normalize_uri(directive: str, output: str) -> None:
+    config = {"*": "origin", "script-src": "path", "img-src": "domain"}
+    with mock.patch("csp.normalization.CSP_REPORT_NORMALIZATION", config):
+        assert normalize_uri(directive, URI) == output
+
+
+def test_normalize_uri_disabled() -> None:
+    with mock.patch("csp.normalization.CSP_REPORT_NORMALIZATION", {}):
+        assert normalize_uri("img-src", URI) == URI
+
+
+def test_normalize_uri_invalid() -> None:
+    with mock.patch("csp.normalization.CSP_REPORT_NORMALIZATION", {"*": "host"}):
+        with pytest.raises(ImproperlyConfigured):
+            normalize_uri("img-src", URI)
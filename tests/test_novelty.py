@@ -0,0 +1,31 @@
+import pytest
+
+from csp.models import CspReport
+from csp.novelty import MIN_CAPACITY, BloomFilter, build_known_filter
+
+
+def test_bloom_filter() -> None:
+    known = BloomFilter(1000, error_rate=0.01)
+    keys = [f"img-src https://{i}.example.com" for i in range(1000)]
+    for key in keys:
+        known.add(key)
+    assert len(known) == 1000
+    # no false negatives
+    assert all(key in known for key in keys)
+    false_positives = sum(f"font-src https://{i}.com" in known for i in range(10000))
+    assert false_positives < 300
+
+
+def test_bloom_filter_size() -> None:
+    known = BloomFilter(10000, error_rate=0.001)
+    assert known.hashes == 10
+    assert len(known.bits) == 17972
+
+
+@pytest.mark.django_db
+def test_build_known_filter() -> None:
+    CspReport.objects.create(effective_directive="img-src", blocked_uri="https://a.com")
+    known = build_known_filter()
+    assert known.capacity == MIN_CAPACITY
+    assert "img-src https://a.com" in known
+    assert "img-src https://b.com" not in known
@@ -0,0 +1,230 @@
+"""
+Performance contracts - query counts, byte budgets, and scaling.
+
+These guard the hot paths (the header middleware, and report ingestion)
+against changes that quietly add database queries. A failing query
+count assertion lists the SQL that was run. Timings are only compared
+with each other (never with a fixed wall-clock budget), so that they
+catch gross regressions (e.g. a linear scan replacing a lookup) without
+depending on the speed of the machine.
+
+"""
+
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Iterator
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from pytest_django import DjangoCaptureOnCommitCallbacks
+
+from csp.matcher import PolicyMatcher
+from csp.middleware import CspHeaderMiddleware
+from csp.models import CspReport, CspReportBlacklist, CspReportSummary, CspRule
+from csp.records import ReportRecord
+from csp.views import report_uri
+
+
+def _format_queries(context: CaptureQueriesContext) -> str:
+    return "\n".join(
+        f"  {i}. {query['sql']}"
+        for i, query in enumerate(context.captured_queries, start=1)
+    )
+
+
+@contextmanager
+def assert_queries(num: int, exact: bool = False) -> Iterator[CaptureQueriesContext]:
+    """Fail, listing the SQL, if more than (or not exactly) num queries run."""
+    with CaptureQueriesContext(connection) as context:
+        yield context
+    if len(context) > num or (exact and len(context) != num):
+        pytest.fail(
+            f"Expected {'exactly' if exact else 'at most'} {num} queries, "
+            f"but {len(context)} were run:\n{_format_queries(context)}"
+        )
+
+
+def count_queries(func: Callable[[], object]) -> CaptureQueriesContext:
+    with CaptureQueriesContext(connection) as context:
+        func()
+    return context
+
+
+def time_per_call(func: Callable[[], object], number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - start) / number
+
+
+@pytest.fixture
+def middleware() -> CspHeaderMiddleware:
+    cache.clear()
+    return CspHeaderMiddleware(lambda r: HttpResponse())
+
+
+def post_report(rf: RequestFactory, blocked_uri: str = "https://a.com") -> int:
+    request = rf.post(
+        "/",
+        data={
+            "csp-report": {
+                "effective-directive": "img-src",
+                "blocked-uri": blocked_uri,
+            }
+        },
+        content_type="application/json",
+    )
+    return report_uri(request).status_code
+
+
+@pytest.mark.django_db
+class TestHeaderPath:
+    def test_cache_miss(
+        self, rf: RequestFactory, middleware: CspHeaderMiddleware
+    ) -> None:
+        # build_policy reads the rules in one query
+        with assert_queries(1, exact=True):
+            middleware(rf.get("/"))
+
+    @mock.patch("csp.policy.CSP_POLICY_SNAPSHOTS", True)
+    def test_cache_miss_snapshot(
+        self,
+        rf: RequestFactory,
+        middleware: CspHeaderMiddleware,
+        django_capture_on_commit_callbacks: DjangoCaptureOnCommitCallbacks,
+    ) -> None:
+        with django_capture_on_commit_callbacks(execute=True):
+            CspRule.objects.create(directive="img-src", value="https://a.com")
+        cache.clear()
+        # the latest snapshot is read by primary key - the rules are not
+        with assert_queries(1, exact=True):
+            middleware(rf.get("/"))
+
+    @pytest.mark.parametrize("host_policies", [False, True])
+    def test_warm_cache(
+        self, rf: RequestFactory, middleware: CspHeaderMiddleware, host_policies: bool
+    ) -> None:
+        CspRule.objects.create(directive="img-src", value="https://a.com")
+        CspRule.objects.create(
+            directive="img-src", value="https://b.com", host="testserver"
+        )
+        with mock.patch("csp.policy.CSP_HOST_POLICIES", host_policies):
+            middleware(rf.get("/"))
+            with assert_queries(0):
+                middleware(rf.get("/"))
+
+
+@pytest.mark.django_db
+class TestReportPath:
+    @pytest.mark.parametrize("summary", [False, True])
+    def test_known_violation(self, rf: RequestFactory, summary: bool) -> None:
+        # summary counts are buffered, and saved in bulk (see flush)
+        with mock.patch("csp.models.CSP_REPORT_SUMMARY", summary):
+            CspReportSummary.objects.flush()
+            assert post_report(rf) == 201
+            with assert_queries(1):
+                assert post_report(rf) == 201
+            CspReportSummary.objects.flush()
+        assert CspReport.objects.get().request_count == 2
+
+    def test_blacklisted(self, rf: RequestFactory) -> None:
+        CspReportBlacklist.objects.create(
+            directive="img-src", blocked_uri="https://a.com"
+        )
+        cache.clear()
+        post_report(rf)
+        with assert_queries(0):
+            assert post_report(rf) == 200
+
+    def test_record_byte_budget(self) -> None:
+        data = {
+            "document-uri": "https://example.com/foo/",
+            "effective-directive": "img-src",
+            "blocked-uri": "https://cdn.example.com/img/1.png",
+            "disposition": "enforce",
+        }
+        tracemalloc.start()
+        records = [ReportRecord.from_dict(data) for _ in range(1000)]
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert len(records) == 1000
+        assert retained / 1000 < 256
+
+    def test_matcher_scaling(self) -> None:
+        # lookups must not scan the sources - 1000 hosts cost about the same
+        # as 1 (a scan would be hundreds of times slower).
+        def lookup_time(count: int) -> float:
+            sources = [f"https://cdn{i}.example.com" for i in range(count)]
+            matcher = PolicyMatcher({"img-src": ["'self'", *sources]})
+            blocked_uri = f"https://cdn{count - 1}.example.com/img.png"
+            assert matcher.allows("img-src", blocked_uri)
+            return min(
+                time_per_call(lambda: matcher.allows("img-src", blocked_uri), 1000)
+                for _ in range(5)
+            )
+
+        assert lookup_time(1000) < lookup_time(1) * 10
+
+
+@pytest.mark.django_db
+class TestAdminActions:
+    """Bulk actions run the same number of queries whatever the selection."""
+
+    def run_action(
+        self, client: Client, model: str, action: str, pks: list[int]
+    ) -> CaptureQueriesContext:
+        url = reverse(f"admin:csp_{model}_changelist")
+        data = {"action": action, "_selected_action": pks}
+        return count_queries(lambda: client.post(url, data))
+
+    def assert_constant(
+        self, small: CaptureQueriesContext, large: CaptureQueriesContext
+    ) -> None:
+        if len(small) != len(large):
+            pytest.fail(
+                f"{len(small)} queries for the small selection, but "
+                f"{len(large)} for the large one:\n{_format_queries(large)}"
+            )
+
+    def reports(self, start: int, count: int) -> list[int]:
+        return [
+            CspReport.objects.create(
+                effective_directive="img-src", blocked_uri=f"https://{i}.com"
+            ).pk
+            for i in range(start, start + count)
+        ]
+
+    @pytest.mark.parametrize("action", ["add_rule", "add_to_blacklist"])
+    def test_report_actions(self, admin_client: Client, action: str) -> None:
+        # warm up the session / permission queries
+        self.run_action(admin_client, "cspreport", action, self.reports(0, 1))
+        small = self.run_action(admin_client, "cspreport", action, self.reports(1, 2))
+        large = self.run_action(admin_client, "cspreport", action, self.reports(3, 20))
+        self.assert_constant(small, large)
+        assert not CspReport.objects.exists()
+
+    @pytest.mark.parametrize(
+        "action",
+        ["enable_selected_rules", "disable_selected_rules", "strip_selected_rules"],
+    )
+    def test_rule_actions(self, admin_client: Client, action: str) -> None:
+        pks = []
+        for i in range(23):
+            rule = CspRule.objects.create(
+                directive="img-src", value=f"https://{i}.com/x"
+            )
+            pks.append(rule.pk)
+            if i % 2 == 0:
+                # stripping the path from the rule above creates a duplicate
+                CspRule.objects.create(directive="img-src", value=f"https://{i}.com")
+        self.run_action(admin_client, "csprule", action, pks[:1])
+        small = self.run_action(admin_client, "csprule", action, pks[1:3])
+        large = self.run_action(admin_client, "csprule", action, pks[3:])
+        self.assert_constant(small, large)
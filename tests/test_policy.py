@@ -1,10 +1,25 @@
+from typing import Any
 from unittest import mock
 
 import pytest
 from django.core.cache import cache
 from django.test import RequestFactory
+from pytest_django import DjangoCaptureOnCommitCallbacks
 
-from csp.policy import CACHE_KEY_RULES, _dedupe, _downgrade, format_as_csp, get_csp
+from csp.models import CspPolicySnapshot, CspRule
+from csp.policy import (
+    CACHE_KEY_RULES,
+    _dedupe,
+    _downgrade,
+    build_policy,
+    format_as_csp,
+    get_cached_csp,
+    get_csp,
+    host_cache_key,
+    load_snapshot,
+    restore_snapshot,
+    warm_cache,
+)
 from csp.settings import CSP_REPORT_DIRECTIVE_DOWNGRADE
 
 
@@ -63,3 +78,176 @@ def test__dedupe(input_list: list[str], output_list: list[str]) -> None:
 
     """
     assert _dedupe(input_list) == output_list
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("minimize", [True, False])
+def test_build_policy_minimize(minimize: bool) -> None:
+    for value in ["https://*.example.com", "https://cdn.example.com"]:
+        CspRule.objects.create(directive="script-src", value=value, enabled=True)
+    with mock.patch("csp.policy.CSP_MINIMIZE_POLICY", minimize):
+        policy = build_policy()
+    # img-src is the same as default-src
+    assert ("img-src" in policy) != minimize
+    assert ("https://cdn.example.com" in policy["script-src"]) != minimize
+    # font-src is not
+    assert "font-src" in policy
+
+
+@pytest.mark.django_db
+def test_build_policy_host() -> None:
+    CspRule.objects.create(directive="img-src", value="https://a.com", enabled=True)
+    CspRule.objects.create(
+        directive="img-src", value="https://b.com", host="b.example.com", enabled=True
+    )
+    assert "https://b.com" in build_policy(host=None)["img-src"]
+    assert "https://b.com" not in build_policy(host="")["img-src"]
+    assert "https://b.com" not in build_policy(host="c.example.com")["img-src"]
+    policy = build_policy(host="b.example.com")
+    assert {"https://a.com", "https://b.com"} <= set(policy["img-src"])
+
+
+@pytest.mark.django_db
+@mock.patch("csp.policy.CSP_HOST_POLICIES", True)
+def test_get_csp_host(rf: RequestFactory, settings: Any) -> None:
+    settings.ALLOWED_HOSTS = ["*"]
+    cache.clear()
+    CspRule.objects.create(directive="img-src", value="https://a.com", enabled=True)
+    rule = CspRule.objects.create(
+        directive="img-src", value="https://b.com", host="B.example.com", enabled=True
+    )
+    assert rule.host == "b.example.com"
+    host_request = rf.get("/", HTTP_HOST="b.example.com:8000")
+    other_request = rf.get("/", HTTP_HOST="c.example.com")
+    assert "https://b.com" in get_csp(host_request, False)
+    assert "https://b.com" not in get_csp(other_request, False)
+    # hosts without rules of their own share the global policy
+    assert host_cache_key("c.example.com") not in cache
+    assert host_cache_key("b.example.com") in cache
+
+    # editing a host rule only clears that host's policy
+    rule.enabled = False
+    rule.save()
+    assert host_cache_key("b.example.com") not in cache
+    assert CACHE_KEY_RULES in cache
+    assert "https://b.com" not in get_csp(host_request, False)
+
+    # editing a global rule invalidates every host policy
+    rule.enabled = True
+    rule.save()
+    assert "https://b.com" in get_csp(host_request, False)
+    CspRule.objects.create(directive="img-src", value="https://d.com", enabled=True)
+    assert host_cache_key("b.example.com") in cache
+    assert "https://d.com" in get_csp(host_request, False)
+    assert "https://d.com" in get_csp(other_request, False)
+    cache.clear()
+
+
+@pytest.mark.django_db
+@mock.patch("csp.policy.CSP_HOST_POLICIES", True)
+def test_get_csp_host_moved(rf: RequestFactory, settings: Any) -> None:
+    settings.ALLOWED_HOSTS = ["*"]
+    cache.clear()
+    rule = CspRule.objects.create(
+        directive="img-src", value="https://a.com", enabled=True
+    )
+    CspRule.objects.create(
+        directive="img-src", value="https://b.com", host="b.com", enabled=True
+    )
+    b_request = rf.get("/", HTTP_HOST="b.com")
+    c_request = rf.get("/", HTTP_HOST="c.com")
+    assert "https://a.com" in get_csp(b_request, False)
+    # global -> host: every policy is cleared
+    rule.host = "c.com"
+    rule.save()
+    assert "https://a.com" not in get_csp(b_request, False)
+    assert "https://a.com" in get_csp(c_request, False)
+    # host -> host: both hosts are cleared
+    rule.host = "b.com"
+    rule.save()
+    assert "https://a.com" in get_csp(b_request, False)
+    assert "https://a.com" not in get_csp(c_request, False)
+    cache.clear()
+
+
+@pytest.mark.django_db
+@mock.patch("csp.policy.CSP_POLICY_SNAPSHOTS", True)
+@mock.patch("csp.policy.CSP_HOST_POLICIES", True)
+def test_policy_snapshots(
+    django_capture_on_commit_callbacks: DjangoCaptureOnCommitCallbacks,
+) -> None:
+    cache.clear()
+    with django_capture_on_commit_callbacks(execute=True):
+        CspRule.objects.create(directive="img-src", value="https://a.com", enabled=True)
+    with django_capture_on_commit_callbacks(execute=True):
+        CspRule.objects.create(
+            directive="img-src", value="https://b.com", host="b.com", enabled=True
+        )
+    # a snapshot is saved for each (committed) change
+    assert CspPolicySnapshot.objects.count() == 2
+    snapshot = CspPolicySnapshot.objects.latest_snapshot()
+    assert snapshot and set(snapshot.policies) == {"", "b.com"}
+    assert "https://b.com" in get_cached_csp("b.com")[0]
+    assert "https://b.com" not in get_cached_csp("c.com")[0]
+    # the cache is rebuilt from the snapshot, not the rules
+    cache.clear()
+    with mock.patch("csp.policy.build_policy") as mock_build:
+        assert get_cached_csp("b.com") == snapshot.get_policy("b.com")
+        mock_build.assert_not_called()
+    cache.clear()
+
+
+@pytest.mark.django_db(databases=["default", "reports"])
+@mock.patch("csp.policy.CSP_POLICY_SNAPSHOTS", True)
+@mock.patch("csp.policy.CSP_RULES_READ_DATABASE", "reports")
+def test_policy_snapshot_on_commit(
+    django_capture_on_commit_callbacks: DjangoCaptureOnCommitCallbacks,
+) -> None:
+    with django_capture_on_commit_callbacks() as callbacks:
+        CspRule.objects.create(directive="img-src", value="https://a.com", enabled=True)
+    # nothing is compiled until the change is committed
+    assert not CspPolicySnapshot.objects.exists()
+    callbacks[0]()
+    # ... and then from the primary, not the (lagging) replica
+    snapshot = CspPolicySnapshot.objects.latest_snapshot()
+    assert snapshot and "https://a.com" in snapshot.policies[""][0]
+    cache.clear()
+
+
+@pytest.mark.django_db
+@mock.patch("csp.policy.CSP_POLICY_SNAPSHOTS", True)
+def test_load_snapshot_stale() -> None:
+    cache.clear()
+    snapshot = CspPolicySnapshot.objects.publish({"": ["img-src 'none'", ""]}, "x")
+    # built with different settings - so the policy is built from the
+    # rules, without publishing a snapshot from the request path.
+    assert load_snapshot() is None
+    assert get_cached_csp()[0] != "img-src 'none'"
+    assert CspPolicySnapshot.objects.count() == 1
+    # ... which is done by warm_cache
+    warm_cache()
+    latest = load_snapshot()
+    assert latest and latest.version == snapshot.version + 1
+    cache.clear()
+
+
+@pytest.mark.django_db
+@mock.patch("csp.policy.CSP_POLICY_SNAPSHOTS", True)
+def test_restore_snapshot(
+    django_capture_on_commit_callbacks: DjangoCaptureOnCommitCallbacks,
+) -> None:
+    cache.clear()
+    with django_capture_on_commit_callbacks(execute=True):
+        rule = CspRule.objects.create(
+            directive="img-src", value="https://a.com", enabled=True
+        )
+    old = CspPolicySnapshot.objects.latest_snapshot()
+    with django_capture_on_commit_callbacks(execute=True):
+        rule.delete()
+    assert "https://a.com" not in get_cached_csp()[0]
+    assert old
+    restored = restore_snapshot(old)
+    assert restored.version == old.version + 2
+    assert restored.policies == old.policies
+    assert "https://a.com" in get_cached_csp()[0]
+    cache.clear()
@@ -0,0 +1,93 @@
+import json
+import os
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory
+
+from csp.models import CspRule
+from csp.policy import get_csp
+from csp.policy_file import (
+    POLICY_FILE_FORMAT,
+    PolicyFile,
+    compile_policy,
+    read_policy_file,
+    write_policy_file,
+)
+
+
+@pytest.fixture
+def policy_file(tmp_path: Path) -> str:
+    path = str(tmp_path / "csp.json")
+    write_policy_file(path, compile_policy())
+    return path
+
+
+def touch(path: str, compiled: dict) -> None:
+    write_policy_file(path, compiled)
+    # ensure mtime changes, whatever the filesystem resolution
+    mtime = os.stat(path).st_mtime_ns + 1_000_000_000
+    os.utime(path, ns=(mtime, mtime))
+
+
+@pytest.mark.django_db
+class TestCompilePolicy:
+    def test_compile_policy(self) -> None:
+        CspRule.objects.create(directive="img-src", value="https://a.com", enabled=True)
+        compiled = compile_policy()
+        assert compiled["format"] == POLICY_FILE_FORMAT
+        assert "https://a.com" in compiled["policy"]["img-src"]
+        assert "img-src" in compiled["headers"]["csp"]
+        assert compiled["headers"]["report_uri"] == ""
+
+    def test_round_trip(self, policy_file: str) -> None:
+        assert read_policy_file(policy_file)["version"] == compile_policy()["version"]
+
+    def test_invalid_format(self, policy_file: str) -> None:
+        with open(policy_file, "w") as f:
+            json.dump({"format": 0}, f)
+        with pytest.raises(ValueError):
+            read_policy_file(policy_file)
+
+
+@pytest.mark.django_db
+class TestPolicyFile:
+    def test_missing_file(self, tmp_path: Path) -> None:
+        with pytest.raises(ImproperlyConfigured):
+            PolicyFile(str(tmp_path / "missing.json"))
+
+    def test_reload(self, policy_file: str) -> None:
+        loaded = PolicyFile(policy_file, check_interval=0)
+        compiled = read_policy_file(policy_file)
+        compiled["headers"]["csp"] = "default-src 'none'"
+        touch(policy_file, compiled)
+        assert loaded.headers == ("default-src 'none'", "")
+
+    def test_reload_interval(self, policy_file: str) -> None:
+        loaded = PolicyFile(policy_file, check_interval=60)
+        original = loaded.headers
+        compiled = read_policy_file(policy_file)
+        compiled["headers"]["csp"] = "default-src 'none'"
+        touch(policy_file, compiled)
+        with mock.patch("csp.policy_file.os.stat") as mock_stat:
+            assert loaded.headers == original
+        mock_stat.assert_not_called()
+
+    def test_reload_error(self, policy_file: str) -> None:
+        loaded = PolicyFile(policy_file, check_interval=0)
+        original = loaded.headers
+        touch(policy_file, {"format": 0})
+        assert loaded.headers == original
+
+
+@pytest.mark.django_db
+def test_get_csp_from_file(rf: RequestFactory, policy_file: str) -> None:
+    loaded = PolicyFile(policy_file)
+    loaded.compiled["headers"] = {"csp": "img-src 'self'", "report_uri": ""}
+    with mock.patch("csp.policy.CSP_POLICY_FILE", policy_file), mock.patch(
+        "csp.policy.get_policy_file", return_value=loaded
+    ), mock.patch("csp.policy.cache") as mock_cache:
+        assert get_csp(rf.get("/"), False) == "img-src 'self'"
+    mock_cache.get.assert_not_called()
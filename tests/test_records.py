@@ -0,0 +1,117 @@
+from typing import Any
+
+import pytest
+from pydantic import ValidationError
+
+from csp.records import InvalidReport, ReportRecord, records_from_payload
+from csp.reports import ReportData
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"effective-directive": "img-src", "blocked-uri": "https://example.com"},
+        # violated-directive is used if effective-directive is missing
+        {"violated-directive": "img-src", "blocked-uri": "https://example.com"},
+        {
+            "effective-directive": "",
+            "violated-directive": "img-src",
+            "blocked-uri": "https://example.com",
+        },
+        # query string is stripped, and uris truncated
+        {
+            "effective-directive": "img-src",
+            "blocked-uri": "https://example.com/?foo",
+            "document-uri": "https://example.com/" + "x" * 300,
+            "disposition": "enforce",
+        },
+        # numbers are coerced to strings
+        {"effective-directive": "img-src", "blocked-uri": 1, "status-code": 200},
+        # Reporting API field names
+        {
+            "effectiveDirective": "img-src",
+            "blockedURL": "https://example.com",
+            "documentURL": "https://example.com/?foo",
+        },
+        # field (attribute) names
+        {"effective_directive": "img-src", "blocked_uri": "https://example.com"},
+        {"effective-directive": "img-src", "blocked-uri": "inline", "foo": "bar"},
+        {
+            "effective-directive": "img-src",
+            "blocked-uri": "inline",
+            "document-uri": None,
+            "disposition": None,
+        },
+    ],
+)
+def test_from_dict(data: dict[str, Any]) -> None:
+    record = ReportRecord.from_dict(data)
+    report = ReportData(**data)
+    assert record.effective_directive == report.effective_directive
+    assert record.blocked_uri == report.blocked_uri
+    assert record.document_uri == report.document_uri
+    assert record.disposition == (report.disposition or "")
+
+
+@pytest.mark.parametrize(
+    "data,fields",
+    [
+        ({}, ["blocked-uri"]),
+        ({"effective-directive": "img-src", "blocked-uri": ""}, ["blocked-uri"]),
+        ({"blocked-uri": "https://example.com"}, ["effective-directive"]),
+        (
+            {"effective-directive": ["img-src"], "blocked-uri": True},
+            ["blocked-uri", "effective-directive"],
+        ),
+    ],
+)
+def test_from_dict_invalid(data: dict[str, Any], fields: list[str]) -> None:
+    with pytest.raises(InvalidReport) as ex:
+        ReportRecord.from_dict(data)
+    assert ex.value.fields == fields
+    with pytest.raises(ValidationError):
+        ReportData(**data)
+
+
+def test_from_dict_not_dict() -> None:
+    with pytest.raises(TypeError):
+        ReportRecord.from_dict("img-src")  # type: ignore[arg-type]
+
+
+def test_slots() -> None:
+    record = ReportRecord("img-src", "https://example.com")
+    assert not hasattr(record, "__dict__")
+    with pytest.raises(AttributeError):
+        record.foo = "bar"  # type: ignore[attr-defined]
+
+
+def test_to_record() -> None:
+    report = ReportData(violated_directive="img-src", blocked_uri="https://a.com/?b")
+    record = report.to_record()
+    assert record.effective_directive == "img-src"
+    assert record.blocked_uri == "https://a.com/"
+    assert record.document_uri == ""
+
+
+def test_records_from_payload_batch() -> None:
+    valid = {"effectiveDirective": "img-src", "blockedURL": "https://a.com"}
+    batch = [
+        {"type": "csp-violation", "body": valid},
+        {"type": "deprecation", "body": {"id": "foo"}},
+        # invalid entries are skipped, rather than rejecting the batch
+        {"type": "csp-violation", "body": {"blockedURL": "https://b.com"}},
+        {"type": "csp-violation", "body": "img-src"},
+        {"type": "csp-violation"},
+        {"body": valid},
+        "csp-violation",
+        {"type": "csp-violation", "body": {**valid, "blockedURL": "https://c.com"}},
+    ]
+    records = records_from_payload(batch)
+    assert [r.blocked_uri for r in records] == ["https://a.com", "https://c.com"]
+
+
+def test_records_from_payload_invalid() -> None:
+    with pytest.raises(KeyError):
+        records_from_payload({"foo": {}})
+    with pytest.raises(InvalidReport):
+        records_from_payload({"csp-report": {"blocked-uri": "https://a.com"}})
@@ -0,0 +1,73 @@
+import threading
+from typing import Any, Sequence
+
+import pytest
+
+from csp.report_queue import DROP_NEWEST, DROP_OLDEST, ReportQueue
+
+
+class TestReportQueue:
+    def test_invalid_overflow(self) -> None:
+        with pytest.raises(ValueError):
+            ReportQueue(flush=lambda b: None, overflow="drop-everything")
+
+    def test_flush_in_batches(self) -> None:
+        batches: list[list[int]] = []
+        queue = ReportQueue(flush=batches.append, workers=1, batch_size=3)
+        # queue everything up before the worker thread is started
+        with queue._cond:
+            queue._ensure_started()
+            queue._items.extend(range(7))
+            queue._cond.notify_all()
+        assert queue.join(timeout=5)
+        assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+        queue.shutdown(timeout=5)
+
+    @pytest.mark.parametrize(
+        "overflow,expected", [(DROP_OLDEST, [1, 2]), (DROP_NEWEST, [0, 1])]
+    )
+    def test_overflow(self, overflow: str, expected: list[int]) -> None:
+        flushed: list[int] = []
+        blocked = threading.Event()
+        release = threading.Event()
+
+        def flush(batch: Sequence[Any]) -> None:
+            blocked.set()
+            release.wait(5)
+            flushed.extend(batch)
+
+        queue = ReportQueue(flush=flush, maxsize=2, workers=1, overflow=overflow)
+        # block the worker on a sentinel value so the queue fills up
+        queue.put(-1)
+        assert blocked.wait(5)
+        assert queue.put(0) is True
+        assert queue.put(1) is True
+        assert queue.put(2) is (overflow == DROP_OLDEST)
+        assert queue.stats()["dropped"] == 1
+        release.set()
+        assert queue.join(timeout=5)
+        assert flushed == [-1] + expected
+        queue.shutdown(timeout=5)
+
+    def test_flush_error(self) -> None:
+        def flush(batch: Sequence[Any]) -> None:
+            raise Exception("Database is down")
+
+        queue = ReportQueue(flush=flush, workers=1)
+        queue.put(1)
+        assert queue.join(timeout=5)
+        stats = queue.stats()
+        assert stats["failed"] == 1
+        assert stats["processed"] == 0
+        queue.shutdown(timeout=5)
+
+    def test_shutdown_drains_queue(self) -> None:
+        flushed: list[int] = []
+        queue = ReportQueue(flush=flushed.extend, workers=2, batch_size=2)
+        for i in range(10):
+            queue.put(i)
+        queue.shutdown(timeout=5)
+        assert sorted(flushed) == list(range(10))
+        assert queue.stats()["workers"] == 0
+        # once closed, the queue rejects new items
+        assert queue.put(11) is False
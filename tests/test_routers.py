@@ -0,0 +1,133 @@
+from importlib import import_module
+from typing import Iterator
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.test import override_settings
+from pytest_django import DjangoCaptureOnCommitCallbacks
+
+from csp.blacklist import CACHE_KEY_BLACKLIST
+from csp.models import (
+    CspReport,
+    CspReportBlacklist,
+    CspReportCounterShard,
+    CspReportSummary,
+    CspRule,
+    ReportData,
+)
+from csp.policy import CACHE_KEY_RULES, build_policy
+from csp.routers import CspRouter, rules_cache_timeout
+
+ROUTER = CspRouter()
+
+
+@pytest.fixture
+def report_database() -> Iterator[None]:
+    with mock.patch("csp.routers.CSP_REPORT_DATABASE", "reports"), override_settings(
+        DATABASE_ROUTERS=["csp.routers.CspRouter"]
+    ):
+        yield
+
+
+@pytest.mark.usefixtures("report_database")
+@pytest.mark.parametrize(
+    "model,db",
+    [
+        (CspReport, "reports"),
+        (CspReportCounterShard, "reports"),
+        (CspReportSummary, "reports"),
+        (CspRule, None),
+        (CspReportBlacklist, None),
+    ],
+)
+def test_db_for_read_write(model: type, db: str | None) -> None:
+    assert ROUTER.db_for_read(model) == db
+    assert ROUTER.db_for_write(model) == db
+
+
+@pytest.mark.usefixtures("report_database")
+@pytest.mark.parametrize(
+    "db,model_name,allow",
+    [
+        ("reports", "cspreport", True),
+        ("default", "cspreport", False),
+        ("default", "csprule", True),
+        ("reports", "csprule", False),
+        ("default", "cspreportblacklist", True),
+        ("reports", "cspreportblacklist", False),
+        ("reports", "cspconfig", False),
+        ("reports", "csppolicysnapshot", False),
+        ("reports", None, None),
+    ],
+)
+def test_allow_migrate(db: str, model_name: str, allow: bool | None) -> None:
+    assert ROUTER.allow_migrate(db, "csp", model_name) == allow
+    assert ROUTER.allow_migrate(db, "auth", "user") is None
+
+
+@pytest.mark.usefixtures("report_database")
+def test_allow_migrate_data_migration() -> None:
+    # data migrations on the rules are not run against the report database
+    migration = import_module("csp.migrations.0009_policy_snapshots")
+    operation = migration.Migration.operations[-1]
+    assert not ROUTER.allow_migrate("reports", "csp", **operation.hints)
+    assert ROUTER.allow_migrate("default", "csp", **operation.hints)
+
+
+def test_router_disabled() -> None:
+    assert ROUTER.db_for_write(CspReport) is None
+    assert ROUTER.allow_migrate("default", "csp", "cspreport") is None
+
+
+@pytest.mark.django_db(databases=["default", "reports"])
+@pytest.mark.usefixtures("report_database")
+def test_save_report() -> None:
+    for _ in range(2):
+        CspReport.objects.save_report(
+            ReportData(effective_directive="img-src", blocked_uri="https://a.com")
+        )
+    assert CspReport.objects.using("reports").get().request_count == 2
+    assert not CspReport.objects.using("default").exists()
+
+
+@pytest.mark.django_db(databases=["default", "reports"])
+def test_rules_read_database() -> None:
+    CspRule.objects.using("reports").create(
+        directive="img-src", value="https://replica.com", enabled=True
+    )
+    assert "https://replica.com" not in build_policy()["img-src"]
+    with mock.patch("csp.policy.CSP_RULES_READ_DATABASE", "reports"):
+        assert "https://replica.com" in build_policy()["img-src"]
+
+
+@pytest.fixture
+def rules_read_database() -> Iterator[None]:
+    with mock.patch("csp.policy.CSP_RULES_READ_DATABASE", "reports"), mock.patch(
+        "csp.blacklist.CSP_RULES_READ_DATABASE", "reports"
+    ), mock.patch("csp.routers.CSP_RULES_READ_DATABASE", "reports"):
+        yield
+
+
+@pytest.mark.usefixtures("rules_read_database")
+def test_rules_cache_timeout() -> None:
+    # anything read from the replica is only cached briefly
+    assert rules_cache_timeout(None) == 60
+    assert rules_cache_timeout("default") == 3600
+
+
+@pytest.mark.django_db(databases=["default", "reports"])
+@pytest.mark.usefixtures("rules_read_database")
+def test_rules_changed_rebuilds_from_primary(
+    django_capture_on_commit_callbacks: DjangoCaptureOnCommitCallbacks,
+) -> None:
+    cache.clear()
+    # the replica (which lags) does not have the new rule / blacklist entry
+    with django_capture_on_commit_callbacks(execute=True):
+        CspRule.objects.create(directive="img-src", value="https://a.com", enabled=True)
+        CspReportBlacklist.objects.create(
+            directive="img-src", blocked_uri="https://b.com"
+        )
+    assert "https://a.com" in cache.get(CACHE_KEY_RULES)[0]
+    assert cache.get(CACHE_KEY_BLACKLIST) == {"": {"img-src": ["https://b.com"]}}
+    cache.clear()
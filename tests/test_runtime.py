@@ -0,0 +1,140 @@
+from typing import Iterator
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from csp.middleware import CspHeaderMiddleware, add_report_uri
+from csp.models import CspConfig
+from csp.runtime import (
+    CACHE_KEY_CONFIG,
+    RuntimeConfig,
+    get_runtime_setting,
+    publish_config,
+)
+from csp.views import report_uri
+
+
+@pytest.fixture
+def runtime_config() -> Iterator[RuntimeConfig]:
+    cache.delete(CACHE_KEY_CONFIG)
+    config = RuntimeConfig(interval=0)
+    with mock.patch("csp.runtime.CSP_RUNTIME_CONFIG", True), mock.patch(
+        "csp.runtime._runtime_config", config
+    ):
+        yield config
+
+
+@pytest.mark.django_db
+class TestCspConfig:
+    def test_get_overrides(self) -> None:
+        assert CspConfig.objects.get_overrides() == {}
+        CspConfig.objects.create(report_only=False, report_throttling=0.5)
+        assert CspConfig.objects.get_overrides() == {
+            "CSP_REPORT_ONLY": False,
+            "CSP_REPORT_THROTTLING": 0.5,
+        }
+
+    def test_publish_on_save(self) -> None:
+        config = CspConfig.objects.create(enabled=False)
+        version = cache.get(CACHE_KEY_CONFIG)["version"]
+        assert cache.get(CACHE_KEY_CONFIG)["overrides"] == {"CSP_ENABLED": False}
+        config.delete()
+        assert cache.get(CACHE_KEY_CONFIG)["version"] != version
+        assert cache.get(CACHE_KEY_CONFIG)["overrides"] == {}
+
+
+@pytest.mark.django_db
+class TestRuntimeConfig:
+    def test_disabled(self) -> None:
+        CspConfig.objects.create(report_throttling=1.0)
+        assert get_runtime_setting("CSP_REPORT_THROTTLING", 0.0) == 0.0
+
+    def test_get(self, runtime_config: RuntimeConfig) -> None:
+        assert get_runtime_setting("CSP_REPORT_THROTTLING", 0.0) == 0.0
+        CspConfig.objects.create(report_throttling=1.0)
+        assert get_runtime_setting("CSP_REPORT_THROTTLING", 0.0) == 1.0
+        assert get_runtime_setting("CSP_REPORT_ONLY") is None
+
+    def test_cache_miss(self, runtime_config: RuntimeConfig) -> None:
+        CspConfig.objects.create(report_throttling=1.0)
+        cache.delete(CACHE_KEY_CONFIG)
+        assert runtime_config.get("CSP_REPORT_THROTTLING") == 1.0
+        assert cache.get(CACHE_KEY_CONFIG)["version"] == runtime_config.version
+
+    def test_interval(self, runtime_config: RuntimeConfig) -> None:
+        runtime_config.interval = 60
+        assert runtime_config.get("CSP_REPORT_THROTTLING") is None
+        CspConfig.objects.create(report_throttling=1.0)
+        # no database reads - and the cache is not read until the interval
+        # has passed.
+        with mock.patch("csp.runtime.cache") as mock_cache:
+            assert runtime_config.get("CSP_REPORT_THROTTLING") is None
+        mock_cache.get.assert_not_called()
+        runtime_config.checked_at -= 60
+        assert runtime_config.get("CSP_REPORT_THROTTLING") == 1.0
+
+    def test_refresh_error(self, runtime_config: RuntimeConfig) -> None:
+        CspConfig.objects.create(report_throttling=1.0)
+        assert runtime_config.get("CSP_REPORT_THROTTLING") == 1.0
+        version = runtime_config.version
+        runtime_config.interval = 60
+        runtime_config.checked_at -= 60
+        with mock.patch("csp.runtime.cache") as mock_cache:
+            mock_cache.get.side_effect = ConnectionError
+            assert runtime_config.get("CSP_REPORT_THROTTLING") == 1.0
+            # not retried until the interval has passed
+            assert runtime_config.get("CSP_REPORT_THROTTLING") == 1.0
+        mock_cache.get.assert_called_once()
+        assert runtime_config.version == version
+
+    def test_refresh_error_publish(self, runtime_config: RuntimeConfig) -> None:
+        with mock.patch("csp.runtime.publish_config", side_effect=ConnectionError):
+            assert runtime_config.get("CSP_REPORT_THROTTLING", 0.0) == 0.0
+        assert runtime_config.version is None
+
+    def test_version_unchanged(self, runtime_config: RuntimeConfig) -> None:
+        publish_config()
+        runtime_config.get("CSP_ENABLED")
+        overrides = runtime_config.overrides
+        runtime_config.get("CSP_ENABLED")
+        assert runtime_config.overrides is overrides
+
+
+@pytest.mark.django_db
+class TestRuntimeOverrides:
+    def test_enabled(self, rf: RequestFactory, runtime_config: RuntimeConfig) -> None:
+        CspConfig.objects.create(enabled=False)
+        response = CspHeaderMiddleware(lambda r: HttpResponse())(rf.get("/"))
+        assert not response.has_header("Content-Security-Policy-Report-Only")
+
+    def test_report_only(
+        self, rf: RequestFactory, runtime_config: RuntimeConfig
+    ) -> None:
+        CspConfig.objects.create(report_only=False)
+        response = CspHeaderMiddleware(lambda r: HttpResponse())(rf.get("/"))
+        assert response.has_header("Content-Security-Policy")
+        assert not response.has_header("Content-Security-Policy-Report-Only")
+
+    @pytest.mark.parametrize("ratio,result", [(0.0, False), (1.0, True)])
+    def test_report_sampling(
+        self,
+        rf: RequestFactory,
+        runtime_config: RuntimeConfig,
+        ratio: float,
+        result: bool,
+    ) -> None:
+        CspConfig.objects.create(report_sampling=ratio)
+        with mock.patch("csp.middleware.get_sampler") as mock_sampler:
+            assert add_report_uri(rf.get("/")) is result
+        mock_sampler.assert_not_called()
+
+    def test_report_throttling(
+        self, rf: RequestFactory, runtime_config: RuntimeConfig
+    ) -> None:
+        CspConfig.objects.create(report_throttling=1.0)
+        request = rf.post("/", data="{}", content_type="application/json")
+        # throttled requests are not parsed - so aren't bad requests
+        assert report_uri(request).status_code == 200
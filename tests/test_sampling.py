@@ -0,0 +1,110 @@
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.test import RequestFactory
+
+from csp.sampling import (
+    CACHE_KEY_REPORT_COUNT,
+    CACHE_KEY_SAMPLING_RATIO,
+    AdaptiveSampler,
+    client_hash,
+    record_report,
+)
+
+WINDOW = "csp.sampling.current_window"
+
+
+@pytest.fixture(autouse=True)
+def clear_cache() -> None:
+    cache.clear()
+
+
+def test_record_report() -> None:
+    with mock.patch(WINDOW, return_value=1):
+        record_report()
+        record_report()
+    assert cache.get(CACHE_KEY_REPORT_COUNT.format(1)) == 2
+
+
+def test_client_hash(rf: RequestFactory) -> None:
+    request_1 = rf.get("/", REMOTE_ADDR="10.0.0.1")
+    request_2 = rf.get("/", REMOTE_ADDR="10.0.0.2")
+    assert 0 <= client_hash(request_1, 1) < 1
+    # stable for the same client and page - the query string is ignored
+    assert client_hash(request_1, 1) == client_hash(
+        rf.get("/?foo", REMOTE_ADDR="10.0.0.1"), 1
+    )
+    assert client_hash(request_1, 1) != client_hash(
+        rf.get("/foo", REMOTE_ADDR="10.0.0.1"), 1
+    )
+    assert client_hash(request_1, 1) != client_hash(request_2, 1)
+    assert client_hash(request_1, 1) != client_hash(request_1, 2)
+
+
+class TestAdaptiveSampler:
+    @pytest.mark.parametrize(
+        "previous_ratio,report_count,ratio",
+        [
+            # 10 reports/sec (window = 10s) against target of 10 - no change
+            (0.5, 100, 0.5),
+            # twice the target rate - halve the ratio
+            (0.5, 200, 0.25),
+            # half the target rate - double the ratio
+            (0.25, 50, 0.5),
+            # a tenth of the target rate - increase is capped at double
+            (0.25, 10, 0.5),
+            # no reports at all - increase is capped at double
+            (0.25, 0, 0.5),
+            # clamped to max
+            (0.75, 0, 0.8),
+            # clamped to min
+            (0.01, 10_000, 0.001),
+        ],
+    )
+    def test_calculate_ratio(
+        self, previous_ratio: float, report_count: int, ratio: float
+    ) -> None:
+        sampler = AdaptiveSampler(target=10, min_ratio=0.001, max_ratio=0.8)
+        assert sampler.calculate_ratio(previous_ratio, report_count) == ratio
+
+    def test_ratio(self) -> None:
+        sampler = AdaptiveSampler(target=10, initial_ratio=0.5)
+        cache.set(CACHE_KEY_REPORT_COUNT.format(1), 200)
+        with mock.patch(WINDOW, return_value=2):
+            assert sampler.ratio() == 0.25
+        assert cache.get(CACHE_KEY_SAMPLING_RATIO.format(2)) == 0.25
+        # ratio is held in memory for the rest of the window
+        cache.set(CACHE_KEY_SAMPLING_RATIO.format(2), 1.0)
+        with mock.patch(WINDOW, return_value=2):
+            assert sampler.ratio() == 0.25
+
+    def test_ratio_shared(self) -> None:
+        # another process has already calculated the ratio for the window
+        cache.set(CACHE_KEY_SAMPLING_RATIO.format(2), 0.1)
+        sampler = AdaptiveSampler(target=10, initial_ratio=0.5)
+        with mock.patch(WINDOW, return_value=2):
+            assert sampler.ratio() == 0.1
+
+    def test_ratio_uses_previous_ratio(self) -> None:
+        cache.set(CACHE_KEY_SAMPLING_RATIO.format(1), 0.2)
+        cache.set(CACHE_KEY_REPORT_COUNT.format(1), 200)
+        sampler = AdaptiveSampler(target=10, initial_ratio=0.5)
+        with mock.patch(WINDOW, return_value=2):
+            assert sampler.ratio() == 0.1
+
+    @pytest.mark.parametrize("ratio,sampled", [(0.0, False), (1.0, True)])
+    def test_sample(self, rf: RequestFactory, ratio: float, sampled: bool) -> None:
+        sampler = AdaptiveSampler(target=10, min_ratio=ratio, max_ratio=ratio)
+        assert sampler.sample(rf.get("/")) == sampled
+
+
+def test_add_report_uri(rf: RequestFactory) -> None:
+    from csp.middleware import add_report_uri
+
+    sampler = mock.Mock(spec=AdaptiveSampler)
+    sampler.sample.return_value = False
+    with mock.patch("csp.middleware.get_sampler", return_value=sampler):
+        assert add_report_uri(rf.get("/")) is False
+    with mock.patch("csp.middleware.get_sampler", return_value=None):
+        assert add_report_uri(rf.get("/")) is True
@@ -0,0 +1,35 @@
+import pytest
+from django.test import override_settings
+
+from csp import settings as csp_settings
+
+
+def test_lazy_setting() -> None:
+    csp_settings.__dict__.pop("CSP_REPORT_QUEUE_SIZE", None)
+    with override_settings(CSP_REPORT_QUEUE_SIZE="10"):
+        assert csp_settings.CSP_REPORT_QUEUE_SIZE == 10
+    # value is cached on first access
+    assert csp_settings.CSP_REPORT_QUEUE_SIZE == 10
+    csp_settings.__dict__.pop("CSP_REPORT_QUEUE_SIZE")
+    assert csp_settings.CSP_REPORT_QUEUE_SIZE == 1000
+
+
+@pytest.mark.parametrize(
+    "report_only,header",
+    [
+        (True, "Content-Security-Policy-Report-Only"),
+        (False, "Content-Security-Policy"),
+    ],
+)
+def test_response_header(report_only: bool, header: str) -> None:
+    csp_settings.__dict__.pop("CSP_REPORT_ONLY", None)
+    csp_settings.__dict__.pop("CSP_RESPONSE_HEADER", None)
+    with override_settings(CSP_REPORT_ONLY=report_only):
+        assert csp_settings.CSP_RESPONSE_HEADER == header
+    csp_settings.__dict__.pop("CSP_REPORT_ONLY")
+    csp_settings.__dict__.pop("CSP_RESPONSE_HEADER")
+
+
+def test_unknown_setting() -> None:
+    with pytest.raises(AttributeError):
+        _ = csp_settings.CSP_DOES_NOT_EXIST
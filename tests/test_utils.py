@@ -1,6 +1,6 @@
 import pytest
 
-from csp.utils import strip_path
+from csp.utils import strip_filename, strip_path, strip_subdomain
 
 
 @pytest.mark.parametrize(
@@ -29,3 +29,35 @@ from csp.utils import strip_path
 )
 def test_strip_path(input: str, output: str) -> None:  # noqa: A002
     assert strip_path(input) == output
+
+
+@pytest.mark.parametrize(
+    "input,output",
+    [
+        ("example.com/js/app.js", "example.com/js/app.js"),
+        ("https://example.com", "https://example.com"),
+        ("https://example.com/app.js", "https://example.com/"),
+        ("https://example.com/js/app.js?v=1", "https://example.com/js/"),
+        ("https://example.com/js/", "https://example.com/js/"),
+    ],
+)
+def test_strip_filename(input: str, output: str) -> None:  # noqa: A002
+    assert strip_filename(input) == output
+
+
+@pytest.mark.parametrize(
+    "input,output",
+    [
+        ("data:", "data:"),
+        ("example.com", "example.com"),
+        ("https://example.com/app.js", "https://example.com"),
+        ("https://cdn.example.com/app.js", "https://*.example.com"),
+        ("https://*.example.com", "https://*.example.com"),
+        ("https://a.b.example.co.uk:8443/x", "https://*.example.co.uk:8443"),
+        ("https://www.example.io", "https://*.example.io"),
+        ("https://10.0.0.1:8080/x", "https://10.0.0.1:8080"),
+        ("https://[::1]:80/x", "https://[::1]:80"),
+    ],
+)
+def test_strip_subdomain(input: str, output: str) -> None:  # noqa: A002
+    assert strip_subdomain(input) == output
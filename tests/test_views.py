@@ -1,10 +1,18 @@
+import json
 from unittest import mock
 
 import pytest
 from django.db.utils import IntegrityError
-from django.test import RequestFactory
+from django.test import Client, RequestFactory
+from django.urls import reverse
 
-from csp.models import CspReport, CspReportManager
+from csp.models import (
+    CspReport,
+    CspReportBlacklist,
+    CspReportManager,
+    CspReportSummary,
+)
+from csp.normalization import get_normalizer
 from csp.views import report_uri
 
 
@@ -49,6 +57,89 @@ def test_report_ui_minimal(rf: RequestFactory) -> None:
     assert response.status_code == 201
 
 
+VALID_BODY = {"effectiveDirective": "img-src", "blockedURL": "https://a.com"}
+INVALID_BODY = {"blockedURL": "https://b.com"}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "batch,status_code,blocked_uris",
+    [
+        # no csp-violation reports - nothing to store
+        ([], 200, []),
+        ([{"type": "deprecation", "body": {"id": "foo"}}], 200, []),
+        (
+            [
+                {"type": "csp-violation", "body": VALID_BODY},
+                {
+                    "type": "csp-violation",
+                    "body": {**VALID_BODY, "blockedURL": "https://b.com"},
+                },
+            ],
+            201,
+            ["https://a.com", "https://b.com"],
+        ),
+    ],
+)
+def test_report_ui_reporting_api_batch(
+    rf: RequestFactory, batch: list, status_code: int, blocked_uris: list[str]
+) -> None:
+    request = rf.post("/", data=batch, content_type="application/reports+json")
+    assert report_uri(request).status_code == status_code
+    assert sorted(CspReport.objects.values_list("blocked_uri", flat=True)) == (
+        blocked_uris
+    )
+
+
+@pytest.mark.django_db
+def test_report_ui_reporting_api(rf: RequestFactory) -> None:
+    request = rf.post(
+        "/",
+        data=[
+            {
+                "type": "csp-violation",
+                "url": "http://127.0.0.1:8000/test/",
+                "body": {
+                    "documentURL": "http://127.0.0.1:8000/test/",
+                    "effectiveDirective": "img-src",
+                    "blockedURL": "https://example.com/?foo",
+                    "disposition": "enforce",
+                    "statusCode": 200,
+                },
+            },
+            {"type": "deprecation", "body": {"id": "foo"}},
+        ],
+        content_type="application/reports+json",
+    )
+    response = report_uri(request)
+    assert response.status_code == 201
+    report = CspReport.objects.get()
+    assert report.effective_directive == "img-src"
+    assert report.blocked_uri == "https://example.com/"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "bodies,status_code,count",
+    [
+        # the invalid report (no directive) is skipped, the valid one stored
+        ([INVALID_BODY, VALID_BODY], 201, 1),
+        ([INVALID_BODY], 200, 0),
+    ],
+)
+def test_report_ui_reporting_api_invalid(
+    rf: RequestFactory, bodies: list[dict], status_code: int, count: int
+) -> None:
+    request = rf.post(
+        "/",
+        data=[{"type": "csp-violation", "body": body} for body in bodies],
+        content_type="application/reports+json",
+    )
+    response = report_uri(request)
+    assert response.status_code == status_code
+    assert CspReport.objects.count() == count
+
+
 @pytest.mark.django_db
 def test_report_ui_invalid(rf: RequestFactory) -> None:
     request = rf.post(
@@ -152,3 +243,190 @@ def test_report_ui_throttled(rf: RequestFactory, error: type[Exception]) -> None
     with mock.patch("csp.views.CSP_REPORT_THROTTLING", 1.0):
         response = report_uri(request)
         assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_report_ui_async(rf: RequestFactory) -> None:
+    request = rf.post(
+        "/",
+        data={
+            "csp-report": {
+                "effective-directive": "img-src",
+                "blocked-uri": "https://example.com",
+            }
+        },
+        content_type="application/json",
+    )
+    with mock.patch("csp.views.CSP_REPORT_ASYNC", True), mock.patch(
+        "csp.views.get_report_queue"
+    ) as mock_queue:
+        response = report_uri(request)
+    assert response.status_code == 204
+    mock_queue.return_value.put.assert_called_once()
+    assert not CspReport.objects.exists()
+
+
+@pytest.mark.django_db
+def test_csp_diagnostics(admin_client: Client) -> None:
+    response = admin_client.get(reverse("csp:csp_diagnostics"))
+    assert response.status_code == 200
+    assert "Report backend: DatabaseReportBackend" in response.content.decode()
+    assert "set CSP_MINIMIZE_POLICY to enable" in response.content.decode()
+    assert "  reports: closed (0 consecutive failures)" in response.content.decode()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("adaptive", [True, False])
+def test_report_ui_records_rate(rf: RequestFactory, adaptive: bool) -> None:
+    request = rf.post(
+        "/",
+        data={
+            "csp-report": {
+                "effective-directive": "img-src",
+                "blocked-uri": "https://example.com",
+            }
+        },
+        content_type="application/json",
+    )
+    with mock.patch("csp.views.get_sampler", return_value=adaptive), mock.patch(
+        "csp.views.record_report"
+    ) as mock_record:
+        response = report_uri(request)
+    assert response.status_code == 201
+    assert mock_record.called == adaptive
+
+
+@pytest.mark.django_db
+def test_report_ui_normalized(rf: RequestFactory) -> None:
+    get_normalizer.cache_clear()
+    request = rf.post(
+        "/",
+        data={
+            "csp-report": {
+                "effective-directive": "img-src",
+                "blocked-uri": "https://cdn.example.com/img/1.png?foo",
+            }
+        },
+        content_type="application/json",
+    )
+    with mock.patch(
+        "csp.normalization.CSP_REPORT_NORMALIZATION", {"img-src": "domain"}
+    ):
+        response = report_uri(request)
+    assert response.status_code == 201
+    assert CspReport.objects.get().blocked_uri == "https://*.example.com"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "blacklist,count",
+    [
+        # more specific than the normalized blocked_uri
+        ("https://cdn.example.com/ads/", 0),
+        ("https://cdn.example.com/img/", 1),
+        # matches the normalized blocked_uri only
+        ("https://*.example.com", 0),
+    ],
+)
+def test_report_ui_blacklist_normalized(
+    rf: RequestFactory, blacklist: str, count: int
+) -> None:
+    get_normalizer.cache_clear()
+    CspReportBlacklist.objects.create(directive="img-src", blocked_uri=blacklist)
+    request = rf.post(
+        "/",
+        data={
+            "csp-report": {
+                "effective-directive": "img-src",
+                "blocked-uri": "https://cdn.example.com/ads/1.png",
+            }
+        },
+        content_type="application/json",
+    )
+    with mock.patch(
+        "csp.normalization.CSP_REPORT_NORMALIZATION", {"img-src": "domain"}
+    ):
+        report_uri(request)
+    assert CspReport.objects.count() == count
+    get_normalizer.cache_clear()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("allowed,status_code,count", [(True, 200, 0), (False, 201, 1)])
+def test_report_ui_drop_allowed(
+    rf: RequestFactory, allowed: bool, status_code: int, count: int
+) -> None:
+    request = rf.post(
+        "/",
+        data={
+            "csp-report": {
+                "effective-directive": "img-src",
+                "blocked-uri": "https://cdn.example.com/img/1.png",
+            }
+        },
+        content_type="application/json",
+    )
+    with mock.patch("csp.views.CSP_REPORT_DROP_ALLOWED", True), mock.patch(
+        "csp.views.is_allowed_by_policy", return_value=allowed
+    ), mock.patch("csp.views.record_covered_report") as mock_record:
+        response = report_uri(request)
+    assert response.status_code == status_code
+    assert CspReport.objects.count() == count
+    assert mock_record.call_count == 1 - count
+
+
+@pytest.mark.django_db
+def test_csp_summary(admin_client: Client) -> None:
+    CspReportSummary.objects.create(
+        kind="source", directive="img-src", uri="https://a.com", request_count=2
+    )
+    CspReportSummary.objects.create(
+        kind="document", uri="https://example.com/1", request_count=2
+    )
+    response = admin_client.get(reverse("csp:csp_summary"))
+    assert response.status_code == 200
+    content = response.content.decode()
+    assert "  img-src:\n    https://a.com: 2" in content
+    assert "  https://example.com/1: 2" in content
+    assert "  img-src https://a.com: 2 (first seen" in content
+
+
+@pytest.mark.django_db
+def test_csp_summary_top_n(admin_client: Client) -> None:
+    for directive in ("img-src", "font-src"):
+        CspReportSummary.objects.bulk_create(
+            CspReportSummary(
+                kind="source",
+                directive=directive,
+                uri=f"https://{i}.com",
+                request_count=i,
+            )
+            for i in range(30)
+        )
+    content = admin_client.get(reverse("csp:csp_summary")).content.decode()
+    # the top 20 sources for each directive
+    assert content.count("    https://29.com: 29") == 2
+    assert content.count("    https://10.com: 10") == 2
+    assert "    https://9.com: 9" not in content
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "query,status_code",
+    [({}, 200), ({"since": "2024-01-01"}, 200), ({"since": "foo"}, 400)],
+)
+def test_csp_export(admin_client: Client, query: dict, status_code: int) -> None:
+    CspReport.objects.create(effective_directive="img-src", blocked_uri="https://a.com")
+    url = reverse("csp:csp_export", kwargs={"name": "reports", "fmt": "jsonl"})
+    response = admin_client.get(url, query)
+    assert response.status_code == status_code
+    if status_code == 200:
+        assert response.streaming
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert json.loads(lines[0])["blocked_uri"] == "https://a.com"
+
+
+@pytest.mark.django_db
+def test_csp_export_invalid(admin_client: Client) -> None:
+    url = reverse("csp:csp_export", kwargs={"name": "users", "fmt": "csv"})
+    assert admin_client.get(url).status_code == 400